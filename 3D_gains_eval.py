@@ -24,6 +24,7 @@ import numpy as np
 from Classes.Cluster import *
 from Classes.Gate import *
 from Classes.Net import *
+import design_bundle
 import locale
 import matplotlib.pyplot as plt
 from alive_progress import alive_bar
@@ -61,14 +62,11 @@ def extractGates(file):
         Dictionary of Gate objects
     """
     gates = dict()
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines:
-        line = line.strip()
-        gateName = line.split(',')[1]
+    columns = design_bundle.read(file, kind="CellCoord.out")
+    for gateName, x, y in zip(columns["cell"], columns["x"].tolist(), columns["y"].tolist()):
         gates[gateName] = Gate(gateName)
-        gates[gateName].setX(float(line.split(',')[2]))
-        gates[gateName].setY(float(line.split(',')[3]))
+        gates[gateName].setX(x)
+        gates[gateName].setY(y)
     return gates
 
 def extractGatesSize(file, gates):
@@ -88,13 +86,10 @@ def extractGatesSize(file, gates):
     ------
     N/A
     """
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines[1:]:
-        line = line.strip()
-        gateName = line.split(' ')[0]
-        gates[gateName].setWidth(float(line.split(' ')[1]))
-        gates[gateName].setHeight(float(line.split(' ')[2]))
+    columns = design_bundle.read(file, kind="CellSizes.out")
+    for gateName, width, height in zip(columns["cell"], columns["width"].tolist(), columns["height"].tolist()):
+        gates[gateName].setWidth(width)
+        gates[gateName].setHeight(height)
 
 def extractNets(file):
     """
@@ -114,13 +109,10 @@ def extractNets(file):
         Dictionary of Net objects
     """
     nets = dict()
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines[1:]:
-        line = line.strip()
-        netName = line.split(' ')[0]
+    columns = design_bundle.read(file, kind="WLnets.out")
+    for netName, length in zip(columns["net"], columns["length"].tolist()):
         nets[netName] = Net(netName)
-        nets[netName].setLength(float(line.split(' ')[2]))
+        nets[netName].setLength(length)
     return nets
 
 def gateNetAssociation(file, nets, gates):
@@ -141,12 +133,8 @@ def gateNetAssociation(file, nets, gates):
     ------
     N/A
     """
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines:
-        line = line.strip()
-        netName = line.split(',')[0]
-        gateName = line.split(',')[1]
+    columns = design_bundle.read(file, kind="CellCoord.out")
+    for netName, gateName in zip(columns["net"], columns["cell"]):
         nets[netName].addGate(gates[gateName])
         gates[gateName].addNet(nets[netName])
 
@@ -169,13 +157,10 @@ def NetHPL(file, nets):
     ------
     N/A
     """
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines:
-        line = line.strip()
-        lineEl = line.split()
-        nets[lineEl[0]].hpl = float(lineEl[1])
-        nets[lineEl[0]].bb = [ [float(lineEl[2]), float(lineEl[3])], [float(lineEl[4]), float(lineEl[5])] ]
+    columns = design_bundle.read(file, kind="hpl.out")
+    for netName, hpl, bb in zip(columns["net"], columns["hpl"].tolist(), columns["bb"].tolist()):
+        nets[netName].hpl = hpl
+        nets[netName].bb = [ [bb[0], bb[1]], [bb[2], bb[3]] ]
 
 def gateLayer(file, gates):
     """
@@ -1,4 +1,14 @@
+from Classes.SideTable import SideTable
+
+
 class Cluster:
+    __slots__ = ("id", "area", "width", "height", "origin", "gates", "gateArea", "__weakref__")
+
+    # Silhouette analysis, see cluster_analysis.py
+    cohesion = SideTable(0) # average cohesion of all the gates in the cluster
+    separation = SideTable(0) # average separation of all the gates in the cluster
+    silouhette = SideTable(0) # (cohesion - separation)/max(cohesion, separation)
+
     def __init__(self, width, height, area, origin, identifier):
         '''
         origin is an array of two coordinates: (x, y)
@@ -10,9 +20,6 @@ class Cluster:
         self.origin = origin
         self.gates = dict()
         self.gateArea = 0 # Cumulated area of all the gates in the cluster
-        self.cohesion = 0 # average cohesion of all the gates in the cluster
-        self.separation = 0 # average separation of all the gates in the cluster
-        self.silouhette = 0 # (cohesion - separation)/max(cohesion, separation)
 
     def addGate(self, gate):
         self.gates[gate.name] = gate
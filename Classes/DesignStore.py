@@ -0,0 +1,481 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+import numpy as np
+from Classes.Gate import Gate
+from Classes.Net import Net
+from Classes.Pin import Pin
+
+# Amount of gates, pins and gatePins mappings of the nets, and nets of the gates, kept by a DesignStore.
+MEMBERS_CACHE_SIZE = 256
+
+
+class DesignStore:
+    """Structure-of-arrays storage of the gates, pins and nets of a design.
+
+    Gates, pins and nets are numbered in the order of the DEF. Their numeric
+    attributes are stored in NumPy arrays and their names in tables shared by
+    all the instances (stdCellNames, orientationNames, gatePinNames, layerNames).
+
+    The connections of the nets are stored in CSR form: the i-th net connects
+    connID[connPtr[i]:connPtr[i+1]], which are pin IDs where connIsPin is set,
+    gate IDs otherwise. The nets of each gate are stored the same way, with
+    gateNetPtr and gateNet.
+
+    GateView, NetView and PinView give access to a single gate, net or pin
+    with the same attributes as Gate, Net and Pin.
+    """
+    def __init__(self, gates, pins, nets):
+        """
+        Parameters
+        ----------
+        gates : dict
+            {name : Gate}
+        pins : dict
+            {name : Pin}
+        nets : dict
+            {name : Net}, connected to the gates and pins above.
+        """
+        gates = list(gates.values())
+        pins = list(pins.values())
+        nets = list(nets.values())
+
+        self.gateNames = [g.name for g in gates]
+        gateIDs = {name: i for i, name in enumerate(self.gateNames)}
+        for attr in ["x", "y", "width", "height"]:
+            self._setColumn("gate", attr, [getattr(g, attr) for g in gates])
+        self.stdCellNames, self.gateStdCell = _table([g.stdCell for g in gates])
+        self.orientationNames, self.gateOrientation = _table([g.orientation for g in gates])
+        self.gateIsMemory = np.array([g.isMemory for g in gates], dtype=bool)
+        # Index in clusterObjects, -1 if the gate is in no cluster.
+        self.gateCluster = np.full(len(gates), -1, dtype=np.int32)
+        self.clusterObjects = []
+        self._clusterIDs = dict() # {id(Cluster) : index in clusterObjects}
+        # Last members built, {(kind, ID) : _Members}, see members().
+        self._membersCache = OrderedDict()
+
+        self.pinNames = [p.name for p in pins]
+        pinIDs = {name: i for i, name in enumerate(self.pinNames)}
+        for attr in ["x", "y", "approximatedAdditionalLength"]:
+            self._setColumn("pin", attr, [getattr(p, attr) for p in pins])
+        self.pinPlaced = np.array([p.placed for p in pins], dtype=bool)
+
+        self.netNames = [n.name for n in nets]
+        netIDs = {name: i for i, name in enumerate(self.netNames)}
+        self._setColumn("net", "wl", [n.wl for n in nets])
+        self.netIsRouted = np.array([n.isRouted for n in nets], dtype=np.int8)
+
+        connPtr = [0]
+        connID = []
+        connIsPin = []
+        gatePins = []
+        layerPtr = [0]
+        layers = []
+        for net in nets:
+            for name, gatePin in net.gatePins.items():
+                isPin = gatePin == "PIN"
+                connIsPin.append(isPin)
+                connID.append(pinIDs[name] if isPin else gateIDs[name])
+                gatePins.append(gatePin)
+            connPtr.append(len(connID))
+            layers.extend(net.metalLayers)
+            layerPtr.append(len(layers))
+        self.connPtr = np.array(connPtr, dtype=np.int64)
+        self.connID = np.array(connID, dtype=np.int32)
+        self.connIsPin = np.array(connIsPin, dtype=bool)
+        self.gatePinNames, self.connGatePin = _table(gatePins)
+        self.layerPtr = np.array(layerPtr, dtype=np.int64)
+        self.layerNames, self.netLayer = _table(layers)
+
+        # Transpose of the gate connections.
+        # The stable sort keeps the nets of each gate in the order of the DEF,
+        # like Gate.addNet() calls during the parsing.
+        connNet = np.repeat(np.arange(len(nets), dtype=np.int32), np.diff(self.connPtr))
+        gateConn = np.flatnonzero(~self.connIsPin)
+        order = gateConn[np.argsort(self.connID[gateConn], kind='stable')]
+        self.gateNet = connNet[order]
+        self.gateNetPtr = np.zeros(len(gates) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.connID[order], minlength=len(gates)), out=self.gateNetPtr[1:])
+
+        # Pins keep their net even when it was left out of the design.
+        self.pinNet = np.full(len(pins), -1, dtype=np.int32)
+        self.detachedNets = dict() # {pin ID : Net}
+        for i, pin in enumerate(pins):
+            if pin.net is not None:
+                if pin.net.name in netIDs:
+                    self.pinNet[i] = netIDs[pin.net.name]
+                else:
+                    self.detachedNets[i] = pin.net
+
+        self.gateViews = [GateView(self, i) for i in range(len(gates))]
+        self.pinViews = [PinView(self, i) for i in range(len(pins))]
+        self.netViews = [NetView(self, i) for i in range(len(nets))]
+
+    def _setColumn(self, entity, attr, values):
+        """
+        Store a numeric attribute as float64, along with a mask of the int
+        values so that they are given back as int.
+        """
+        setattr(self, entity + "_" + attr, np.array(values, dtype=np.float64))
+        setattr(self, entity + "_" + attr + "_int", np.array([isinstance(v, (int, np.integer)) for v in values], dtype=bool))
+
+    def views(self):
+        """
+        Returns
+        -------
+        tuple
+            ({name : GateView}, {name : PinView}, {name : NetView}),
+            in the order of the DEF, to replace Design.gates, Design.pins and Design.nets.
+        """
+        return (dict(zip(self.gateNames, self.gateViews)),
+                dict(zip(self.pinNames, self.pinViews)),
+                dict(zip(self.netNames, self.netViews)))
+
+    def clusterIndex(self, cluster):
+        if cluster is None:
+            return -1
+        index = self._clusterIDs.get(id(cluster))
+        if index is None:
+            if len(self.clusterObjects) > 2 * len(self.gateCluster):
+                self._dropClusters()
+            index = len(self.clusterObjects)
+            self._clusterIDs[id(cluster)] = index
+            self.clusterObjects.append(cluster)
+        return index
+
+    def _dropClusters(self):
+        """
+        Forget the clusters no gate is in anymore, so that they can be freed.
+        """
+        assigned = self.gateCluster >= 0
+        used, self.gateCluster[assigned] = np.unique(self.gateCluster[assigned], return_inverse=True)
+        self.clusterObjects = [self.clusterObjects[c] for c in used.tolist()]
+        self._clusterIDs = {id(cluster): index for index, cluster in enumerate(self.clusterObjects)}
+
+    def resetClusters(self):
+        """
+        Take all the gates out of their cluster, see Design.Reset().
+        """
+        self.gateCluster.fill(-1)
+        self.clusterObjects = []
+        self._clusterIDs = dict()
+
+    def members(self, kind, ID, build):
+        """
+        Members of a net or a gate, built by build() on the first call and kept
+        for the MEMBERS_CACHE_SIZE most recent ones: the connections do not change.
+
+        Parameters
+        ----------
+        kind : str
+            "gates", "pins" or "gatePins" of the net ID, "nets" of the gate ID.
+        ID : int
+        build : function
+            Returns the _Members.
+
+        Returns
+        -------
+        _Members
+        """
+        key = (kind, ID)
+        members = self._membersCache.get(key)
+        if members is None:
+            members = build()
+            self._membersCache[key] = members
+            if len(self._membersCache) > MEMBERS_CACHE_SIZE:
+                self._membersCache.popitem(last=False)
+        else:
+            self._membersCache.move_to_end(key)
+        return members
+
+    def connections(self, netID):
+        """
+        Returns
+        -------
+        tuple
+            (IDs, isPin mask, gate pin name IDs) of the connections of the net.
+        """
+        start, end = self.connPtr[netID], self.connPtr[netID+1]
+        return self.connID[start:end], self.connIsPin[start:end], self.connGatePin[start:end]
+
+
+def _table(values):
+    """
+    Intern a list of str.
+
+    Returns
+    -------
+    tuple
+        (list of the distinct values, np.int32 array of the position of each value in that list)
+    """
+    ids = dict()
+    codes = np.array([ids.setdefault(v, len(ids)) for v in values], dtype=np.int32)
+    return list(ids), codes
+
+
+def _column(entity, attr):
+    """
+    Property reading and writing the attr column of a DesignStore,
+    see DesignStore._setColumn().
+    """
+    valuesName = entity + "_" + attr
+    isIntName = valuesName + "_int"
+
+    def getter(self):
+        value = getattr(self.store, valuesName)[self.i].item()
+        return int(value) if getattr(self.store, isIntName)[self.i] else value
+
+    def setter(self, value):
+        getattr(self.store, valuesName)[self.i] = value
+        getattr(self.store, isIntName)[self.i] = isinstance(value, (int, np.integer))
+
+    return property(getter, setter)
+
+
+class _Members(Mapping):
+    """Read-only {name : value} dict over some connections of a DesignStore.
+    """
+    __slots__ = ("_names", "_values", "_index")
+
+    def __init__(self, names, values):
+        """
+        Parameters
+        ----------
+        names : List
+            Names of the members, in order.
+        values : List
+            Values of the members, same order as names.
+        """
+        self._names = names
+        self._values = values
+        self._index = None # {name : position}, built on the first lookup
+
+    def __getitem__(self, name):
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self._names)}
+        return self._values[self._index[name]]
+
+    def __contains__(self, name):
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self._names)}
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def keys(self):
+        return list(self._names)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._names, self._values))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+# The views do not inherit from Gate, Net and Pin: the slots of the later
+# would take room in every view. They borrow their methods instead.
+
+class GateView:
+    """Gate stored in a DesignStore.
+    """
+    __slots__ = ("store", "i", "layer", "__weakref__")
+
+    setX = Gate.setX
+    setY = Gate.setY
+    setWidth = Gate.setWidth
+    setHeight = Gate.setHeight
+    setStdCell = Gate.setStdCell
+    getStdCell = Gate.getStdCell
+    digest = Gate.digest
+    getArea = Gate.getArea
+    addCluster = Gate.addCluster
+    setSilouhette = Gate.setSilouhette
+    setCohesion = Gate.setCohesion
+    setSeparation = Gate.setSeparation
+    absoluteCoordinate = Gate.absoluteCoordinate
+    cohesion = Gate.cohesion
+    separation = Gate.separation
+    silouhette = Gate.silouhette
+
+    x = _column("gate", "x")
+    y = _column("gate", "y")
+    width = _column("gate", "width")
+    height = _column("gate", "height")
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+        self.layer = 0
+
+    @property
+    def name(self):
+        return self.store.gateNames[self.i]
+
+    @property
+    def stdCell(self):
+        return self.store.stdCellNames[self.store.gateStdCell[self.i]]
+
+    @stdCell.setter
+    def stdCell(self, stdCell):
+        names = self.store.stdCellNames
+        if stdCell not in names:
+            names.append(stdCell)
+        self.store.gateStdCell[self.i] = names.index(stdCell)
+
+    @property
+    def orientation(self):
+        return self.store.orientationNames[self.store.gateOrientation[self.i]]
+
+    @orientation.setter
+    def orientation(self, orientation):
+        names = self.store.orientationNames
+        if orientation not in names:
+            names.append(orientation)
+        self.store.gateOrientation[self.i] = names.index(orientation)
+
+    @property
+    def isMemory(self):
+        return bool(self.store.gateIsMemory[self.i])
+
+    @isMemory.setter
+    def isMemory(self, isMemory):
+        self.store.gateIsMemory[self.i] = isMemory
+
+    @property
+    def cluster(self):
+        index = self.store.gateCluster[self.i]
+        return self.store.clusterObjects[index] if index >= 0 else None
+
+    @cluster.setter
+    def cluster(self, cluster):
+        self.store.gateCluster[self.i] = self.store.clusterIndex(cluster)
+
+    @property
+    def nets(self):
+        return self.store.members("nets", self.i, self._nets)
+
+    def _nets(self):
+        store = self.store
+        ids = store.gateNet[store.gateNetPtr[self.i]:store.gateNetPtr[self.i+1]].tolist()
+        return _Members([store.netNames[n] for n in ids], [store.netViews[n] for n in ids])
+
+
+class PinView:
+    """Pin stored in a DesignStore.
+    """
+    __slots__ = ("store", "i", "__weakref__")
+
+    setX = Pin.setX
+    setY = Pin.setY
+    digest = Pin.digest
+
+    x = _column("pin", "x")
+    y = _column("pin", "y")
+    approximatedAdditionalLength = _column("pin", "approximatedAdditionalLength")
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+
+    @property
+    def name(self):
+        return self.store.pinNames[self.i]
+
+    @property
+    def placed(self):
+        return bool(self.store.pinPlaced[self.i])
+
+    @placed.setter
+    def placed(self, placed):
+        self.store.pinPlaced[self.i] = placed
+
+    @property
+    def net(self):
+        netID = self.store.pinNet[self.i]
+        if netID >= 0:
+            return self.store.netViews[netID]
+        return self.store.detachedNets.get(self.i)
+
+
+class NetView:
+    """Net stored in a DesignStore.
+
+    Its gates, pins and metal layers can be read but not modified.
+    """
+    __slots__ = ("store", "i", "ID", "hpl", "is3d", "layer", "_bb", "__weakref__")
+
+    setLength = Net.setLength
+    setdispersion = Net.setdispersion
+    computeHPL = Net.computeHPL
+    dispersion = Net.dispersion
+    hpl3d = Net.hpl3d
+
+    wl = _column("net", "wl")
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+        self.ID = 0
+        self.hpl = 0
+        self.is3d = 0
+        self.layer = 0
+        self._bb = None
+
+    @property
+    def name(self):
+        return self.store.netNames[self.i]
+
+    @property
+    def bb(self):
+        # Default value of Net.bb, until the bounding box is computed.
+        return [[0,0],[0,0]] if self._bb is None else self._bb
+
+    @bb.setter
+    def bb(self, bb):
+        self._bb = bb
+
+    @property
+    def isRouted(self):
+        return int(self.store.netIsRouted[self.i])
+
+    @isRouted.setter
+    def isRouted(self, isRouted):
+        self.store.netIsRouted[self.i] = isRouted
+
+    @property
+    def metalLayers(self):
+        store = self.store
+        layers = store.netLayer[store.layerPtr[self.i]:store.layerPtr[self.i+1]].tolist()
+        return set(store.layerNames[l] for l in layers)
+
+    def _members(self, pins):
+        store = self.store
+        ids, isPin, _ = store.connections(self.i)
+        ids = (ids[isPin] if pins else ids[~isPin]).tolist()
+        if pins:
+            return _Members([store.pinNames[p] for p in ids], [store.pinViews[p] for p in ids])
+        return _Members([store.gateNames[g] for g in ids], [store.gateViews[g] for g in ids])
+
+    @property
+    def gates(self):
+        return self.store.members("gates", self.i, lambda: self._members(False))
+
+    @property
+    def pins(self):
+        return self.store.members("pins", self.i, lambda: self._members(True))
+
+    @property
+    def gatePins(self):
+        return self.store.members("gatePins", self.i, self._gatePins)
+
+    def _gatePins(self):
+        store = self.store
+        ids, isPin, gatePins = store.connections(self.i)
+        names = [store.pinNames[c] if p else store.gateNames[c] for c, p in zip(ids.tolist(), isPin.tolist())]
+        return _Members(names, [store.gatePinNames[g] for g in gatePins.tolist()])
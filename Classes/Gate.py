@@ -1,4 +1,15 @@
+from Classes.SideTable import SideTable
+
+
 class Gate:
+    __slots__ = ("name", "x", "y", "width", "height", "stdCell", "nets", "cluster",
+                 "layer", "orientation", "isMemory", "__weakref__")
+
+    # Silhouette analysis, see cluster_analysis.py
+    cohesion = SideTable(0) # average distance between the gate and all other gates in the cluster
+    separation = SideTable(0) # average distance btween the gate and all other gates in the nearest cluster
+    silouhette = SideTable(0) # (cohesion - separation)/max(cohesion, separation)
+
     def __init__(self, name):
         self.name = name
         self.x = 0 # lower left corner, x
@@ -8,9 +19,6 @@ class Gate:
         self.stdCell = "" # Str name of the standard cell.
         self.nets = dict() # key: net name, value: Net object
         self.cluster = None # Cluster object
-        self.cohesion = 0 # average distance between the gate and all other gates in the cluster
-        self.separation = 0 # average distance btween the gate and all other gates in the nearest cluster
-        self.silouhette = 0 # (cohesion - separation)/max(cohesion, separation)
         self.layer = 0 # 3D layer
         self.orientation = "" # orientation setting the origin to place the ports: N (bottom left), S (top right), FN (bottom right) or FS (top left)
         self.isMemory = False # Is this cell a memory macro?
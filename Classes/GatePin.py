@@ -2,6 +2,8 @@ class GatePin:
     """Connection pin of a standard cell.
     
     """
+    __slots__ = ("name", "direction", "ports")
+
     def __init__(self, pinName, direction=""):
         self.name = pinName # Name of the pin offering this port in the gate.
         self.direction = direction # Direction of the pin: INPUT, OUTPUT, INOUT or FEEDTHRU
@@ -1,4 +1,15 @@
+from Classes.SideTable import SideTable
+
+
 class Net:
+    __slots__ = ("name", "ID", "wl", "gates", "gatePins", "pins", "bb", "hpl",
+                 "is3d", "layer", "metalLayers", "isRouted", "__weakref__")
+
+    # Gates dispersion inside of the net.
+    # A value of '0' means there is eitheir no gate or only one gate in the net.
+    dispersion = SideTable(0)
+    hpl3d = SideTable(0) # HPL after 3D partitioning
+
     def __init__(self, name):
         self.name = name
         self.ID = 0
@@ -6,12 +17,8 @@ class Net:
         self.gates = dict()
         self.gatePins = dict() # {gate name : gate pin name}, like in the DEF file. If it's a pin, {pin name : "PIN"}
         self.pins = dict()
-        # Gates dispersion inside of the net.
-        # A value of '0' means there is eitheir no gate or only one gate in the net.
-        self.dispersion = 0
         self.bb = [[0,0],[0,0]] # Net bounding box, [[x_top, y_top], [x_bottom, y_bottom]] in um
         self.hpl = 0 # Hlaf-perimeter length of the bounding box
-        self.hpl3d = 0 # HPL after 3D partitioning
         self.is3d = 0 # 1 if 3D net
         self.layer = 0 # 0 or 1, irrelevant if is3d == 1.
         self.metalLayers = set() # Set of metal layers names through which the net is routed.
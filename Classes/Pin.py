@@ -1,4 +1,6 @@
 class Pin:
+    __slots__ = ("name", "x", "y", "net", "placed", "approximatedAdditionalLength", "__weakref__")
+
     def __init__(self, name):
         self.name = name
         self.x = 0
@@ -2,6 +2,8 @@ class Port:
     """Physical port of standard cell's pin.
     
     """
+    __slots__ = ("x", "y", "width", "height", "center")
+
     def __init__(self, x=0, y=0, width=0, height=0):
         # self.pin = pin # Reference to the Gate_Pin object to which it's linked.
         self.x = x # lower left corner, x
@@ -0,0 +1,46 @@
+import numpy as np
+
+
+class PortTable:
+    """Absolute coordinates of the ports of the (gate, pin) connections of the nets.
+
+    The connections are numbered net after net, following the gates of each
+    net (Net.gates), and the ports of connection c are the rows
+    connectionPtr[c]:connectionPtr[c+1] of the coordinate arrays.
+    Each port has its center and its rectangle, as given by
+    Gate.absoluteCoordinate() for port.center, [port.x, port.y] (low corner)
+    and [port.x+port.width, port.y+port.height] (high corner).
+    """
+    __slots__ = ("connectionPtr", "centerX", "centerY", "lowX", "lowY", "highX", "highY")
+
+    def __init__(self, connectionPtr, centerX, centerY, lowX, lowY, highX, highY):
+        self.connectionPtr = connectionPtr
+        self.centerX = centerX
+        self.centerY = centerY
+        self.lowX = lowX
+        self.lowY = lowY
+        self.highX = highX
+        self.highY = highY
+
+    def __len__(self):
+        '''
+        Amount of connections.
+        '''
+        return len(self.connectionPtr) - 1
+
+    def centers(self, start, stop):
+        '''
+        Port centers of the connections [start, stop).
+
+        Returns a list with, for each connection, the list of the [x, y] of its ports.
+        '''
+        ptr = self.connectionPtr[start:stop + 1].tolist()
+        xs = self.centerX[ptr[0]:ptr[-1]].tolist()
+        ys = self.centerY[ptr[0]:ptr[-1]].tolist()
+        return [[[xs[i - ptr[0]], ys[i - ptr[0]]] for i in range(ptr[k], ptr[k + 1])] for k in range(stop - start)]
+
+    def portCounts(self):
+        '''
+        Amount of ports of each connection, np.ndarray.
+        '''
+        return np.diff(self.connectionPtr)
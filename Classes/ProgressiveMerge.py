@@ -0,0 +1,152 @@
+from Classes.Cluster import *
+
+
+class ProgressiveMerge:
+    """Merge state of the progressive-wl clustering, see Design.newProgressiveWireLength().
+
+    The nets are hidden inside clusters by increasing length, the merges being
+    done in a disjoint-set forest over the gates (union by size and path
+    halving). The gates of each set are chained in the order they would have
+    been added to the merged cluster: the gates of the first cluster met along
+    the net, then the ones of the second, etc.
+    Each merge gives the set a new ID, above all the existing ones, so that
+    sorting the sets by ID gives the clusters in the order they were created.
+
+    The state is kept between objectives: hiding the nets up to a larger
+    objective only goes through the newly eligible nets.
+    """
+    __slots__ = ("gates", "gateIDs", "nets", "netLengths", "netNames", "position", "objective",
+                 "parent", "size", "head", "tail", "nextGate", "setIDs", "merged",
+                 "emptyClusterIDs", "highestClusterID", "fixToBottom")
+
+    def __init__(self, gates, nets, netLengths, netNames):
+        '''
+        gates: {name : Gate}
+        nets: {name : Net}
+        netLengths, netNames: length and name of every net, sorted by increasing length.
+        '''
+        self.gates = list(gates.values())
+        self.gateIDs = {gate.name: i for i, gate in enumerate(self.gates)}
+        self.nets = nets
+        self.netLengths = netLengths
+        self.netNames = netNames
+        self.position = 0 # Amount of nets of netNames already hidden.
+        self.objective = 0 # Largest objective reached, in µm.
+        self.parent = list(range(len(self.gates)))
+        self.size = [1] * len(self.gates)
+        self.head = list(range(len(self.gates))) # First gate of the set of each root.
+        self.tail = list(range(len(self.gates))) # Last gate of the set of each root.
+        self.nextGate = [-1] * len(self.gates) # Next gate in the same set, -1 for the last one.
+        self.setIDs = list(range(len(self.gates))) # Cluster ID of the set of each root.
+        self.merged = [False] * len(self.gates) # The set of this root comes from a merge.
+        self.emptyClusterIDs = [] # IDs of the clusters created by nets without any gate.
+        self.highestClusterID = len(self.gates) # Highest cluster ID assigned, new ones are above it.
+        self.fixToBottom = set() # Instance names connected to a pin on bottom with a short net.
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def pending(self, objective):
+        '''
+        Amount of nets shorter than <objective> (µm) not hidden yet.
+        '''
+        end = self.position
+        while end < len(self.netLengths) and self.netLengths[end] < objective:
+            end += 1
+        return end - self.position
+
+    def hideNet(self, net):
+        #############################################################################################
+        # Check if the net is not composed of only one gate, meaning it's connected to a bottom pin.
+        # In such case, the gate (and its whole cluster actually) needs to be fixed on bottom.
+        #############################################################################################
+        if len(net.gates) == 1:
+            for gateName in net.gates.keys():
+                self.fixToBottom.add(gateName)
+            return
+
+        # Sets connected by the net, in the order of its gates.
+        roots = []
+        seen = set()
+        for gateName in net.gates.keys():
+            root = self.find(self.gateIDs[gateName])
+            if root not in seen:
+                seen.add(root)
+                roots.append(root)
+
+        # Net already in a single cluster.
+        if len(roots) == 1:
+            return
+
+        self.highestClusterID += 1
+        # A net without any gate still creates a cluster, an empty one.
+        if len(roots) == 0:
+            self.emptyClusterIDs.append(self.highestClusterID)
+            return
+
+        newRoot = max(roots, key=lambda root: self.size[root])
+        for previous, root in zip(roots, roots[1:]):
+            self.nextGate[self.tail[previous]] = self.head[root]
+        self.head[newRoot], self.tail[newRoot] = self.head[roots[0]], self.tail[roots[-1]]
+        for root in roots:
+            if root != newRoot:
+                self.parent[root] = newRoot
+                self.size[newRoot] += self.size[root]
+        self.setIDs[newRoot] = self.highestClusterID
+        self.merged[newRoot] = True
+
+    def hide(self, objective, bar=None):
+        '''
+        Hide all the nets shorter than <objective> (µm) inside clusters.
+        Must not be lower than the previous objective.
+
+        bar: alive_bar called for each net hidden.
+        '''
+        if objective < self.objective:
+            raise ValueError("Objective {} below the one already reached ({})".format(objective, self.objective))
+        self.objective = objective
+        while self.position < len(self.netLengths) and self.netLengths[self.position] < objective:
+            self.hideNet(self.nets[self.netNames[self.position]])
+            self.position += 1
+            if bar is not None:
+                bar()
+
+    def clusters(self):
+        '''
+        Build the clusters out of the sets and assign them to their gates.
+
+        Returns a dictionary {cluster ID : Cluster}, in creation order.
+        '''
+        sets = {self.setIDs[root]: root for root in set(self.find(i) for i in range(len(self.gates)))}
+        for clusterID in self.emptyClusterIDs:
+            sets[clusterID] = None
+        clusters = dict()
+        for clusterID in sorted(sets.keys()):
+            root = sets[clusterID]
+            if root is None:
+                cluster = Cluster(0, 0, 0, [0,0], clusterID)
+            elif self.merged[root]:
+                cluster = Cluster(0, 0, 0, [0,0], clusterID)
+                sumArea = 0
+                i = self.head[root]
+                while i != -1:
+                    gate = self.gates[i]
+                    gate.addCluster(cluster)
+                    cluster.addGate(gate)
+                    sumArea += gate.getArea()
+                    i = self.nextGate[i]
+                cluster.setGateArea(sumArea)
+                cluster.area = sumArea
+            else:
+                # Basic cluster containing only one gate.
+                gate = self.gates[root]
+                cluster = Cluster(gate.width, gate.height, gate.getArea(), [gate.x, gate.y], clusterID)
+                cluster.addGate(gate)
+                cluster.setGateArea(gate.getArea()) # Same as the cluster area in this case.
+                gate.addCluster(cluster)
+            clusters[clusterID] = cluster
+        return clusters
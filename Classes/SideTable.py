@@ -0,0 +1,23 @@
+import weakref
+
+
+class SideTable:
+    """Attribute stored outside of the instances of a slotted class.
+
+    Meant for the fields which are only set on a few instances, or only by
+    some analysis scripts: the value is kept in a table keyed by instance,
+    and instances it was never set on do not pay for it.
+    The class needs a '__weakref__' slot, so that the table does not keep
+    its instances alive.
+    """
+    def __init__(self, default=0):
+        self.default = default
+        self.values = weakref.WeakKeyDictionary()
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return self.values.get(obj, self.default)
+
+    def __set__(self, obj, value):
+        self.values[obj] = value
@@ -2,6 +2,8 @@ class StdCell:
     """Standard cell macro
     
     """
+    __slots__ = ("name", "width", "height", "pins", "isMemory")
+
     def __init__(self, name):
         self.name = name
         self.width = 0
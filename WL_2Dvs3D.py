@@ -26,6 +26,7 @@ import numpy as np
 import os
 import matplotlib.pyplot as plt
 import datetime
+import design_bundle
 
 
 def Evaluate3Dwl(wlFile, netCutFile):
@@ -50,14 +51,12 @@ def Evaluate3Dwl(wlFile, netCutFile):
     nets3DPins = dict() # {Net name : net pins}
     pinValues = set()
     filenameInfo = "{}_{}_{}".format(datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"), "_".join(wlFile.split(os.sep)[-2].split('_')[2:]), netCutFile.split(os.sep)[-1].split(".txt")[0])
-    with open(wlFile, 'r') as f:
-        lines = f.readlines()
-    for line in lines[1:]:
-        netName = line.split(' ')[0]
+    columns = design_bundle.read(wlFile, kind="WLnets.out")
+    for netName, pins, length in zip(columns["net"], columns["pins"].tolist(), columns["length"].tolist()):
         netName = netName.replace('\\','')
-        netsWL[netName] = float(line.split(' ')[2])
-        netsPins[netName] = int(line.split(' ')[1])
-        pinValues.add(int(line.split(' ')[1]))
+        netsWL[netName] = length
+        netsPins[netName] = pins
+        pinValues.add(pins)
 
     with open(netCutFile, 'r') as f:
         lines = f.readlines()
@@ -19,6 +19,7 @@ import statistics
 from Classes.Cluster import *
 from Classes.Gate import *
 from Classes.Net import *
+import design_bundle
 import locale
 import matplotlib.pyplot as plt
 try:
@@ -66,14 +67,11 @@ def extractGates(file):
         Dictionary of Gate objects
     """
     gates = dict()
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines:
-        line = line.strip()
-        gateName = line.split(',')[1]
+    columns = design_bundle.read(file, kind="CellCoord.out")
+    for gateName, x, y in zip(columns["cell"], columns["x"].tolist(), columns["y"].tolist()):
         gates[gateName] = Gate(gateName)
-        gates[gateName].setX(float(line.split(',')[2]))
-        gates[gateName].setY(float(line.split(',')[3]))
+        gates[gateName].setX(x)
+        gates[gateName].setY(y)
     return gates
 
 def extractNets(file):
@@ -94,13 +92,10 @@ def extractNets(file):
         Dictionary of Net objects
     """
     nets = dict()
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines[1:]:
-        line = line.strip()
-        netName = line.split(' ')[0]
+    columns = design_bundle.read(file, kind="WLnets.out")
+    for netName, length in zip(columns["net"], columns["length"].tolist()):
         nets[netName] = Net(netName)
-        nets[netName].setLength(float(line.split(' ')[2]))
+        nets[netName].setLength(length)
     return nets
 
 def gateNetAssociation(file, nets, gates):
@@ -121,12 +116,8 @@ def gateNetAssociation(file, nets, gates):
     ------
     N/A
     """
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines:
-        line = line.strip()
-        netName = line.split(',')[0]
-        gateName = line.split(',')[1]
+    columns = design_bundle.read(file, kind="CellCoord.out")
+    for netName, gateName in zip(columns["net"], columns["cell"]):
         nets[netName].addGate(gates[gateName])
         gates[gateName].addNet(nets[netName])
 
@@ -171,14 +162,12 @@ def clusterGateAssociation(file, clusters, gates):
     gates : dict
         Dictionary of Gate objects
     """
-    with open(file, 'r') as f:
-        lines = f.read().splitlines()
-    for line in lines:
-        line = line.strip()
-        lineSplit = line.split(' ')
-        for l in lineSplit[1:]:
-            clusters[int(lineSplit[0])].addGate(gates[l])
-            gates[l].addCluster(clusters[int(lineSplit[0])])
+    columns = design_bundle.read(file, kind="ClustersInstances.out")
+    ptr = columns["ptr"].tolist()
+    for i, clusterID in enumerate(columns["cluster"].tolist()):
+        for l in columns["cell"][ptr[i]:ptr[i+1]]:
+            clusters[clusterID].addGate(gates[l])
+            gates[l].addCluster(clusters[clusterID])
 
 
 def clusterConnectivity(clusters, nets):
@@ -433,57 +422,6 @@ def clusterConnectivity(clusters, nets):
     # plt.show()
 
 
-# http://www.geeksforgeeks.org/heap-sort/
-# This code is contributed by Mohit Kumra
-# To heapify subtree rooted at index i.
-# n is size of heap
-def heapify(arr, n, i, cloneArr):
-    largest = i  # Initialize largest as root
-    l = 2 * i + 1     # left = 2*i + 1
-    r = 2 * i + 2     # right = 2*i + 2
- 
-    # See if left child of root exists and is
-    # greater than root
-    if l < n and arr[i] < arr[l]:
-        largest = l
- 
-    # See if right child of root exists and is
-    # greater than root
-    if r < n and arr[largest] < arr[r]:
-        largest = r
- 
-    # Change root, if needed
-    if largest != i:
-        arr[i],arr[largest] = arr[largest],arr[i]  # swap
-        cloneArr[i], cloneArr[largest] = cloneArr[largest], cloneArr[i]
- 
-        # Heapify the root.
-        heapify(arr, n, largest, cloneArr)
- 
-# The main function to sort an array of given size
-def heapSort(arr, cloneArr):
-    """
-    arr is the array containing the nets length.
-    cloneArr is the array containing the nets name.
-    The sorting is done on arr, but every moving operation has
-    to be applied on cloneArr as well. This way, we can keep
-    a one to one relationship between the net name and its length.
-    """
-    n = len(arr)
- 
-    # Build a maxheap.
-    for i in range(n, -1, -1):
-        heapify(arr, n, i, cloneArr)
- 
-    # One by one extract elements
-    for i in range(n-1, 0, -1):
-        arr[i], arr[0] = arr[0], arr[i]   # swap
-        cloneArr[i], cloneArr[0] = cloneArr[0], cloneArr[i]
-        heapify(arr, i, 0, cloneArr)
-
-
-
-
 def findClosest(g, gates, gsx, gsy):
     """
     Parameters
@@ -594,7 +532,7 @@ def silouhette(clusters, gates):
     #             subgate = gates[gsk]
     #             distNeigh.append(manhattanDistance([gate.x, gate.y], [subgate.x, subgate.y]))
     #             distNeighNames.append(gsk)
-    #     heapSort(distNeigh, distNeighNames)
+    #     distNeigh, distNeighNames = net_ranking.sortByLength(distNeigh, distNeighNames)
     #     separation = 0
     #     for i, dist in enumerate(distNeigh):
     #         if gates[distNeighNames[i]].cluster.id != gate.cluster.id:
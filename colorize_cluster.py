@@ -80,8 +80,7 @@ if __name__ == "__main__":
     # def_parser.deffile = "7nm_Jul2017/SPC/spc.def" # Don't forget to turn the MEMORY_MACROS on.
 
     def_parser.design = def_parser.Design()
-    def_parser.design.ReadArea()
-    def_parser.design.ExtractCells()
+    def_parser.design.parseDef(stopAfter="COMPONENTS") # Only the die area and the gates are needed.
 
     imgW = int(def_parser.design.width*SCALE_FACTOR) # Width of the design in 10^-1 um
     imgH = int(def_parser.design.height*SCALE_FACTOR)
@@ -49,8 +49,7 @@ if __name__ == "__main__":
     mainDir = "/home/para/dev/def_parser/2019-05-20_13-13-11_ldpc_hierarchical-geometric/"
 
     def_parser.design = def_parser.Design()
-    def_parser.design.ReadArea()
-    def_parser.design.ExtractCells()
+    def_parser.design.parseDef(stopAfter="COMPONENTS") # Only the die area and the gates are needed.
 
     imgW = int(def_parser.design.width*10) # Width of the design in 10^-1 um
     imgH = int(def_parser.design.height*10)
@@ -0,0 +1,200 @@
+"""
+Byte offset index of a DEF file.
+
+The index records where the top-level statements of interest (DIEAREA, TRACKS
+and the COMPONENTS, PINS, SPECIALNETS and NETS sections) start, as well as the
+offset of each '- <net name>' record inside NETS. It is built once with
+regular expressions running over a memory map of the DEF, then stored next to
+it as '<DEF>.idx.npz' so that later runs on the same DEF can seek straight to
+the bytes they need.
+
+The stored index is discarded and rebuilt as soon as the size or modification
+time of the DEF changes.
+"""
+
+import logging
+import mmap
+import os
+import re
+import numpy as np
+
+logger = logging.getLogger('default')
+
+INDEX_SUFFIX = ".idx.npz"
+
+# Statements parsed by def_parser.Design.parseDef()
+STATEMENTS = ["DIEAREA", "TRACKS", "COMPONENTS", "PINS", "SPECIALNETS", "NETS"]
+
+STATEMENT_RE = re.compile(rb'^[ \t]*(' + b'|'.join(s.encode() for s in STATEMENTS) + rb')\b', re.M)
+END_NETS_RE = re.compile(rb'^[ \t]*END NETS\b', re.M)
+NET_RE = re.compile(rb'^[ \t]*- (\S+)', re.M)
+
+
+def openDef(deffile):
+    """
+    Memory map a DEF file, read-only.
+
+    Parameters
+    ----------
+    deffile : str
+
+    Returns
+    -------
+    mmap.mmap
+    """
+    with open(deffile, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def scanNets(mm, start):
+    """
+    Locate the net records of the NETS section.
+
+    Parameters
+    ----------
+    mm : mmap.mmap
+        Memory map of the DEF, see openDef().
+    start : int
+        Byte offset from which to scan, anywhere before the first net record.
+
+    Returns
+    -------
+    tuple
+        (net names, np.int64 array of the byte offsets of their '- <net name>' line,
+        byte offset of the 'END NETS' line)
+    """
+    end = END_NETS_RE.search(mm, start)
+    netsEnd = end.start() if end else len(mm)
+    names = []
+    offsets = []
+    for match in NET_RE.finditer(mm, start, netsEnd):
+        names.append(match.group(1).decode())
+        offsets.append(match.start())
+    return names, np.array(offsets, dtype=np.int64), netsEnd
+
+
+class DefIndex:
+    def __init__(self, deffile):
+        self.deffile = deffile
+        stat = os.stat(deffile)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        self.statementKeys = [] # Keyword of each statement, same order as statementOffsets.
+        self.statementOffsets = [] # Byte offset of the line holding the statement.
+        self.netNames = [] # Net names in the order of the NETS section.
+        self.netOffsets = np.zeros(0, dtype=np.int64) # Byte offset of each '- <net name>' line.
+        self.netsEnd = 0 # Byte offset of the 'END NETS' line.
+        self._netIDs = None # {net name : position in netNames}, built on first lookup.
+
+    def build(self, mm):
+        """
+        Scan the memory mapped DEF.
+
+        Parameters
+        ----------
+        mm : mmap.mmap
+        """
+        logger.info("Building the byte offset index of {}".format(self.deffile))
+        for match in STATEMENT_RE.finditer(mm):
+            self.statementKeys.append(match.group(1).decode())
+            self.statementOffsets.append(match.start())
+            if self.statementKeys[-1] == "NETS":
+                # Nothing of interest after the nets.
+                break
+
+        if "NETS" in self.statementKeys:
+            self.netNames, self.netOffsets, self.netsEnd = scanNets(mm, self.statementOffsets[-1])
+        logger.info("{} statements and {} nets indexed".format(len(self.statementKeys), len(self.netNames)))
+
+    def save(self, path=None):
+        """
+        Store the index, by default as '<DEF>.idx.npz'.
+        """
+        if path is None:
+            path = self.deffile + INDEX_SUFFIX
+        np.savez(path,
+                 size=self.size,
+                 mtime=self.mtime,
+                 statementKeys=np.array(self.statementKeys, dtype=str),
+                 statementOffsets=np.array(self.statementOffsets, dtype=np.int64),
+                 netNames=np.frombuffer('\n'.join(self.netNames).encode(), dtype=np.uint8),
+                 netOffsets=self.netOffsets,
+                 netsEnd=self.netsEnd)
+        logger.debug("DEF index saved in {}".format(path))
+
+    @classmethod
+    def load(cls, deffile, path=None):
+        """
+        Load the stored index of deffile.
+
+        Returns
+        -------
+        DefIndex
+            None if there is no index or if it is outdated.
+        """
+        if path is None:
+            path = deffile + INDEX_SUFFIX
+        if not os.path.isfile(path):
+            return None
+        index = cls(deffile)
+        with np.load(path) as data:
+            if int(data["size"]) != index.size or int(data["mtime"]) != index.mtime:
+                logger.info("DEF index {} is outdated".format(path))
+                return None
+            index.statementKeys = [str(k) for k in data["statementKeys"]]
+            index.statementOffsets = [int(o) for o in data["statementOffsets"]]
+            names = data["netNames"].tobytes().decode()
+            index.netNames = names.split('\n') if names else []
+            index.netOffsets = data["netOffsets"]
+            index.netsEnd = int(data["netsEnd"])
+        logger.debug("DEF index loaded from {}".format(path))
+        return index
+
+    def netRange(self, netName):
+        """
+        Byte range [start, end[ of the record of netName inside the NETS section.
+        """
+        if self._netIDs is None:
+            self._netIDs = {name: i for i, name in enumerate(self.netNames)}
+        i = self._netIDs[netName]
+        start = int(self.netOffsets[i])
+        end = int(self.netOffsets[i+1]) if i+1 < len(self.netOffsets) else self.netsEnd
+        return start, end
+
+    def netRecord(self, mm, netName):
+        """
+        Text of the record of netName, from its '- <net name>' line up to the next net.
+
+        Parameters
+        ----------
+        mm : mmap.mmap
+            Memory map of the DEF, see openDef().
+        netName : str
+        """
+        start, end = self.netRange(netName)
+        return mm[start:end].decode()
+
+
+def getIndex(deffile, mm):
+    """
+    Load the stored index of deffile, or build and store it if it is missing or outdated.
+
+    Parameters
+    ----------
+    deffile : str
+    mm : mmap.mmap
+        Memory map of deffile, see openDef().
+
+    Returns
+    -------
+    DefIndex
+    """
+    index = DefIndex.load(deffile)
+    if index is None:
+        index = DefIndex(deffile)
+        index.build(mm)
+        try:
+            index.save()
+        except OSError as e:
+            logger.warning("Could not store the DEF index: {}".format(e))
+    return index
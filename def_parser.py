@@ -1,12 +1,14 @@
 """
 Usage:
     def_parser.py   [--design=DESIGN] [--clust-meth=METHOD] [--seed=<seed>] [CLUSTER_AMOUNT ...]
-                    [--manhattanwl] [--mmstwl] [--cnwl] [--bb=<method>]
-                    [--deffile=DEF] [--udm=VALUE] [--leftech=TECH] [--segments]
-                    [--bold]
+                    [--manhattanwl] [--mmstwl] [--cnwl] [--rmstwl] [--rsmtwl] [--bb=<method>]
+                    [--deffile=DEF] [--udm=VALUE] [--leftech=TECH] [--segments] [--wl-models]
+                    [--bold] [--index] [--jobs=N] [--cache] [--compact] [--binary] [--warm-start]
+                    [--hgr] [--hgr-wl]
     def_parser.py (--help|-h)
-    def_parser.py   [--design=DESIGN] (--digest) [--manhattanwl] [--mmstwl] [--cnwl] [--bb=<method>]
-                    [--deffile=DEF] [--udm=VALUE] [--leftech=TECH] [--segments]
+    def_parser.py   [--design=DESIGN] (--digest) [--manhattanwl] [--mmstwl] [--cnwl] [--rmstwl] [--rsmtwl] [--bb=<method>]
+                    [--deffile=DEF] [--udm=VALUE] [--leftech=TECH] [--segments] [--wl-models] [--index]
+                    [--jobs=N] [--cache] [--compact] [--binary]
 
 Options:
     --design=DESIGN         Design to cluster. One amongst ldpc, ldpc-2020, flipr, boomcore, boomcore-2020, spc,
@@ -23,20 +25,41 @@ Options:
                             axiMemPool,
                             jay_ibex, jay_ldpc
     --clust-meth=METHOD     Clustering method to use. One amongst progressive-wl, random,
-                            Naive_Geometric, hierarchical-geometric, kmeans-geometric, kmeans-random, onetoone.
+                            Naive_Geometric, hierarchical-geometric, kmeans-geometric, kmeans-random,
+                            kmeans-hamerly-geometric, kmeans-hamerly-random,
+                            kmeans-minibatch-geometric, kmeans-minibatch-random, onetoone.
                             or metal. [default: random]
     --seed=<seed>           RNG seed
     CLUSTER_AMOUNT ...      Number of clusters to build. Multiple arguments allowed.
     --manhattanwl           Compute nets wirelength as Manhattan distance.
     --mmstwl                Compute nets wirelength as MMST (Mixed Minimal Steiner Tree).
     --cnwl                  Compute nets wirelength as Closest Neighbourg (slower, but more accurate).
+    --rmstwl                Compute nets wirelength as their exact RMST (Rectilinear Minimum Spanning Tree).
+    --rsmtwl                Compute nets wirelength as their RSMT (Rectilinear Steiner Minimal Tree), exact up to 9 pins,
+                            the shortest of the RMST and the single trunk tree above.
     --bb=<method>           Bounding box computation method: cell or pin.
     --digest                Print design's info and exit.
     --deffile=DEF           Path to DEF file, superseded by --design.
     --udm=VALUE             UNITS DISTANCE MICRONS, e.g. 10000, superseded by --design
     --leftech=TECH          LEF tech used, e.g. 7nm, superseded by --design
     --segments              Compute the Manhattan segment length of each net into WLnets_wegments.out
+    --wl-models             Also estimate the length of each net with all the wirelength models at once,
+                            next to its routed length, into WLnets_models.out and WLnets_models.npz,
+                            the time taken by each model going into WLnets_models_timing.out
     --bold                  Suppress the clustering sanity checks
+    --index                 Seek through the DEF using a byte offset index of its sections and nets,
+                            built on first use and stored next to it as <DEF>.idx.npz
+    --jobs=N                Amount of processes parsing the NETS section of the DEF [default: 1]
+    --cache                 Load the parsed design from <DEF>.<wirelength model>.design.npz if the DEF and the settings
+                            did not change, otherwise parse the DEF and store the design there
+    --compact               Keep the gates, pins and nets in NumPy arrays once parsed, to save memory on large designs
+    --binary                Also store CellCoord.out, WLnets.out, CellSizes.out, hpl.out and ClustersInstances.out
+                            as typed NumPy bundles (.npz) next to them, see design_bundle.py
+    --warm-start            With kmeans methods, go through CLUSTER_AMOUNT in decreasing order and start each clustering
+                            from the centers of the previous one, merging their closest pairs
+    --hgr                   Write the clustered netlist as an hMetis hypergraph into Clusters.hgr, one vertex per cluster
+                            weighted by its gates area and one hyperedge per inter-cluster net
+    --hgr-wl                With --hgr, weight the hyperedges by the length of their net
     -h --help               Print this help
 
 Note:
@@ -48,6 +71,7 @@ from __future__ import division # http://stackoverflow.com/questions/1267869/how
 from PIL import Image
 from math import *
 import copy
+import contextlib
 import locale
 import os
 import shutil
@@ -56,11 +80,19 @@ import errno
 import random
 from docopt import docopt
 import logging, logging.config
+import multiprocessing
 import numpy as np
 import sys
+import time
 import matplotlib.pyplot as plt
-import bst
+import scipy.sparse
+from scipy.spatial import cKDTree
+import def_index
+import design_bundle
+import design_cache
+import net_ranking
 import statistics
+import wirelength
 from alive_progress import alive_bar
 from Classes.Cluster import *
 from Classes.Gate import *
@@ -69,6 +101,9 @@ from Classes.Pin import *
 from Classes.Port import *
 from Classes.StdCell import *
 from Classes.GatePin import *
+from Classes.DesignStore import *
+from Classes.PortTable import *
+from Classes.ProgressiveMerge import *
 try:
     locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
 except locale.Error:
@@ -105,64 +140,20 @@ SIG_SKIP = False
 # Skipping probability, [0,1]. Probability to skip a net durring the progressive-wl method.
 SKIP_PROB = 0.1
 
+# Nets spanning more clusters are left out of the inter-cluster connectivity matrices,
+# each of them would add a dense block of (clusters spanned)^2 entries.
+MATRIX_MAX_NET_CLUSTERS = 1000
+
+# Width of the header line of Clusters.hgr, written once all the hyperedges are counted.
+HGR_HEADER_WIDTH = 40
+# Integer units of the weights of Clusters.hgr: vertices in 1/HGR_AREA_SCALE µm², hyperedges in 1/HGR_LENGTH_SCALE µm.
+# A 7nm standard cell is about 0.04 to 0.1 µm², which rounded to µm² would weigh as much as any small cluster.
+# hMetis and KaHyPar sum the weights in 32-bit integers, which bounds the total area to about 2e6 µm².
+HGR_AREA_SCALE = 1000
+HGR_LENGTH_SCALE = 100
 
 
 
- #######     #####    ########   ##########  
-##     ##  ##     ##  ##     ##      ##      
-##         ##     ##  ##     ##      ##      
- #######   ##     ##  ########       ##      
-       ##  ##     ##  ##   ##        ##      
-##     ##  ##     ##  ##    ##       ##      
- #######     #####    ##     ##      ## 
-
-# http://www.geeksforgeeks.org/heap-sort/
-# This code is contributed by Mohit Kumra
-# To heapify subtree rooted at index i.
-# n is size of heap
-def heapify(arr, n, i, cloneArr):
-    largest = i  # Initialize largest as root
-    l = 2 * i + 1     # left = 2*i + 1
-    r = 2 * i + 2     # right = 2*i + 2
- 
-    # See if left child of root exists and is
-    # greater than root
-    if l < n and arr[i] < arr[l]:
-        largest = l
- 
-    # See if right child of root exists and is
-    # greater than root
-    if r < n and arr[largest] < arr[r]:
-        largest = r
- 
-    # Change root, if needed
-    if largest != i:
-        arr[i],arr[largest] = arr[largest],arr[i]  # swap
-        cloneArr[i], cloneArr[largest] = cloneArr[largest], cloneArr[i]
- 
-        # Heapify the root.
-        heapify(arr, n, largest, cloneArr)
- 
-# The main function to sort an array of given size
-def heapSort(arr, cloneArr):
-    """
-    arr is the array containing the nets length.
-    cloneArr is the array containing the nets name.
-    The sorting is done on arr, but every moving operation has
-    to be applied on cloneArr as well. This way, we can keep
-    a one to one relationship between the net name and its length.
-    """
-    n = len(arr)
- 
-    # Build a maxheap.
-    for i in range(n, -1, -1):
-        heapify(arr, n, i, cloneArr)
- 
-    # One by one extract elements
-    for i in range(n-1, 0, -1):
-        arr[i], arr[0] = arr[0], arr[i]   # swap
-        cloneArr[i], cloneArr[0] = cloneArr[0], cloneArr[i]
-        heapify(arr, i, 0, cloneArr)
 
 def EuclideanDistance(a, b):
     """
@@ -184,28 +175,451 @@ def EuclideanDistance(a, b):
 
 
 
-def nearestNeighbour(bst, point, minDist=float('inf')):
+def closestCenters(points, centers, bounds=False):
     """
-    
-    Parameter
-    ---------
-    bst : BST
-        Tree in which to find the nearest neighbour
-    point : tuple
-        Pair or float coordinates
-    minDist : float
-        Minimum distance found
+    Find the closest center of each point, using a KD-tree of the centers.
 
-    Return
+    Parameters
+    ----------
+    points : np.ndarray
+        (n, 2) array of float coordinates
+    centers : np.ndarray
+        (k, 2) array of float coordinates
+    bounds : bool
+        Also return the distances to the closest and second closest centers.
+
+    Returns
+    -------
+    np.ndarray
+        Index in centers of the closest center of each point, the first one of identical centers.
+        If bounds, tuple (indices, distance to the closest center, distance to the second closest center),
+        the latter being inf if there is only one center.
+    """
+    # Identical centers tie for the same points, the first one wins as when going through the centers in order.
+    _, first, inverse = np.unique(centers, axis=0, return_index=True, return_inverse=True)
+    first = first[inverse.ravel()]
+    if not bounds:
+        if len(points) == 0:
+            return np.zeros(0, dtype=np.intp)
+        return first[cKDTree(centers).query(points)[1]]
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0), np.zeros(0)
+    distances, indices = cKDTree(centers).query(points, k=2)
+    return first[indices[:, 0]], distances[:, 0], distances[:, 1]
+
+
+def mergeClosestCenters(centers, weights, k):
+    """
+    Merge the closest pairs of centers until k of them are left.
+
+    At each round, all the pairs of centers that are each other's nearest
+    neighbour are merged, closest pairs first, into their mean weighted
+    by the amount of gates they hold.
+
+    Parameters
+    ----------
+    centers : np.ndarray
+        (n, 2) array of float coordinates, n >= k
+    weights : np.ndarray
+        Amount of gates of each center
+    k : int
+
+    Returns
+    -------
+    np.ndarray
+        (k, 2) array of float coordinates
+    """
+    centers = np.array(centers, dtype=np.float64)
+    weights = np.array(weights, dtype=np.float64)
+    while len(centers) > k:
+        ids = np.arange(len(centers))
+        distances, neighbours = cKDTree(centers).query(centers, k=2)
+        # Duplicated centers may come out before the center itself.
+        selfFirst = neighbours[:, 0] == ids
+        nearest = np.where(selfFirst, neighbours[:, 1], neighbours[:, 0])
+        distance = np.where(selfFirst, distances[:, 1], distances[:, 0])
+        # Mutual nearest neighbours, each pair taken from its lowest index.
+        first = np.flatnonzero((nearest[nearest] == ids) & (ids < nearest))
+        if len(first) == 0:
+            first = np.array([np.argmin(distance)])
+        first = first[np.argsort(distance[first], kind='stable')][:len(centers) - k]
+        second = nearest[first]
+
+        total = weights[first] + weights[second]
+        share = np.divide(weights[first], total, out=np.full(len(first), 0.5), where=total > 0)
+        centers[first] = centers[second] + share[:, None] * (centers[first] - centers[second])
+        weights[first] = total
+        centers = np.delete(centers, second, axis=0)
+        weights = np.delete(weights, second)
+    return centers
+
+
+
+# Orientations of the cells, indexed by the orientation codes of absoluteCoordinates().
+ORIENTATIONS = ['N', 'S', 'FN', 'FS', 'W', 'E', 'FW', 'FE']
+
+
+def absoluteCoordinates(orientation, x, y, width, height, cx, cy):
+    """
+    Vectorized Gate.absoluteCoordinate(): absolute coordinates of points given
+    relatively to the lower left corner of their cell, depending on its orientation.
+
+    Parameters
+    ----------
+    orientation : np.ndarray
+        Orientation code of the cell of each point, index in ORIENTATIONS.
+    x, y, width, height : np.ndarray
+        Position and size of the cell of each point.
+    cx, cy : np.ndarray
+        Relative coordinates of each point.
+
+    Returns
+    -------
+    tuple
+        (x, y) np.ndarray of the absolute coordinates.
+    """
+    # Same operations, in the same order, as Gate.absoluteCoordinate().
+    ax = np.select([orientation == 0, orientation == 1, orientation == 2, orientation == 3,
+                    orientation == 4, orientation == 5, orientation == 6, orientation == 7],
+                   [x + cx, x + width - cx, x + width - cx, x + cx,
+                    x + height - cy, x + cy, x + cy, x + height - cy])
+    ay = np.select([orientation == 0, orientation == 1, orientation == 2, orientation == 3,
+                    orientation == 4, orientation == 5, orientation == 6, orientation == 7],
+                   [y + cy, y + height - cy, y + cy, y + height - cy,
+                    y + cx, y + width - cx, y + cx, y + width - cx])
+    return ax, ay
+
+
+def segmentReduce(ufunc, values, counts, empty):
+    """
+    Reduce consecutive segments of an array.
+
+    Parameters
+    ----------
+    ufunc : np.ufunc
+        e.g. np.minimum
+    values : np.ndarray
+        Values of all the segments, one after the other.
+    counts : np.ndarray
+        Length of each segment, may be 0.
+    empty : float
+        Result for the empty segments.
+
+    Returns
+    -------
+    np.ndarray
+        Reduction of each segment.
+    """
+    out = np.full(len(counts), empty, dtype=np.float64)
+    nonEmpty = counts > 0
+    if nonEmpty.any():
+        starts = (np.cumsum(counts) - counts)[nonEmpty]
+        out[nonEmpty] = ufunc.reduceat(values, starts)
+    return out
+
+
+class DefReader:
+    """
+    Sequential line reader over a memory mapped DEF file (see def_index.openDef()).
+
+    All the section parsers of Design pull their lines from the same reader,
+    so that the DEF is only walked once (see Design.parseDef()).
+    """
+    def __init__(self, mm, bar=None):
+        self.mm = mm
+        self.bar = bar # alive_bar ticked for each line read
+
+    def readline(self):
+        """
+        Same as file.readline(), returns an empty string at the end of the file.
+        """
+        if self.bar:
+            self.bar()
+        return self.mm.readline().decode()
+
+    def seek(self, offset):
+        self.mm.seek(offset)
+
+    def tell(self):
+        return self.mm.tell()
+
+    def statements(self, index=None, stopAfter=None):
+        """
+        Yield the lines on which the top-level statements may begin.
+
+        Without index, this is simply every line not consumed by a section parser.
+        With an index, only the indexed statements are read, seeking straight to them.
+
+        Parameters
+        ----------
+        index : def_index.DefIndex
+        stopAfter : str
+            Keyword of a statement, e.g. 'COMPONENTS'. Once its line has been yielded
+            and its section consumed, the rest of the DEF is not read.
+        """
+        if index is None:
+            line = self.readline()
+            while line:
+                yield line
+                if stopAfter and line.split()[:1] == [stopAfter]:
+                    return
+                line = self.readline()
+        else:
+            for offset in index.statementOffsets:
+                self.seek(offset)
+                line = self.readline()
+                yield line
+                if stopAfter and line.split()[:1] == [stopAfter]:
+                    return
+
+
+
+
+class NetParseError(ValueError):
+    """
+    Net record of the DEF that could not be parsed, raised by readNetRecords().
+    """
+    pass
+
+
+def exitOnNetParseError(records):
+    """
+    Records yielded by readNetRecords(), logging the parse error and exiting if there is one.
+    """
+    try:
+        yield from records
+    except NetParseError as error:
+        logger.error(error)
+        sys.exit()
+
+
+def readNetRecords(reader, routed, udm, end=None):
+    """
+    Parse the net records of the NETS section, from the current position of
+    the reader up to 'END NETS', or up to the byte offset end.
+
+    This only reads the DEF and does not need the Design, so that it can run
+    in a worker process (see parseNetRange()).
+
+    *Extract net routes:
+    lefdefref v5.8, p.261.
+
+    Parameters
+    ----------
+    reader : DefReader
+    routed : bool
+        Compute the routed length and metal layers of the nets.
+        If False, the routes are skipped.
+    udm : int
+        UNITS_DISTANCE_MICRONS
+    end : int
+        Byte offset at which to stop, aligned on a net record.
+
+    Yields
     ------
     tuple
-        Pair of float coordinates
+        (net name, connections, routed length in um, set of metal layers names)
+        connections is a list of (gate name, gate pin name), or (pin name, None) for a Pin.
+
+    Raises
+    ------
+    NetParseError
+        On a routing statement that could not be parsed. It is not handled
+        here so that a worker process returns it to the parent instead of exiting.
     """
+    while end is None or reader.tell() < end:
+        line = reader.readline()
+        if not line:
+            break
+        line = line.strip()
+
+        if 'END NETS' in line:
+            break
+
+        if '- ' in line:
+            # new net
+            netName = line.split(' ')[1]
+            connections = []
+            netLength = 0
+            metalLayers = set()
+            # Check if the net details are on the same line as the net name.
+            if not '(' in line:
+                # Read the next line after the net name,
+                # it should contain the connected cells names.
+                netDetails = reader.readline().strip()
+            else:
+                netDetails = ' '.join(line.split(' ')[2:])
+            # print(netDetails)
+            while not 'ROUTED' in netDetails and not ';' in netDetails and not 'PROPERTY' in netDetails and not 'SOURCE' in netDetails:
+
+                if "NONDEFAULTRULE" in netDetails:
+                    # Some net use specific rules for spacing and track width.
+                    # The keyword for this is 'NONDEFAULTRULE' and occurs
+                    # before the 'ROUTED' keyword.
+                    # If we find 'NONDEFAULTRULE', skip the line.
+                    netDetails = reader.readline().strip()
+                    continue # ignores the end of the loop and skip to the next iteration.
+
+                # if "+ USE" in netDetails or "+ WEIGHT" in netDetails:
+                #     # This is an empty net. Even though it does connect gates,
+                #     # there is no routing information. Keep its length at 0.
+                #     netDetails = reader.readline().strip()
+                #     bar()
+                #     continue
+                if "+ USE SIGNAL" in netDetails:
+                    netDetails = netDetails.replace("+ USE SIGNAL", "")
+                elif "+ USE CLOCK" in netDetails:
+                    netDetails = netDetails.replace("+ USE CLOCK", "")
+
+                split = netDetails.split(')') # Split the line so that each element is only one pin or gate
+                for gateBlock in split:
+                    gateBlockSplit = gateBlock.split() # Split it again to isolate the gate/pin name
+
+                    if len(gateBlockSplit) > 1 and gateBlockSplit[1] == "PIN":
+                        # this a pin
+                        # '2' bacause we have {(, PIN, <pin_name>}
+                        connections.append((gateBlockSplit[2], None))
+                    elif len(gateBlockSplit) > 1:
+                        # This is a gate
+                        # '1' because we have {(, <gate_name>, <gate_port>}
+                        connections.append((gateBlockSplit[1], gateBlockSplit[2]))
+
+                netDetails = reader.readline().strip()
+
+            if routed:
+                while not ';' in netDetails:
+                    # Now, we are looking at the detailed route of the net.
+                    # It ends with a single ';' alone on its own line.
+                    # On each line, we have:
+                    # NEW <routing layer> ( x1 y1 ) ( x2 y2 ) [via(optional]
+                    # x2 or y2 can be replaced with '*', meaning the same x1 or y2 is to be used.
+                    # 
+                    # The only exception should be the first line, which begins with 'ROUTED'
+
+
+
+                    if not 'SOURCE' in netDetails and not 'USE' in netDetails and not 'WEIGHT' in netDetails and not 'PROPERTY' in netDetails:
+                        # Skip the lines containing those taboo words.
+                        netDetailsSplit = netDetails.split(' ')
+                        baseIndex = 0 # baseIndex to be shifted in case the line begins with 'ROUTED's
+                        if 'ROUTED' in netDetails:
+                            # First line begins with '+ ROUTED', subsequent ones don't.
+                            # Beware the next lines begin with 'NEW'
+                            baseIndex += 1
+                        if 'TAPER' in netDetails:
+                            # Extra keyword meaning we switch back to the default routing rules.
+                            baseIndex += 1
+                        if 'TAPERRULE' in netDetails:
+                            # Extra keyword meaning we switch to a specific routing rule. 
+                            # The keyword if followed by said rule, so we should add two indexes.
+                            # However the first 'TAPERRULE' has already been taken into account in the previous 'TAPER' branch
+                            baseIndex += 1
+                        # print netDetailsSplit
+                        # print net.name
+                        
+                        # Now check if we have a net extension (see 'routingPoints extValue' in doc)
+                        # We only need to do this for the first coordinates (x1 y1)
+                        if netDetailsSplit[baseIndex+5] != ")":
+                            # There is a net extension. Delete it.
+                            del netDetailsSplit[baseIndex+5]
+
+                        # Now if there is a MASK statement between two coordinates, trash it.
+                        if "MASK" in netDetailsSplit:
+                            for i in range(len(netDetailsSplit)):
+                                if netDetailsSplit[i] == "MASK":
+                                    # "MASK" is always followed by an integer. Trash it alongside. cf. lefdef reference v5.8 p. 261
+                                    del netDetailsSplit[i:i+2]
+                                    break
+
+                        try:
+                            x1 = int(netDetailsSplit[baseIndex+3])
+                            y1 = int(netDetailsSplit[baseIndex+4])
+                        except ValueError:
+                            raise NetParseError("Error parsing the line:\n{}\nSplit indexes 3 or 4 is not an integer".format(netDetailsSplit))
+                        if netDetailsSplit[baseIndex+6] == '(':
+                            # Some lines only have one set of coordinates (to place a via)
+                            x2 = netDetailsSplit[baseIndex+7]
+                            y2 = netDetailsSplit[baseIndex+8]
+                        else:
+                            x2 = x1
+                            y2 = y1
+                            # print netDetailsSplit
+                        # Some lines have up to 3 pairs of coordinates
+                        if len(netDetailsSplit) > baseIndex+10 and netDetailsSplit[baseIndex+10] == '(':
+                            x3 = netDetailsSplit[baseIndex+11]
+                            y3 = netDetailsSplit[baseIndex+12]
+                        else:
+                            x3 = x2
+                            y3 = y2
+                        # TODO What is the third number we sometimes have in the second coordinates bracket?
+                        if x2 == "*":
+                            x2 = int(x1)
+                        else:
+                            x2 = int(x2)
+                        if y2 == "*":
+                            y2 = int(y1)
+                        else:
+                            y2 = int(y2)
+                        if x3 == "*":
+                            x3 = x2
+                        else:
+                            x3 = int(x3)
+                        if y3 == "*":
+                            y3 = y2
+                        else:
+                            y3 = int(y3)
+                        # TODO Ternary expressions?
+                        # TODO WEIGHT? cf net clock
+                        netLength += (abs(y2 - y1) + abs(x2 - x1) + abs(y3 - y2) + abs(x3 - x2))/udm 
+                        # if net.name == "clock_module_0.and_dco_dis5.a":
+                        #     logger.debug("In net clock_module_0.and_dco_dis5.a, netDetailsSplit is: '{}'".format(netDetailsSplit))
+                        #     logger.debug("baseIndex = {}".format(baseIndex))
+                        #     logger.debug("netLength = {}".format(netLength))
+                        #     logger.debug("x1 = {}, y1 = {}, x2 = {}, y2 = {}, x3 = {}, y3 = {}".format(x1, y1, x2, y2, x3, y3))
+                        #     logger.debug("len(netDetailsSplit) = {} and [baseIndex+10] = '{}'".format(len(netDetailsSplit), [baseIndex+10]))
+
+                        # Extract metal name of this trace
+                        layerName = ""
+                        try:
+                            layerName = netDetailsSplit[netDetailsSplit.index("NEW")+1]
+                        except ValueError:
+                            try:
+                                layerName = netDetailsSplit[netDetailsSplit.index("ROUTED")+1]
+                            except:
+                                raise NetParseError("{}".format(netDetailsSplit))
+                        metalLayers.add(layerName)
 
-    candidate = bst.findClosest(point)
-    dist = EuclideanDistance(candidate, point)
-    if dist < minDist:
-        minDist = dist
+
+                    netDetails = reader.readline().strip()
+            else:
+                # Skip the rest of the details
+                while not ';' in netDetails:
+                    netDetails = reader.readline().strip()
+
+            yield netName, connections, netLength, metalLayers
+
+
+def parseNetRange(args):
+    """
+    Worker of Design.extractNets() in parallel mode.
+    Parse the net records between two byte offsets of the DEF.
+
+    Parameters
+    ----------
+    args : tuple
+        (DEF path, start offset, end offset, routed, UNITS_DISTANCE_MICRONS),
+        see readNetRecords().
+
+    Return
+    ------
+    List
+        Records yielded by readNetRecords().
+    """
+    defPath, start, end, routed, udm = args
+    with def_index.openDef(defPath) as mm:
+        reader = DefReader(mm)
+        reader.seek(start)
+        return list(readNetRecords(reader, routed, udm, end))
 
 
 
@@ -232,6 +646,12 @@ class Design:
         self.name = ""
         self.metalLayers = set() # Set of layers name, as in DEF file.
         self.netSegments = dict() # {Net name : Net}
+        self.store = None # DesignStore, see compact()
+        self.kmeansCenters = None # Centers of the last kmeans() clustering, np.ndarray (k, 2)
+        self.kmeansSizes = None # Amount of gates in each of those centers
+        self.kmeansRuns = 0 # Amount of runs of the last kmeans() clustering
+        self.progressiveMerge = None # ProgressiveMerge of the last newProgressiveWireLength() clustering
+        self.portTable = None # PortTable of the connections of self.nets, see connectionPortTable()
 
     def Reset(self):
         '''
@@ -239,6 +659,8 @@ class Design:
         '''
         self.clusters = dict()
         self.totalInterClusterWL = 0
+        if self.store is not None:
+            self.store.resetClusters()
 
     def Digest(self):
         logger.info("Design digest {}:".format(self.name))
@@ -325,14 +747,9 @@ class Design:
                 metalLayersDict[numberOfML].append(net.name)
             else:
                 metalLayersDict[numberOfML] = [net.name]
-        outStr = ""
-        for l in sorted(metalLayersDict.keys()):
-            outStr += "{}".format(l)
-            for net in metalLayersDict[l]:
-                outStr += ", {}".format(net)
-            outStr += "\n"
         with open("netMetalLayers.out", 'w') as f:
-            f.write(outStr)
+            for l in sorted(metalLayersDict.keys()):
+                f.write("{}".format(l) + "".join(", {}".format(net) for net in metalLayersDict[l]) + "\n")
 
         plt.figure()
         plt.title("Metal layers used per net ({})".format(self.name))
@@ -370,70 +787,125 @@ class Design:
         '''
 
 
-        diff = list()
-        mostOverestimated = float("inf")
-        mostUnderestimated = -1*float("inf")
-        outStr = ""
+        if method not in ["cell", "pin"]:
+            logger.error("Unknown method '{}' to compute bounding box.".format(method))
+            sys.exit()
+
+        ##################################################################################
+        # Gather the points bounding each net in flat arrays, then reduce them per net.
+        # Cell method: the corners of the gates.
+        # Pin method: the corners of the ports of the pins the net is connected to, see PortTable.
+        # In both cases, along with the coordinates of the IO pins.
+        ##################################################################################
+        nets = list() # Nets with at least two gates or pins
+        considered = list() # For each net of the design, True if it is in nets
+        pointGates = list() # Gate of each point, cell method only
+        connections = list() # Amount of gates of each net of the design
+        pinX = list()
+        pinY = list()
+        pinCounts = list()
+        intNets = list() # Indices in nets of the nets with an int coordinate, such as the 0 of setPinCoordinates() or of an unplaced gate
         ignoredNets = 0 # count ignored net
 
+        gateIDs = {gate.name: i for i, gate in enumerate(self.gates.values())}
         with alive_bar(len(self.nets)) as bar:
             for net in self.nets.values():
                 bar()
-                botx = float("inf")
-                boty = float("inf")
-                topx = 0
-                topy = 0
-                if (len(net.gates) + len(net.pins))> 1:
-                    outStr += net.name + " "
-                    if net.wl == 0:
-                        logger.error("Net '{}' has a null length, which is not normal.".format(net.name))
-                        net.wl = 0.1
-                        # sys.exit()
-                    # Bounds computed based on the coordinates of the cell.
-                    if method == "cell":
-                        for gate in net.gates.values():
-                            botx = min(botx, gate.x)
-                            boty = min(boty, gate.y)
-                            topx = max(topx, gate.x+gate.width)
-                            topy = max(topy, gate.y+gate.height)
-                    # Bounds computed based on the coordinates of the pin in the cell.
-                    elif method == "pin":
-                        for gate in net.gates.values():
-                            # Which pin is the net connected to?
-                            gatePinName = net.gatePins[gate.name]
-                            stdCell = macros[gate.stdCell]
-                            gatePin = stdCell.pins[gatePinName]
-                            for port in gatePin.ports:
-                                botx = min(botx, gate.absoluteCoordinate([port.x,port.y])[0])
-                                boty = min(boty, gate.absoluteCoordinate([port.x,port.y])[1])
-                                topx = max(topx, gate.absoluteCoordinate([port.x+port.width,port.y+port.height])[0])
-                                topy = max(topy, gate.absoluteCoordinate([port.x+port.width,port.y+port.height])[1])
-                    else:
-                        logger.error("Unknown method '{}' to compute bounding box.".format(method))
-                        sys.exit()
-                    for pin in net.pins.values():
-                        botx = min(botx, pin.x)
-                        boty = min(boty, pin.y)
-                        topx = max(topx, pin.x)
-                        topy = max(topy, pin.y)
-                    net.bb = [[botx, boty], [topx, topy]]
-                    net.computeHPL()
-                    outStr += str(net.hpl)
-                    outStr += " {} {} {} {}\n".format(botx, boty, topx, topy)
-                    newDiff = (net.wl - net.hpl)/net.wl
-                    diff.append(newDiff)
-                    # Look for the minimal newDiff, meaning an overestimated HPL (HPL>WL)
-                    if mostOverestimated > newDiff:
-                        mostOverestimated = newDiff
-                        mostOverestimatedNet = net
-                    # Look for the maximal newDiff, meaning an underestimated HPL (HPL<WL)
-                    if mostUnderestimated < newDiff:
-                        mostUnderestimated = newDiff
-                        mostUnderestimatedNet = net
-                    # if net.name == "n_43387":
-                    #     logger.debug("BB: {}, HPL: {}, wl: {}".format(net.bb, net.hpl, net.wl))
-                else:
+                connections.append(len(net.gates))
+                if (len(net.gates) + len(net.pins)) <= 1:
                     ignoredNets += 1
+                    considered.append(False)
+                    continue
+                considered.append(True)
+                nets.append(net)
+                if method == "cell":
+                    pointGates.extend(gateIDs[gateName] for gateName in net.gates.keys())
+                for pin in net.pins.values():
+                    pinX.append(pin.x)
+                    pinY.append(pin.y)
+                pinCounts.append(len(net.pins))
+                if any(type(pin.x) is int or type(pin.y) is int for pin in net.pins.values()) or \
+                        (method == "cell" and any(type(gate.x) is int or type(gate.y) is int for gate in net.gates.values())):
+                    intNets.append(len(nets) - 1)
+
+        considered = np.array(considered, dtype=bool)
+        connections = np.array(connections, dtype=np.int64)
+        if method == "cell":
+            gateCounts = connections[considered]
+            pointGates = np.array(pointGates, dtype=np.int64)
+            lowX = np.array([gate.x for gate in self.gates.values()], dtype=np.float64)[pointGates]
+            lowY = np.array([gate.y for gate in self.gates.values()], dtype=np.float64)[pointGates]
+            highX = lowX + np.array([gate.width for gate in self.gates.values()], dtype=np.float64)[pointGates]
+            highY = lowY + np.array([gate.height for gate in self.gates.values()], dtype=np.float64)[pointGates]
+        else:
+            portTable = self.connectionPortTable()
+            netPorts = segmentReduce(np.add, portTable.portCounts(), connections, 0).astype(np.int64)
+            gateCounts = netPorts[considered]
+            points = np.repeat(considered, netPorts)
+            lowX = portTable.lowX[points]
+            lowY = portTable.lowY[points]
+            highX = portTable.highX[points]
+            highY = portTable.highY[points]
+        pinX = np.array(pinX, dtype=np.float64)
+        pinY = np.array(pinY, dtype=np.float64)
+        pinCounts = np.array(pinCounts, dtype=np.int64)
+
+        inf = float("inf")
+        botx = np.minimum(segmentReduce(np.minimum, lowX, gateCounts, inf), segmentReduce(np.minimum, pinX, pinCounts, inf))
+        boty = np.minimum(segmentReduce(np.minimum, lowY, gateCounts, inf), segmentReduce(np.minimum, pinY, pinCounts, inf))
+        topx = np.maximum(segmentReduce(np.maximum, highX, gateCounts, -inf), segmentReduce(np.maximum, pinX, pinCounts, -inf))
+        topy = np.maximum(segmentReduce(np.maximum, highY, gateCounts, -inf), segmentReduce(np.maximum, pinY, pinCounts, -inf))
+        # The top corner starts at 0: it stays the int 0 if no coordinate is above.
+        topxZero = topx <= 0
+        topyZero = topy <= 0
+        topx[topxZero] = 0
+        topy[topyZero] = 0
+        hpl = topx - botx + topy - boty
+
+        for net in nets:
+            if net.wl == 0:
+                logger.error("Net '{}' has a null length, which is not normal.".format(net.name))
+                net.wl = 0.1
+                # sys.exit()
+        wl = np.array([net.wl for net in nets], dtype=np.float64)
+        diffs = (wl - hpl)/wl
+
+        botx = botx.tolist()
+        boty = boty.tolist()
+        topx = [0 if zero else value for value, zero in zip(topx.tolist(), topxZero.tolist())]
+        topy = [0 if zero else value for value, zero in zip(topy.tolist(), topyZero.tolist())]
+        hpl = hpl.tolist()
+        # An int coordinate is kept as such in the bounding box when it is its first bound, as min() and max() would.
+        gatePtr = np.concatenate(([0], np.cumsum(gateCounts))).tolist()
+        for i in intNets:
+            if method == "cell":
+                gates = nets[i].gates.values()
+                gateBounds = ([gate.x for gate in gates], [gate.y for gate in gates],
+                              [gate.x+gate.width for gate in gates], [gate.y+gate.height for gate in gates])
+            else:
+                gatePoints = slice(gatePtr[i], gatePtr[i + 1])
+                gateBounds = (lowX[gatePoints].tolist(), lowY[gatePoints].tolist(), highX[gatePoints].tolist(), highY[gatePoints].tolist())
+            pins = nets[i].pins.values()
+            botx[i] = min([float("inf")] + gateBounds[0] + [pin.x for pin in pins])
+            boty[i] = min([float("inf")] + gateBounds[1] + [pin.y for pin in pins])
+            topx[i] = max([0] + gateBounds[2] + [pin.x for pin in pins])
+            topy[i] = max([0] + gateBounds[3] + [pin.y for pin in pins])
+            hpl[i] = topx[i] - botx[i] + topy[i] - boty[i]
+        for i, net in enumerate(nets):
+            net.bb = [[botx[i], boty[i]], [topx[i], topy[i]]]
+            net.hpl = hpl[i]
+
+        outfile = "hpl.out"
+        logger.info("Exporting HPL to {}".format(outfile))
+        with open(outfile, 'w') as f:
+            f.writelines(map("{} {} {} {} {} {}\n".format, [net.name for net in nets], hpl, botx, boty, topx, topy))
+
+        diff = diffs.tolist()
+        # Minimal diff, meaning the most overestimated HPL (HPL>WL), and maximal diff, the most underestimated (HPL<WL).
+        mostOverestimatedNet = nets[int(np.argmin(diffs))]
+        mostOverestimated = diff[int(np.argmin(diffs))]
+        mostUnderestimatedNet = nets[int(np.argmax(diffs))]
+        mostUnderestimated = diff[int(np.argmax(diffs))]
         logger.info("{} nets were ignored for lack of connection ({}%)".format(ignoredNets, 100*ignoredNets/len(self.nets)))
         logger.info("### Most overstimated HPL: '{}'".format(mostOverestimatedNet.name))
         logger.info("## WL-HPL skew: {}".format(mostOverestimated))
@@ -458,11 +930,6 @@ class Design:
         logger.info("--- BB stats over (WL - HPL)/WL ---")
         logger.info("Mean: {}, median: {}, stdev: {}, min: {}, max: {}".format(statistics.mean(diff), statistics.median(diff), statistics.stdev(diff), min(diff), max(diff)))
 
-        outfile = "hpl.out"
-        logger.info("Exporting HPL to {}".format(outfile))
-        with open(outfile, 'w') as f:
-            f.write(outStr)
-
 
 
 
@@ -546,15 +1013,143 @@ class Design:
 
 
 
-    def ReadArea(self):
+    def parseDef(self, manhattanWireLength=False, mmstWireLength=False, cnWireLength=False, useIndex=False, jobs=1, rmstWireLength=False, rsmtWireLength=False, stopAfter=None):
+        """
+        Read the whole DEF in a single pass.
+
+        Each statement is dispatched to its parser as soon as it is met:
+        DIEAREA, TRACKS, COMPONENTS, PINS, SPECIALNETS and NETS.
+        The sections are expected in the order of the LEF/DEF reference
+        (lefdefref v5.8, p.225), meaning COMPONENTS and PINS come before
+        SPECIALNETS and NETS. Reading stops at 'END NETS', or earlier with stopAfter.
+
+        Parameters:
+        -----------
+        manhattanWireLength, mmstWireLength, cnWireLength, rmstWireLength, rsmtWireLength : bool
+            Wire length estimation, see extractNets().
+        useIndex : bool
+            Seek straight to the statements using the byte offset index of the DEF,
+            built and stored on first use (see def_index).
+        jobs : int
+            Amount of processes parsing the NETS section, see extractNets().
+        stopAfter : str
+            One of def_index.STATEMENTS, e.g. 'COMPONENTS', after which reading stops.
+            The sections after it are neither parsed nor exported: with 'COMPONENTS',
+            only the die area, tracks and gates are read and CellSizes.out is the
+            only file written.
+        """
+        if stopAfter is not None and stopAfter not in def_index.STATEMENTS:
+            raise ValueError("Unknown DEF statement '{}', expected one of {}".format(stopAfter, def_index.STATEMENTS))
+        sections = def_index.STATEMENTS[:def_index.STATEMENTS.index(stopAfter) + 1] if stopAfter else def_index.STATEMENTS
         logger.debug("Reading def file {}".format(deffile))
-        with open(deffile, 'r') as f:
-            for line in f: # Read the file sequentially
-                if 'DIEAREA' in line:
-                    area = line.split(' ')
-                    self.setWidth(int(area[6])/UNITS_DISTANCE_MICRONS)
-                    self.setHeight(int(area[7])/UNITS_DISTANCE_MICRONS)
-                    self.setArea()
+        uBumpStrfname = "uBumps.out"
+        uBumpCount = 0
+
+        mm = def_index.openDef(deffile)
+        index = None
+        if useIndex:
+            index = def_index.getIndex(deffile, mm)
+        with mm, open(uBumpStrfname, 'w') if 'SPECIALNETS' in sections else contextlib.nullcontext() as uBumpFile:
+            if uBumpFile:
+                uBumpFile.write("BumpName x y\n")
+            with alive_bar() as bar:
+                reader = DefReader(mm, bar)
+                for line in reader.statements(index, stopAfter):
+                    split = line.split()
+                    keyword = split[0] if split else ""
+
+                    if keyword == 'DIEAREA':
+                        self.ReadArea(line)
+                    elif keyword == 'TRACKS':
+                        self.extractTracks(line)
+                    elif keyword == 'COMPONENTS':
+                        self.ExtractCells(reader)
+                    elif keyword == 'PINS':
+                        self.extractPins(reader)
+                    elif keyword == 'SPECIALNETS':
+                        uBumpCount += self.extractSpecialNets(reader, uBumpFile)
+                    elif keyword == 'NETS':
+                        self.extractNets(reader, manhattanWireLength, mmstWireLength, cnWireLength, jobs, index, rmstWireLength, rsmtWireLength)
+                        break # Nothing of interest after the nets.
+
+        if 'SPECIALNETS' in sections:
+            logger.info("Exported cells dimensions to {} ({} ubumps)".format(uBumpStrfname, uBumpCount))
+
+    def parseDefCached(self, tech, manhattanWireLength=False, mmstWireLength=False, cnWireLength=False, useIndex=False, jobs=1, rmstWireLength=False, rsmtWireLength=False):
+        """
+        Same as parseDef(), but load the design from its cache if the DEF and
+        the settings did not change since it was stored. Otherwise, parse the
+        DEF and store the design in the cache (see design_cache).
+
+        Parameters:
+        -----------
+        tech : str
+            LEF tech, part of the cache key as the cells dimensions depend on it.
+        manhattanWireLength, mmstWireLength, cnWireLength, useIndex, jobs, rmstWireLength, rsmtWireLength :
+            See parseDef().
+        """
+        if manhattanWireLength:
+            wlModel = "manhattan"
+        elif mmstWireLength:
+            wlModel = "mmst"
+        elif cnWireLength:
+            wlModel = "cn"
+        elif rmstWireLength:
+            wlModel = "rmst"
+        elif rsmtWireLength:
+            wlModel = "rsmt"
+        else:
+            wlModel = "routed"
+        path = design_cache.cachePath(deffile, wlModel)
+        with def_index.openDef(deffile) as mm:
+            key = design_cache.cacheKey(deffile, mm, UNITS_DISTANCE_MICRONS, tech, wlModel)
+        if design_cache.load(self, key, path):
+            return
+        self.parseDef(manhattanWireLength, mmstWireLength, cnWireLength, useIndex, jobs, rmstWireLength, rsmtWireLength)
+        try:
+            design_cache.save(self, key, path)
+        except OSError as e:
+            logger.warning("Could not store the design cache: {}".format(e))
+
+    def compact(self):
+        """
+        Move the parsed gates, pins and nets into a DesignStore.
+
+        self.gates, self.pins and self.nets are replaced by views over the
+        store, which keep the attributes of Gate, Pin and Net but use a
+        fraction of their memory. The connections of the nets and gates
+        cannot be modified anymore.
+        """
+        self.store = DesignStore(self.gates, self.pins, self.nets)
+        self.gates, self.pins, self.nets = self.store.views()
+        logger.info("Design stored as arrays: {} gates, {} pins, {} nets".format(len(self.gates), len(self.pins), len(self.nets)))
+
+    def ReadArea(self, line):
+        """
+        Parse the DIEAREA statement:
+            DIEAREA ( 0 0 ) ( 3000000 2000000 ) ;
+        """
+        area = line.split(' ')
+        self.setWidth(int(area[6])/UNITS_DISTANCE_MICRONS)
+        self.setHeight(int(area[7])/UNITS_DISTANCE_MICRONS)
+        self.setArea()
+
+    def extractTracks(self, line):
+        """
+        Extract metal layers names:
+        lefdefref v5.8, p.336.
+        Lines should look like
+            TRACKS X 450 DO 2312 STEP 720 LAYER PRM10 ;
+        or
+            TRACKS Y 320 DO 5917 STEP 480 MASK 1 LAYER PRM4 ;
+        """
+        line = line.strip()
+        layerName = ""
+        if line.split(' ')[7] == "MASK":
+            layerName = line.split(' ')[10]
+        else:
+            layerName = line.split(' ')[8]
+        self.metalLayers.add(layerName)
 
     # def AssignStdCellToGate(self, gate, stdCell):
     #     """ Assign a standard cell to a gate
@@ -578,103 +1173,101 @@ class Design:
     ##          ##  ##        ##      ##     ##  ##         ##         ##         
     #########  ##    ##       ##       #######   #########  #########  #########  
 
-    def ExtractCells(self):
+    def ExtractCells(self, reader):
+        """
+        Parse the COMPONENTS section, from the line following the 'COMPONENTS'
+        statement up to 'END COMPONENTS'.
+
+        Parameters:
+        -----------
+        reader : DefReader
+        """
         logger.debug("Reading the def to extract cells.")
 
-        inComponents = False
-        endOfComponents = False
         unknownCellsCounts = 0
-        cellSizeStr = "cell width height\n"
 
-        with open(deffile, 'r') as f:
-            with alive_bar() as bar:
-                for line in f:
-                    bar()
-                    # TODO: clean to remove the use of break
-                    # TODO: try to need less try/except
-                    if endOfComponents:
-                        break # Dirty, but I don't care
-                    if inComponents and not 'END COMPONENTS' in line and not 'HALO' in line and not 'PROPERTY' in line:
-                        # Parse the line and extract the cell
-                        line = line.strip()
-                        split = line.split(' ')
-                        # print(split)
+        cellSizeStrfname = "CellSizes.out"
+        logger.info("Exporting cells dimensions to {}".format(cellSizeStrfname))
+        with open(cellSizeStrfname, 'w') as cellSizeFile:
+            cellSizeFile.write("cell width height\n")
+            line = reader.readline()
+            while line and not 'END COMPONENTS' in line:
+                # TODO: try to need less try/except
+                if not 'HALO' in line and not 'PROPERTY' in line:
+                    # Parse the line and extract the cell
+                    line = line.strip()
+                    split = line.split(' ')
+                    # print(split)
+                    try:
+                        split.index(";")
+                    except:
+                        gate = Gate(split[1])
+                        # AssignStdCellToGate(gate, macros[split[2]])
+                        gate.setStdCell(split[2])
+                        # if macros.get(gate.getStdCell()) == None:
+                        #     print "Macro not found when looking for cell '" + str(gate.name) + "' of type '" + gate.getStdCell() + "'"
+                        if gate.getStdCell() in unknownCells:
+                            # StdCell missing from the .lef file. Use default width/height
+                            gate.setWidth(0.25)
+                            gate.setHeight(0.25)
+                            unknownCellsCounts += 1
+                        else:
+                            try:
+                                gate.setWidth(macros.get(gate.getStdCell()).width) # Get the width from the macros dictionary.
+                                gate.setHeight(macros.get(gate.getStdCell()).height) # Get the height from the macros dictionary.
+                                if gate.getStdCell() in memoryMacros:
+                                    gate.isMemory = True
+                                    # logger.debug("Cell '{}' is a memory macro of type '{}'".format(gate.name, gate.getStdCell()))
+                            except:
+                                logger.error("Could not find the macro '{}' while parsing the line\n{}\nThis macro might be missing from the LEF file. \nExiting.".format(gate.getStdCell(), line))
+                                sys.exit()
+                        cellSizeFile.write("{} {} {}\n".format(gate.name, gate.width, gate.height))
+                        """
+                        A cell is always defined on a single line.
+                        On this line, its coordinates are written as
+                        'PLACED ( <abscissa> <ordinate> )'
+                        Hence, we simply need to find the 'PLACE' keyword
+                        and take the second and third token to extract
+                        the coordinates.
+                        """
+                        # TODO: Is there a way to search the index for two words?
+                        # Like index("PLACED" | "FIXED')
                         try:
-                            split.index(";")
+                            gate.setX(int(split[split.index("PLACED") + 2])/UNITS_DISTANCE_MICRONS)
                         except:
-                            gate = Gate(split[1])
-                            # AssignStdCellToGate(gate, macros[split[2]])
-                            gate.setStdCell(split[2])
-                            # if macros.get(gate.getStdCell()) == None:
-                            #     print "Macro not found when looking for cell '" + str(gate.name) + "' of type '" + gate.getStdCell() + "'"
-                            if gate.getStdCell() in unknownCells:
-                                # StdCell missing from the .lef file. Use default width/height
-                                gate.setWidth(0.25)
-                                gate.setHeight(0.25)
-                                unknownCellsCounts += 1
-                            else:
-                                try:
-                                    gate.setWidth(macros.get(gate.getStdCell()).width) # Get the width from the macros dictionary.
-                                    gate.setHeight(macros.get(gate.getStdCell()).height) # Get the height from the macros dictionary.
-                                    if gate.getStdCell() in memoryMacros:
-                                        gate.isMemory = True
-                                        # logger.debug("Cell '{}' is a memory macro of type '{}'".format(gate.name, gate.getStdCell()))
-                                except:
-                                    logger.error("Could not find the macro '{}' while parsing the line\n{}\nThis macro might be missing from the LEF file. \nExiting.".format(gate.getStdCell(), line))
-                                    sys.exit()
-                            cellSizeStr += "{} {} {}\n".format(gate.name, gate.width, gate.height)
-                            """
-                            A cell is always defined on a single line.
-                            On this line, its coordinates are written as
-                            'PLACED ( <abscissa> <ordinate> )'
-                            Hence, we simply need to find the 'PLACE' keyword
-                            and take the second and third token to extract
-                            the coordinates.
-                            """
-                            # TODO: Is there a way to search the index for two words?
-                            # Like index("PLACED" | "FIXED')
                             try:
-                                gate.setX(int(split[split.index("PLACED") + 2])/UNITS_DISTANCE_MICRONS)
+                                gate.setX(int(split[split.index("FIXED") + 2])/UNITS_DISTANCE_MICRONS)
                             except:
-                                try:
-                                    gate.setX(int(split[split.index("FIXED") + 2])/UNITS_DISTANCE_MICRONS)
-                                except:
-                                    # If this raises an exception, it probably means
-                                    # we reached the 'END COMPONENTS'
-                                    pass
+                                # If this raises an exception, it probably means
+                                # we reached the 'END COMPONENTS'
+                                pass
 
+                        try:
+                            gate.orientation = split[split.index("PLACED") + 5].strip()
+                        except:
                             try:
-                                gate.orientation = split[split.index("PLACED") + 5].strip()
+                                gate.orientation = split[split.index("FIXED") + 5].strip()
                             except:
-                                try:
-                                    gate.orientation = split[split.index("FIXED") + 5].strip()
-                                except:
-                                    # If this raises an exception, it probably means
-                                    # we reached the 'END COMPONENTS'
-                                    pass
+                                # If this raises an exception, it probably means
+                                # we reached the 'END COMPONENTS'
+                                pass
 
+                        try:
+                            gate.setY(int(split[split.index("PLACED") + 3])/UNITS_DISTANCE_MICRONS)
+                        except:
                             try:
-                                gate.setY(int(split[split.index("PLACED") + 3])/UNITS_DISTANCE_MICRONS)
+                                gate.setY(int(split[split.index("FIXED") + 3])/UNITS_DISTANCE_MICRONS)
                             except:
-                                try:
-                                    gate.setY(int(split[split.index("FIXED") + 3])/UNITS_DISTANCE_MICRONS)
-                                except:
-                                    pass
-                                else:
-                                    self.addGate(gate)
+                                pass
                             else:
                                 self.addGate(gate)
-                            # if gate.stdCell == "FRONT_BUMP":
-                            #     uBumpStr += "{} {} {}\n".format(gate.name, gate.x, gate.y)
-                            # endOfComponents = True
-
-
-                    if 'END COMPONENTS' in line:
-                        inComponents = False
-                        endOfComponents = True
+                        else:
+                            self.addGate(gate)
+                        # if gate.stdCell == "FRONT_BUMP":
+                        #     uBumpStr += "{} {} {}\n".format(gate.name, gate.x, gate.y)
+                        # endOfComponents = True
 
-                    elif 'COMPONENTS' in line:
-                        inComponents = True
+                line = reader.readline()
 
         """
         Compute the total surface of all the gates.
@@ -684,10 +1277,6 @@ class Design:
         logger.debug("Total area of the gates: {} ({}% of total area)".format(self.gatesArea, 100*self.gatesArea/self.area))
         logger.debug("Unknown cell encountered: {}".format(unknownCellsCounts))
         # exit()
-        cellSizeStrfname = "CellSizes.out"
-        logger.info("Exporting cells dimensions to {}".format(cellSizeStrfname))
-        with open(cellSizeStrfname, 'w') as f:
-            f.write(cellSizeStr)
 
 
     #########  ##    ##   ##########  ########   ########   ##      ##   #######   
@@ -698,91 +1287,200 @@ class Design:
     ##          ##  ##        ##      ##            ##      ##     ###  ##     ##  
     #########  ##    ##       ##      ##         ########   ##      ##   #######   
 
-    def extractPins(self):
+    def extractPins(self, reader):
+        """
+        Parse the PINS section, from the line following the 'PINS'
+        statement up to 'END PINS'.
+
+        Parameters:
+        -----------
+        reader : DefReader
+        """
         logger.debug("Reading the def to extract pins.")
 
-        inPins = False
+        line = reader.readline()
+        while line:
+            line = line.strip()
+            nextLine = ""
 
-        uBumpStr = "BumpName x y\n"
+            if 'END PINS' in line:
+                break
 
-        with open(deffile, 'r') as f:
-            line = f.readline()
-            line = line.strip()
-            while line:
-                line = line.strip()
-                nextLine = ""
-
-                if 'PINS ' in line:
-                    inPins = True
-
-                elif 'END PINS' in line:
-                    break
-
-                if inPins and '- ' in line:
-                    # print(line.split(' '))
-                    # Create the pin gate with its name
-                    pin = Pin(line.split(' ')[1])
-                    # netIndex = line.split(' ').index("NET")
-                    # pin.net = self.nets[line.split(' ')[netIndex + 1]]
-                    nextLine = f.readline()
+            if '- ' in line:
+                # print(line.split(' '))
+                # Create the pin gate with its name
+                pin = Pin(line.split(' ')[1])
+                # netIndex = line.split(' ').index("NET")
+                # pin.net = self.nets[line.split(' ')[netIndex + 1]]
+                nextLine = reader.readline()
+                nextLine = nextLine.strip()
+
+                # Skip everything up to the 'PLACED' keyword
+                while not ' PLACED ' in nextLine and not '- ' in nextLine and not 'END PINS' in nextLine:
+                    nextLine = reader.readline()
                     nextLine = nextLine.strip()
 
-                    # Skip everything up to the 'PLACED' keyword
-                    while not ' PLACED ' in nextLine and not '- ' in nextLine and not 'END PINS' in nextLine:
-                        nextLine = f.readline()
-                        nextLine = nextLine.strip()
+                if ' PLACED ' in nextLine:
+                    # Now we are at the 'PLACED' line
+                    pin.setX(int(nextLine.split(' ')[nextLine.split(' ').index("PLACED") + 2])/UNITS_DISTANCE_MICRONS)
+                    pin.setY(int(nextLine.split(' ')[nextLine.split(' ').index("PLACED") + 3])/UNITS_DISTANCE_MICRONS)
+                else:
+                    # Could not find a 'placed' instruction for the pin.
+                    pin.placed = False
+                    pin.setX(0)
+                    pin.setY(0)
 
-                    if ' PLACED ' in nextLine:
-                        # Now we are at the 'PLACED' line
-                        pin.setX(int(nextLine.split(' ')[nextLine.split(' ').index("PLACED") + 2])/UNITS_DISTANCE_MICRONS)
-                        pin.setY(int(nextLine.split(' ')[nextLine.split(' ').index("PLACED") + 3])/UNITS_DISTANCE_MICRONS)
-                    else:
-                        # Could not find a 'placed' instruction for the pin.
-                        pin.placed = False
-                        pin.setX(0)
-                        pin.setY(0)
+                self.addPin(pin)
 
-                    self.addPin(pin)
+            if '- ' in nextLine or 'END PINS' in nextLine:
+                line = nextLine
+            else:
+                line = reader.readline()
+        logger.warning("Some pins were not placed by the PnR tool.\nThose were assigned default (0,0) coordinates.\n Approximate coordinates will be guessed from the connected gate through a closest-edge projection.")
 
-                if '- ' in nextLine or 'END PINS' in nextLine:
-                    line = nextLine
-                else:
-                    line = f.readline()
-            logger.warning("Some pins were not placed by the PnR tool.\nThose were assigned default (0,0) coordinates.\n Approximate coordinates will be guessed from the connected gate through a closest-edge projection.")
+    def extractSpecialNets(self, reader, uBumpFile):
+        """
+        Parse the SPECIALNETS section, from the line following the 'SPECIALNETS'
+        statement up to 'END SPECIALNETS', looking for unknown pin coordinates.
 
+        Parameters:
+        -----------
+        reader : DefReader
+        uBumpFile : file
+            'uBumps.out', where the bumps found are written.
+
+        Return:
+        -------
+        int
+            Number of bumps written.
+        """
         logger.info("Looking through the SPECIALNETS for unknown pin coordinates...")
-        inSpecialnets = False
-        with open(deffile, 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                if "SPECIALNETS" in line and not inSpecialnets:
-                    inSpecialnets = True
-                elif "END SPECIALNETS" in line:
-                    inSpecialnets = False
-                if inSpecialnets and "- " in line:
-                    specialnet = line.split()[1]
-                    if specialnet in self.pins.keys():
-                        # In this instance, we have pins that have not been placed.
-                        # However, we also have specialnets holding the same name and connected to BUMPS.
-                        # Those bumps are actually 3D structures connecting two dies together and is a component
-                        # that has been placed. We can thus reuse that placement information from the bump
-                        # for the pin.
-                        # This is crucial to have a more accurate wire-length estimation for 3D nets connected to such pins.
-                        bumpName = line.split()[3]
-                        self.pins[specialnet].setX(self.gates[bumpName].x)
-                        self.pins[specialnet].setY(self.gates[bumpName].y)
-                        self.pins[specialnet].placed = True
-                        if self.gates[bumpName].stdCell == "FRONT_BUMP":
-                            uBumpStr += "{} {} {}\n".format(self.gates[bumpName].name, self.gates[bumpName].x, self.gates[bumpName].y)
-        uBumpStrfname = "uBumps.out"
-        logger.info("Exporting cells dimensions to {} ({} ubumps)".format(uBumpStrfname, len(uBumpStr.split('\n'))-1))
-        with open(uBumpStrfname, 'w') as f:
-            f.write(uBumpStr)
+        uBumpCount = 0
+        line = reader.readline()
+        while line and not "END SPECIALNETS" in line:
+            if "- " in line:
+                specialnet = line.split()[1]
+                if specialnet in self.pins.keys():
+                    # In this instance, we have pins that have not been placed.
+                    # However, we also have specialnets holding the same name and connected to BUMPS.
+                    # Those bumps are actually 3D structures connecting two dies together and is a component
+                    # that has been placed. We can thus reuse that placement information from the bump
+                    # for the pin.
+                    # This is crucial to have a more accurate wire-length estimation for 3D nets connected to such pins.
+                    bumpName = line.split()[3]
+                    self.pins[specialnet].setX(self.gates[bumpName].x)
+                    self.pins[specialnet].setY(self.gates[bumpName].y)
+                    self.pins[specialnet].placed = True
+                    if self.gates[bumpName].stdCell == "FRONT_BUMP":
+                        uBumpFile.write("{} {} {}\n".format(self.gates[bumpName].name, self.gates[bumpName].x, self.gates[bumpName].y))
+                        uBumpCount += 1
+            line = reader.readline()
+        return uBumpCount
+
+
+
+
+    def buildPortTable(self, nets):
+        """
+        Compute the absolute coordinates of the ports of every (gate, pin) connection of the nets
+        at once, whatever the orientation of the gates, see absoluteCoordinates().
 
+        Parameters
+        ----------
+        nets : iterable of Net
+            The connections are numbered in this order, then in the order of Net.gates.
 
+        Returns
+        -------
+        PortTable
+        """
+        gates = list(self.gates.values())
+        gateIDs = {gate.name: i for i, gate in enumerate(gates)}
+        portIDs = dict() # {(std cell, pin name) : [port index]}
+        ports = list() # [center x, center y, x, y, x + width, y + height] of each port, relative to its cell
+        connectionGates = list()
+        connectionPorts = list() # Ports of all the connections, one after the other
+        portCounts = list() # Amount of ports of each connection
+        for net in nets:
+            for gate in net.gates.values():
+                key = (gate.stdCell, net.gatePins[gate.name])
+                if key not in portIDs:
+                    gatePorts = macros[key[0]].pins[key[1]].ports
+                    portIDs[key] = list(range(len(ports), len(ports) + len(gatePorts)))
+                    ports.extend([port.center[0], port.center[1], port.x, port.y, port.x+port.width, port.y+port.height] for port in gatePorts)
+                connectionGates.append(gateIDs[gate.name])
+                connectionPorts.extend(portIDs[key])
+                portCounts.append(len(portIDs[key]))
+
+        orientationCodes = {orientation: i for i, orientation in enumerate(ORIENTATIONS)}
+        portGates = np.repeat(np.array(connectionGates, dtype=np.int64), portCounts)
+        cell = (np.array([orientationCodes.get(gate.orientation, -1) for gate in gates], dtype=np.int64)[portGates],
+                np.array([gate.x for gate in gates], dtype=np.float64)[portGates],
+                np.array([gate.y for gate in gates], dtype=np.float64)[portGates],
+                np.array([gate.width for gate in gates], dtype=np.float64)[portGates],
+                np.array([gate.height for gate in gates], dtype=np.float64)[portGates])
+        ports = np.array(ports, dtype=np.float64).reshape(-1, 6)[np.array(connectionPorts, dtype=np.int64)]
+        centerX, centerY = absoluteCoordinates(*cell, ports[:, 0], ports[:, 1])
+        lowX, lowY = absoluteCoordinates(*cell, ports[:, 2], ports[:, 3])
+        highX, highY = absoluteCoordinates(*cell, ports[:, 4], ports[:, 5])
+        connectionPtr = np.concatenate(([0], np.cumsum(portCounts, dtype=np.int64)))
+        return PortTable(connectionPtr, centerX, centerY, lowX, lowY, highX, highY)
+
+    def connectionPortTable(self):
+        """
+        PortTable of the nets of the design, computed on first use when the design
+        was not parsed from the DEF (e.g. loaded from the cache).
+        """
+        if self.portTable is None:
+            self.portTable = self.buildPortTable(self.nets.values())
+        return self.portTable
 
+    def netPoints(self, nets, portTable):
+        """
+        Points of the cells of the nets, for the estimators of wirelength.py:
+        the position of each pin, the centers of the ports of each gate.
+        The cells of a net are in the order of Net.gatePins.
 
-    def setPinCoordinates(self, net):
+        Parameters
+        ----------
+        nets : list of Net
+            Same order as the connections of portTable.
+        portTable : PortTable
+
+        Returns
+        -------
+        tuple
+            (x, y, cellPtr, netPtr), see wirelength.py.
+        """
+        pinNames = [name for net in nets for name, pinName in net.gatePins.items() if pinName == "PIN"]
+        # Pins follow the ports of the table.
+        x = np.concatenate((portTable.centerX, np.array([self.pins[name].x for name in pinNames], dtype=np.float64)))
+        y = np.concatenate((portTable.centerY, np.array([self.pins[name].y for name in pinNames], dtype=np.float64)))
+        starts = list() # First point of each cell
+        counts = list() # Amount of points of each cell
+        cellCounts = list() # Amount of cells of each net
+        connectionPtr = portTable.connectionPtr.tolist()
+        connection = 0
+        pin = len(portTable.centerX)
+        for net in nets:
+            for pinName in net.gatePins.values():
+                if pinName == "PIN":
+                    starts.append(pin)
+                    counts.append(1)
+                    pin += 1
+                else:
+                    starts.append(connectionPtr[connection])
+                    counts.append(connectionPtr[connection + 1] - connectionPtr[connection])
+                    connection += 1
+            cellCounts.append(len(net.gatePins))
+        counts = np.array(counts, dtype=np.int64)
+        cellPtr = np.concatenate(([0], np.cumsum(counts)))
+        # Index of each point in x and y: the points of a cell are contiguous there.
+        points = np.repeat(np.array(starts, dtype=np.int64) - cellPtr[:-1], counts) + np.arange(cellPtr[-1])
+        netPtr = np.concatenate(([0], np.cumsum(cellCounts, dtype=np.int64)))
+        return x[points], y[points], cellPtr, netPtr
+
+    def setPinCoordinates(self, net, portCenters):
         """
         The Pin in this Net has default (0,0) coordinates.
         This happens when the PnR tool did not place the pins. In that case, the net with only a pin and a standard cell would have a null length has it could not be routed. This is problematic has we lose information.
@@ -795,6 +1493,8 @@ class Design:
         Parameters
         ----------
         net: Net
+        portCenters: dict
+            {gate name : [[x, y] of each port the net is connected to]}, see PortTable.centers().
         """
         closestCoord = float('inf')
         tempCoord = [0,0]
@@ -808,11 +1508,7 @@ class Design:
         # logger.debug("Net: '{}', {} gates".format(net.name, len(net.gates)))
 
         for gate in net.gates.values():
-            stdCellName = gate.stdCell
-            gatePin = macros[stdCellName].pins[net.gatePins[gate.name]]
-            # logger.debug("Gate '{}', stdcell {}, pin {}, {} ports".format(gate.name, stdCellName, gatePin.name, len(gatePin.ports)))
-            for port in gatePin.ports:
-                portCoordinates = gate.absoluteCoordinate(port.center)
+            for portCoordinates in portCenters[gate.name]:
                 # logger.debug("Port with coordinates {}".format(portCoordinates))
                 # logger.debug("Begining: closestCoord={}".format(closestCoord))
 
@@ -855,529 +1551,218 @@ class Design:
     ##          ##  ##        ##      ##     ###  ##             ##      ##     ##  
     #########  ##    ##       ##      ##      ##  #########      ##       #######   
 
-    def extractNets(self, manhattanWireLength=False, mmstWireLength=False, cnWireLength=False):
+    def extractNets(self, reader, manhattanWireLength=False, mmstWireLength=False, cnWireLength=False, jobs=1, index=None, rmstWireLength=False, rsmtWireLength=False):
         """
-        *Extract net routes:
-        lefdefref v5.8, p.261.
+        Parse the NETS section, from the line following the 'NETS'
+        statement up to 'END NETS'.
 
-        *Extract metal layers names:
-        lefdefref v5.8, p.336.
-        Lines should look like 
-            TRACKS X 450 DO 2312 STEP 720 LAYER PRM10 ;
-        or
-            TRACKS Y 320 DO 5917 STEP 480 MASK 1 LAYER PRM4 ;
+        The records are read by readNetRecords(), then connected to the gates
+        and pins of the design in the order of the DEF.
+
+        Parameters:
+        -----------
+        reader : DefReader
+        manhattanWireLength : bool
+            Nets wirelength as Manhattan distance.
+        mmstWireLength : bool
+            Nets wirelength as MMST.
+        cnWireLength : bool
+            Nets wirelength as Closest Neighbourg.
+        jobs : int
+            Amount of worker processes reading the records, see netRecordsParallel().
+        index : def_index.DefIndex
+            Byte offset index of the DEF, used to split the section between the jobs.
+        rmstWireLength : bool
+            Nets wirelength as their exact RMST, see wirelength.rmst().
+        rsmtWireLength : bool
+            Nets wirelength as their RSMT, see wirelength.rsmt().
         """
         logger.debug("Reading the def to extract nets.")
 
-        inNets = False
-        instancesPerNetsStr = "" # String containing the content of 'InstancesPerNet.out'.
-        netsStr = "" # String containing the content of 'Nets.out'
-        wlNetsStr = "NET NUM_PINS LENGTH\n" # String containing the content of 'WLnets.out'.
-                                              # The 'NUM_PINS' part is the number of gates + the number of pins.
-        cellCoordStr = "" # String containing the content of 'CellCoord.out'
-
-        netCount = 0
         pinDefaultCoord = False # Pin has real coordinates. If True, need to call setPinCoordinates(...) to approximate them. This happens when the pin was not placed during the PnR and thus has no "PLACED" statement, hence no coordinates, so defaulted to (0,0).
 
-        with open(deffile, 'r') as f:
-            with alive_bar() as bar:
-                line = f.readline().strip()
-                while line:
-                    line = line.strip()
-
-                    # Extract Metal Layer name
-                    if 'TRACKS' in line:
-                        layerName = ""
-                        if line.split(' ')[7] == "MASK":
-                            layerName = line.split(' ')[10]
-                        else:
-                            layerName = line.split(' ')[8]
-                        self.metalLayers.add(layerName)
-
-
-                    if 'END NETS' in line:
-                        break
-
-                    if ('NETS' in line and not 'SPECIALNETS' in line) or (inNets):
-                        inNets = True
-
-                        if '- ' in line:
-                            # new net
-                            pinDefaultCoord = False
-                            net = Net(line.split(' ')[1])
-                            instancesPerNetsStr += str(net.name)
-                            netsStr += str(net.name) + "\n"
-                            # Check if the net details are on the same line as the net name.
-                            if not '(' in line:
-                                # Read the next line after the net name,
-                                # it should contain the connected cells names.
-                                netDetails = f.readline().strip()
-                            else:
-                                netDetails = ' '.join(line.split(' ')[2:])
-                            bar()
-                            # print(netDetails)
-                            while not 'ROUTED' in netDetails and not ';' in netDetails and not 'PROPERTY' in netDetails and not 'SOURCE' in netDetails:
-
-                                if "NONDEFAULTRULE" in netDetails:
-                                    # Some net use specific rules for spacing and track width.
-                                    # The keyword for this is 'NONDEFAULTRULE' and occurs
-                                    # before the 'ROUTED' keyword.
-                                    # If we find 'NONDEFAULTRULE', skip the line.
-                                    netDetails = f.readline().strip()
-                                    bar()
-                                    continue # ignores the end of the loop and skip to the next iteration.
-
-                                # if "+ USE" in netDetails or "+ WEIGHT" in netDetails:
-                                #     # This is an empty net. Even though it does connect gates,
-                                #     # there is no routing information. Keep its length at 0.
-                                #     netDetails = f.readline().strip()
-                                #     bar()
-                                #     continue
-                                if "+ USE SIGNAL" in netDetails:
-                                    netDetails = netDetails.replace("+ USE SIGNAL", "")
-                                elif "+ USE CLOCK" in netDetails:
-                                    netDetails = netDetails.replace("+ USE CLOCK", "")
-
-
-                                split = netDetails.split(')') # Split the line so that each element is only one pin or gate
-                                for gateBlock in split:
-                                    gateBlockSplit = gateBlock.split() # Split it again to isolate the gate/pin name
-                                    # print(gateBlockSplit)
-
-                                    if len(gateBlockSplit) > 1 and gateBlockSplit[1] == "PIN":
-                                        # this a pin, add its name to the net
-                                        # '2' bacause we have {(, PIN, <pin_name>}
-                                        # print("This is a pin, add its net!")
-                                        # print(gateBlockSplit)
-                                        pin = self.pins.get(gateBlockSplit[2])
-                                        net.addPin(pin)
-                                        pin.net = net
-                                        net.gatePins[pin.name] = "PIN"
-                                        if not pin.placed:
-                                            # logger.debug("Pin default coord from pin '{}'".format(pin.name))
-                                            pinDefaultCoord = True
-                                    elif len(gateBlockSplit) > 1:
-                                        # This is a gate, add its name to the net
-                                        # '1' because we have {(, <gate_name>, <gate_port>}
-                                        gate = self.gates.get(gateBlockSplit[1])
-                                        if gate == None:
-                                            # This is not a normal situation. Debug.
-                                            logger.error("A gate name has not been recognized in the net description.")
-                                            logger.error("gateblock: {}".format(gateBlock))
-                                            logger.error("netdetails: {}".format(netDetails))
-                                            logger.error("Gate we are trying to add: '{}'".format(gateBlockSplit[1]))
-                                            logger.error("For the net: {}".format(net.name))
-                                            logger.error("Quitting.")
-                                            sys.exit()
-                                        net.addGate(gate)
-                                        gate.addNet(net)
-                                        net.gatePins[gate.name] = gateBlockSplit[2]
-                                        # TODO if gate.name contains '[' or ']', enclose the name between '{}'
-                                        instancesPerNetsStr += " " + str(gate.name)
-
-                                        cellCoordStr += str(net.name) + "," + str(gate.name) + "," + \
-                                                        str(gate.x) + ', ' + str(gate.y) + "\n"
-
-                                netDetails = f.readline().strip()
-                                bar()
-                            # If Pin was not placed during PnR and is connected to something else...
-                            if pinDefaultCoord and (len(net.gates) + len(net.pins)) > 1:
-                                pinDefaultCoord = False
-                                self.setPinCoordinates(net)
-
-                            if (len(net.gates) + len(net.pins)) == 0:
-                                # Net connected to nothing, skip it
-                                # Might happen when removing gates from a design step,
-                                # such as FE* buffer removal after placement,
-                                # then nets are kept back but connected to nothing.
-                                line = f.readline().strip()
-                                bar()
-                                continue
-
-                            netLength = 0
-
-                            instancesPerNetsStr += "\n"
-
-                            #####
-                            # Manhattan distances instead of actual wirelength
-                            #####
-                            if manhattanWireLength:
-                                netCount += 1
-                                # logger.debug("Computing Manhattan for net #{}: {}".format(netCount, net.name))
-                                cellsToConnect = list(net.gatePins.keys())
-                                # Typically want to avoid an unconnected wire or pin on a cell
-                                if len(cellsToConnect) > 1:
-
-                                    cellsInNet = list(net.gatePins.keys())
-                                    # logger.debug("cellsToConnect: {}".format(cellsToConnect))
-                                    # logger.debug("cellsInNet: {}".format(cellsInNet))
-                                    while len(cellsToConnect) > 0:
-                                        minDist = float('inf')
-                                        closestCell = ""
-                                        # Name of the gate (or pin) we want to connect
-                                        gateNameToConnect = cellsToConnect[-1]
-
-                                        # If it's actually a Pin, there is no port or whatnot
-                                        if net.gatePins[gateNameToConnect] == "PIN":
-                                            # logger.debug("It's a PIN!")
-                                            gateToConnectX = self.pins[gateNameToConnect].x
-                                            gateToConnectY = self.pins[gateNameToConnect].y
-
-                                            # Compare the pin to all other cells in the net
-                                            for gateName in cellsInNet:
-                                                # Do not compare the pin to itself
-                                                if gateName != gateNameToConnect:
-                                                    if net.gatePins[gateName] == "PIN":
-                                                        dist = abs(gateToConnectX - self.pins[gateName].x) + abs(gateToConnectY - self.pins[gateName].y)
-                                                    else:
-                                                        # Intermediate vars to get the coordinates of the port
-                                                        gate = self.gates[gateName]
-                                                        stdCellName = gate.stdCell
-                                                        gatePin = macros[stdCellName].pins[net.gatePins[gateName]]
-                                                        for port in gatePin.ports:
-                                                            portCoordinates = gate.absoluteCoordinate(port.center)
-                                                            dist = abs(gateToConnectX - portCoordinates[0]) + abs(gateToConnectX - portCoordinates[1])
-                                                            if dist < minDist:
-                                                                minDist = dist
-                                                                closestCell = gateName
-                                                    if dist < minDist:
-                                                        minDist = dist
-                                                        closestCell = gateName
-                                        else:
-                                            # logger.debug("It's not a PIN!")
-                                            # Intermediate vars to get the coordinates of the port
-                                            gate = self.gates[gateNameToConnect]
-                                            stdCellName = gate.stdCell
-                                            gatePin = macros[stdCellName].pins[net.gatePins[gateNameToConnect]]
-                                            for port in gatePin.ports:
-                                                portCoordinates = gate.absoluteCoordinate(port.center)
-                                                gateToConnectX = portCoordinates[0]
-                                                gateToConnectY = portCoordinates[1]
-
-                                                # Compare the pin to all other cells in the net
-                                                for gateName in cellsInNet:
-                                                    # Do not compare the pin to itself
-                                                    if gateName != gateNameToConnect:
-                                                        if net.gatePins[gateName] == "PIN":
-                                                            dist = abs(gateToConnectX - self.pins[gateName].x) + abs(gateToConnectY - self.pins[gateName].y)
-                                                        else:
-                                                            # Intermediate vars to get the coordinates of the port
-                                                            gate = self.gates[gateName]
-                                                            stdCellName = gate.stdCell
-                                                            gatePin = macros[stdCellName].pins[net.gatePins[gateName]]
-                                                            for port in gatePin.ports:
-                                                                portCoordinates = gate.absoluteCoordinate(port.center)
-                                                                dist = abs(gateToConnectX - portCoordinates[0]) + abs(gateToConnectX - portCoordinates[1])
-                                                                if dist < minDist:
-                                                                    minDist = dist
-                                                                    closestCell = gateName
-                                                        if dist < minDist:
-                                                            minDist = dist
-                                                            closestCell = gateName
-
-
-                                        if minDist == float('inf'):
-                                            logger.error("Net {} still has infinity wl for cell {}".format(net.name, gateNameToConnect))
-                                        netLength += minDist
-                                        cellsToConnect.pop()
-                                        if closestCell in cellsToConnect:
-                                            cellsToConnect.remove(closestCell)
-
-                                # Skip the rest of the details
-                                while not ';' in netDetails:
-                                    netDetails = f.readline().strip()
-                                    bar()
-
-                            #####
-                            # MMST or closest neighbourg
-                            #####
-                            elif mmstWireLength or cnWireLength:
-                                cellsToConnect = list(net.gatePins.keys())
-                                # logger.debug("In net {}, Cells to connect: {}".format(net.name, cellsToConnect))
-
-                                points = []
-                                # logger.debug("Net: {}".format(net.name))
-                                for cell in net.gatePins.keys():
-                                    # If the cell is actually a pin
-                                    if net.gatePins[cell] == "PIN":
-                                        points.append([self.pins[cell].x, self.pins[cell].y])
-                                        # logger.debug("PIN at {}".format(points[-1]))
-                                    else:
-                                        gate = self.gates[cell]
-                                        stdCellName = gate.stdCell
-                                        gatePin = macros[stdCellName].pins[net.gatePins[cell]]
-                                        # Take the first port. It's easier to handle.
-                                        port = gatePin.ports[0]
-                                        # points.append([port.center[0] + gate.x, port.center[1] + gate.y])
-                                        points.append(gate.absoluteCoordinate(port.center))
-                                        # logger.debug("Cell port center at {}".format(points[-1]))
-
-                                if mmstWireLength:
-                                    netLength = min(self.MSTSTwl(points),self.MMSTwl(points))
-                                elif cnWireLength:
-                                    netLength = self.netlengthClosestNeighbourg(points[:])
-                                # logger.debug("computed net length: {}".format(netLength))
-                                # Skip the rest of the details
-                                while not ';' in netDetails:
-                                    netDetails = f.readline().strip()
-                                    bar()
-                                if netLength == 0 and len(points) > 1:
-                                    cellThatActuallyArePins = 0
-                                    for cell in cellsToConnect:
-                                        if cell in self.gates:
-                                            gate = self.gates[cell]
-                                            stdCellName = gate.stdCell
-                                            gatePin = macros[stdCellName].pins[net.gatePins[cell]]
-                                            # Take the first port. It's easier to handle.
-                                            port = gatePin.ports[0]
-                                        elif cell in self.pins:
-                                            cellThatActuallyArePins += 1
-                                    if cellThatActuallyArePins == len(cellsToConnect):
-                                        logger.debug("\tNet '{}' is only PINS that were not placed, skip net creation.".format(net.name))
-                                        line = f.readline().strip()
-                                        bar()
-                                        continue
-
-
-                            #####
-                            # Actual wirelength
-                            #####
-                            else:
-                                net.isRouted = 1
-
-                                while not ';' in netDetails:
-                                    # Now, we are looking at the detailed route of the net.
-                                    # It ends with a single ';' alone on its own line.
-                                    # On each line, we have:
-                                    # NEW <routing layer> ( x1 y1 ) ( x2 y2 ) [via(optional]
-                                    # x2 or y2 can be replaced with '*', meaning the same x1 or y2 is to be used.
-                                    # 
-                                    # The only exception should be the first line, which begins with 'ROUTED'
-
-
-
-                                    if not 'SOURCE' in netDetails and not 'USE' in netDetails and not 'WEIGHT' in netDetails and not 'PROPERTY' in netDetails:
-                                        # Skip the lines containing those taboo words.
-                                        netDetailsSplit = netDetails.split(' ')
-                                        baseIndex = 0 # baseIndex to be shifted in case the line begins with 'ROUTED's
-                                        if 'ROUTED' in netDetails:
-                                            # First line begins with '+ ROUTED', subsequent ones don't.
-                                            # Beware the next lines begin with 'NEW'
-                                            baseIndex += 1
-                                        if 'TAPER' in netDetails:
-                                            # Extra keyword meaning we switch back to the default routing rules.
-                                            baseIndex += 1
-                                        if 'TAPERRULE' in netDetails:
-                                            # Extra keyword meaning we switch to a specific routing rule. 
-                                            # The keyword if followed by said rule, so we should add two indexes.
-                                            # However the first 'TAPERRULE' has already been taken into account in the previous 'TAPER' branch
-                                            baseIndex += 1
-                                        # print netDetailsSplit
-                                        # print net.name
-                                        
-                                        # Now check if we have a net extension (see 'routingPoints extValue' in doc)
-                                        # We only need to do this for the first coordinates (x1 y1)
-                                        if netDetailsSplit[baseIndex+5] != ")":
-                                            # There is a net extension. Delete it.
-                                            del netDetailsSplit[baseIndex+5]
-
-                                        # Now if there is a MASK statement between two coordinates, trash it.
-                                        if "MASK" in netDetailsSplit:
-                                            for i in range(len(netDetailsSplit)):
-                                                if netDetailsSplit[i] == "MASK":
-                                                    # "MASK" is always followed by an integer. Trash it alongside. cf. lefdef reference v5.8 p. 261
-                                                    del netDetailsSplit[i:i+2]
-                                                    break
-
-                                        try:
-                                            x1 = int(netDetailsSplit[baseIndex+3])
-                                            y1 = int(netDetailsSplit[baseIndex+4])
-                                        except ValueError:
-                                            logger.error("Error parsing the line:\n{}\nSplit indexes 3 or 4 is not an integer".format(netDetailsSplit))
-                                            sys.exit()
-                                        if netDetailsSplit[baseIndex+6] == '(':
-                                            # Some lines only have one set of coordinates (to place a via)
-                                            x2 = netDetailsSplit[baseIndex+7]
-                                            y2 = netDetailsSplit[baseIndex+8]
-                                        else:
-                                            x2 = x1
-                                            y2 = y1
-                                            # print netDetailsSplit
-                                        # Some lines have up to 3 pairs of coordinates
-                                        if len(netDetailsSplit) > baseIndex+10 and netDetailsSplit[baseIndex+10] == '(':
-                                            x3 = netDetailsSplit[baseIndex+11]
-                                            y3 = netDetailsSplit[baseIndex+12]
-                                        else:
-                                            x3 = x2
-                                            y3 = y2
-                                        # TODO What is the third number we sometimes have in the second coordinates bracket?
-                                        if x2 == "*":
-                                            x2 = int(x1)
-                                        else:
-                                            x2 = int(x2)
-                                        if y2 == "*":
-                                            y2 = int(y1)
-                                        else:
-                                            y2 = int(y2)
-                                        if x3 == "*":
-                                            x3 = x2
-                                        else:
-                                            x3 = int(x3)
-                                        if y3 == "*":
-                                            y3 = y2
-                                        else:
-                                            y3 = int(y3)
-                                        # TODO Ternary expressions?
-                                        # TODO WEIGHT? cf net clock
-                                        netLength += (abs(y2 - y1) + abs(x2 - x1) + abs(y3 - y2) + abs(x3 - x2))/UNITS_DISTANCE_MICRONS 
-                                        # if net.name == "clock_module_0.and_dco_dis5.a":
-                                        #     logger.debug("In net clock_module_0.and_dco_dis5.a, netDetailsSplit is: '{}'".format(netDetailsSplit))
-                                        #     logger.debug("baseIndex = {}".format(baseIndex))
-                                        #     logger.debug("netLength = {}".format(netLength))
-                                        #     logger.debug("x1 = {}, y1 = {}, x2 = {}, y2 = {}, x3 = {}, y3 = {}".format(x1, y1, x2, y2, x3, y3))
-                                        #     logger.debug("len(netDetailsSplit) = {} and [baseIndex+10] = '{}'".format(len(netDetailsSplit), [baseIndex+10]))
-
-                                        # Extract metal name of this trace
-                                        layerName = ""
-                                        try:
-                                            layerName = netDetailsSplit[netDetailsSplit.index("NEW")+1]
-                                        except ValueError:
-                                            try:
-                                                layerName = netDetailsSplit[netDetailsSplit.index("ROUTED")+1]
-                                            except:
-                                                logger.error("{}".format(netDetailsSplit))
-                                                sys.exit()
-                                        net.metalLayers.add(layerName)
-
-
-                                    netDetails = f.readline().strip()
-                                    bar()
-                            # netLength = netLength / UNITS_DISTANCE_MICRONS # 10^-4um to um
-                            # if len(net.pins) > 0:
-                            #     # logger.debug("'{}' needs to add pin length of {}".format(net.name, list(net.pins.values())[0].approximatedAdditionalLength))
-                            #     netLength += list(net.pins.values())[0].approximatedAdditionalLength
-                            net.setLength(netLength)
-                            self.totalWireLength += netLength
-                            # logger.debug("{}: {}".format(net.name, netLength))
-
-                            self.addNet(net)
-
-                            wlNetsStr += str(net.name) + " " + str(len(net.gates) + len(net.pins)) + " " + str(net.wl) + "\n"
-                        # end if
-
-
-                    line = f.readline()
-                    bar()
-                # end while
+        routed = not (manhattanWireLength or mmstWireLength or cnWireLength or rmstWireLength or rsmtWireLength)
+        if jobs > 1:
+            records = self.netRecordsParallel(reader, routed, jobs, index)
+        else:
+            records = exitOnNetParseError(readNetRecords(reader, routed, UNITS_DISTANCE_MICRONS))
+
+        connectedNets = list() # (Net, routed length, metal layers, True if its Pin needs coordinates)
+        with open("InstancesPerNet.out", 'w') as instancesPerNetsFile, \
+             open("Nets.out", 'w') as netsFile, \
+             open("WLnets.out", 'w') as wlNetsFile, \
+             open("CellCoord.out", 'w') as cellCoordFile:
+            # The 'NUM_PINS' part is the number of gates + the number of pins.
+            wlNetsFile.write("NET NUM_PINS LENGTH\n")
+            for netName, connections, routeLength, metalLayers in records:
+                # new net
+                pinDefaultCoord = False
+                net = Net(netName)
+                instancesPerNetsFile.write(str(net.name))
+                netsFile.write(str(net.name) + "\n")
+
+                for cellName, gatePinName in connections:
+                    if gatePinName is None:
+                        # this a pin, add its name to the net
+                        pin = self.pins.get(cellName)
+                        net.addPin(pin)
+                        pin.net = net
+                        net.gatePins[pin.name] = "PIN"
+                        if not pin.placed:
+                            # logger.debug("Pin default coord from pin '{}'".format(pin.name))
+                            pinDefaultCoord = True
+                    else:
+                        # This is a gate, add its name to the net
+                        gate = self.gates.get(cellName)
+                        if gate == None:
+                            # This is not a normal situation. Debug.
+                            logger.error("A gate name has not been recognized in the net description.")
+                            logger.error("Gate we are trying to add: '{}'".format(cellName))
+                            logger.error("For the net: {}".format(net.name))
+                            logger.error("Quitting.")
+                            sys.exit()
+                        net.addGate(gate)
+                        gate.addNet(net)
+                        net.gatePins[gate.name] = gatePinName
+                        # TODO if gate.name contains '[' or ']', enclose the name between '{}'
+                        instancesPerNetsFile.write(" " + str(gate.name))
+
+                        cellCoordFile.write(str(net.name) + "," + str(gate.name) + "," + \
+                                            str(gate.x) + ', ' + str(gate.y) + "\n")
+
+                if (len(net.gates) + len(net.pins)) == 0:
+                    # Net connected to nothing, skip it
+                    # Might happen when removing gates from a design step,
+                    # such as FE* buffer removal after placement,
+                    # then nets are kept back but connected to nothing.
+                    continue
 
-        with open("InstancesPerNet.out", 'w') as file:
-            file.write(instancesPerNetsStr)
+                instancesPerNetsFile.write("\n")
+
+                # If Pin was not placed during PnR and is connected to something else, it needs coordinates.
+                connectedNets.append((net, routeLength, metalLayers, pinDefaultCoord and (len(net.gates) + len(net.pins)) > 1))
+
+            # Absolute coordinates of the ports of all the gates connected, computed at once.
+            self.portTable = self.buildPortTable(net for net, _, _, _ in connectedNets)
+
+            connection = 0 # First connection of the net in self.portTable
+            for net, _, _, pinDefaultCoord in connectedNets:
+                if pinDefaultCoord:
+                    # {gate name : [[x, y] of each port]}
+                    portCenters = dict(zip(net.gates.keys(), self.portTable.centers(connection, connection + len(net.gates))))
+                    self.setPinCoordinates(net, portCenters)
+                connection += len(net.gates)
+
+            #####
+            # Estimated wirelength instead of the actual one: the points of all the nets
+            # are gathered first, then each estimator goes through all of them at once.
+            #####
+            if not routed:
+                if manhattanWireLength:
+                    estimator = wirelength.manhattanNN
+                elif mmstWireLength:
+                    estimator = wirelength.mmst
+                elif cnWireLength:
+                    estimator = wirelength.closestNeighbour
+                elif rmstWireLength:
+                    estimator = wirelength.rmst
+                else:
+                    estimator = wirelength.rsmt
+                estimatedLengths = estimator(*self.netPoints([net for net, _, _, _ in connectedNets], self.portTable))
+
+            for netID, (net, routeLength, metalLayers, _) in enumerate(connectedNets):
+                if manhattanWireLength:
+                    netLength = estimatedLengths[netID]
+                    if netLength == float('inf'):
+                        logger.error("Net {} still has infinity wl".format(net.name))
+
+                elif not routed:
+                    netLength = estimatedLengths[netID]
+                    if netLength == 0 and len(net.gates) == 0 and len(net.pins) > 1:
+                        logger.debug("\tNet '{}' is only PINS that were not placed, skip net creation.".format(net.name))
+                        continue
 
-        with open("Nets.out", 'w') as file:
-            file.write(netsStr)
+                #####
+                # Actual wirelength
+                #####
+                else:
+                    net.isRouted = 1
+                    netLength = routeLength
+                    net.metalLayers = metalLayers
 
-        with open("WLnets.out", 'w') as file:
-            file.write(wlNetsStr)
+                # netLength = netLength / UNITS_DISTANCE_MICRONS # 10^-4um to um
+                # if len(net.pins) > 0:
+                #     # logger.debug("'{}' needs to add pin length of {}".format(net.name, list(net.pins.values())[0].approximatedAdditionalLength))
+                #     netLength += list(net.pins.values())[0].approximatedAdditionalLength
+                net.setLength(netLength)
+                self.totalWireLength += netLength
+                # logger.debug("{}: {}".format(net.name, netLength))
 
-        with open("CellCoord.out", 'w') as file:
-            file.write(cellCoordStr)
+                self.addNet(net)
 
+                wlNetsFile.write(str(net.name) + " " + str(len(net.gates) + len(net.pins)) + " " + str(net.wl) + "\n")
+                # end if
 
-        pinCellsStr = ""
-        pinCoordStr = ""
         # print(f"WL computation, self.pins length: {len(self.pins)}")
-        for pin in self.pins.values():
-            # print(f"pin name: {pin.name}, pin net: {pin.net}")
-            pinCoordStr += "{} {} {}\n".format(pin.name, pin.x, pin.y)
-            for cell in pin.net.gates.values():
-                pinCellsStr += "{}\n".format(cell.name)
-        with open("pinCoord.out", 'w') as f:
-            f.write(pinCoordStr)
-        with open("pinCells.out", 'w') as f:
-            f.write(pinCellsStr)
-
-    def MSTSTwl(self, points):
+        with open("pinCoord.out", 'w') as pinCoordFile, open("pinCells.out", 'w') as pinCellsFile:
+            for pin in self.pins.values():
+                # print(f"pin name: {pin.name}, pin net: {pin.net}")
+                pinCoordFile.write("{} {} {}\n".format(pin.name, pin.x, pin.y))
+                for cell in pin.net.gates.values():
+                    pinCellsFile.write("{}\n".format(cell.name))
+
+    def netRecordsParallel(self, reader, routed, jobs, index=None):
         """
-        Minimum Single-Trunk Steiner Tree (MSTST) algorithm to compute the approximate
-        wire-length given some points.
-
-        Parameters:
-        -----------
-        points : List
-            List of lists like so:
-            [[x1,y1],...,[xn,yn]]
+        Read the net records with a pool of worker processes.
 
-        Return:
-        float
-            Size of the tree
-        """
-        wirelengths = [0,0] # horizontal single trunk, then vertical.
-        if len(points) > 0:
-            # 1. Find the median y coordinate
-            trunk = statistics.median([i[1] for i in points])
-            wirelengths[0] = sum([abs(trunk - i[1]) for i in points])
-            wirelengths[0] += max([i[0] for i in points]) - min([i[0] for i in points])
-
-            # 2. Find the median x coordinate
-            trunk = statistics.median([i[0] for i in points])
-            wirelengths[1] = sum([abs(trunk - i[0]) for i in points])
-            wirelengths[1] += max([i[1] for i in points]) - min([i[1] for i in points])
-        return min(wirelengths)
-
-    def MMSTwl(self, points):
-        """
-        Compute a Minimal Multiple Trunks Steiner Tree.
-        First sort all the coordinates according to their ordinate.
-        Then for each pair of points, build a small MSTST with a single trunk.
-        This method should be closer to an actual Minimal rectilinear Steiner tree obtained during routing,
-        especially for high-fanout nets.
+        The NETS section is split into byte ranges aligned on the net records,
+        about four per job to balance the load between small and large nets.
+        Each range is parsed by parseNetRange() in its own process, while the
+        records are returned in the order of the DEF so that the design, and
+        thus the outputs, are the same as with a single job.
 
         Parameters:
         -----------
-        points : List
-            List of lists like so:
-            [[x1,y1],...,[xn,yn]]
-
-        Return:
-        float
-            Size of the tree
-        """
-        wirelengths = [0,0,0] # 0: sorted on y, 1: sorted on x, 2: sorted on (x+y)
-        points.sort(key=lambda x:x[1]) # sort based on ordinate, this post explains it so well: https://stackoverflow.com/a/42966511/3973030
-        if len(points) > 0:
-            for i in range(len(points)-1):
-                wirelengths[0] += self.MSTSTwl([points[i],points[i+1]])
-        points.sort(key=lambda x:x[0]) # sort based on abscissa
-        if len(points) > 0:
-            for i in range(len(points)-1):
-                wirelengths[1] += self.MSTSTwl([points[i],points[i+1]])
-        points.sort(key=lambda x:x[0]+x[1]) # sort based on abscissa + ordinate. No ideal as we have a symetry of axis y=x for the sum values. Yet, it should group some close points together.
-        if len(points) > 0:
-            for i in range(len(points)-1):
-                wirelengths[2] += self.MSTSTwl([points[i],points[i+1]])
-        return min(wirelengths)
-
-    def netlengthClosestNeighbourg(self, points):
-        """
-        """
-        wirelength = 0
-        points.sort(key = lambda x: x[0]+x[1])
-        origin = points[0]
-        points.remove(origin)
-
-        while len(points) > 0:
-            # find closest neighbourg to origin
-            distance = float('inf')
-            candidate = None
-            for neighbour in points:
-                newDist = abs(origin[0] - neighbour[0]) + abs(origin[1] - neighbour[1])
-                if newDist < distance:
-                    distance = newDist
-                    candidate = neighbour[:]
-            wirelength += distance
-            points.remove(candidate)
-            origin = candidate[:]
-        return wirelength
+        reader : DefReader
+            Positioned right after the 'NETS' statement.
+            Positioned on the 'END NETS' line on return.
+        routed : bool
+            See readNetRecords().
+        jobs : int
+        index : def_index.DefIndex
+            If given, the offsets of the net records are taken from it,
+            otherwise the section is scanned for them.
+
+        Return
+        ------
+        iterator
+            Records as yielded by readNetRecords().
+        """
+        if index is not None and len(index.netOffsets) > 0:
+            offsets, netsEnd = index.netOffsets, index.netsEnd
+        else:
+            _, offsets, netsEnd = def_index.scanNets(reader.mm, reader.tell())
+        reader.seek(netsEnd)
+        if len(offsets) == 0:
+            return iter([])
+
+        # Cut the section in chunks of about the same amount of bytes,
+        # each chunk boundary being moved back to the beginning of a net record.
+        chunks = min(len(offsets), jobs * 4)
+        cuts = np.linspace(offsets[0], netsEnd, chunks + 1)[1:-1]
+        bounds = offsets[np.searchsorted(offsets, cuts, side='right') - 1]
+        bounds = np.unique(np.concatenate(([offsets[0]], bounds, [netsEnd])))
+        ranges = [(deffile, int(bounds[i]), int(bounds[i+1]), routed, UNITS_DISTANCE_MICRONS) for i in range(len(bounds)-1)]
+        logger.info("Parsing {} nets in {} chunks with {} jobs".format(len(offsets), len(ranges), jobs))
+
+        with multiprocessing.Pool(jobs) as pool:
+            try:
+                chunkRecords = pool.map(parseNetRange, ranges)
+            except NetParseError as error:
+                # Raised by a worker, see readNetRecords(): exit like a single job would.
+                logger.error(error)
+                sys.exit()
+        return (record for records in chunkRecords for record in records)
 
     def segmentLen(self):
         '''
@@ -1385,23 +1770,28 @@ class Design:
 
         To do so, for each Net, compute the Manhattan distance between each pair of connected pins.
         '''
-        strOut = "NET_NAME PINS WL"
-        with alive_bar(len(self.nets)) as bar:
+        portTable = self.connectionPortTable()
+        connection = 0 # First connection of the net in portTable
+        with alive_bar(len(self.nets)) as bar, open("WLnets_segments.out", 'w') as f:
+            f.write("NET_NAME PINS WL")
             for net in self.nets.values():
-                gatePins = net.gatePins
-                for i in range(len(net.gatePins)):
-                    cellAName = list(net.gatePins.keys())[i]
-                    cellACoord = self.getGatePinCoordinates(net,cellAName)
-
-                    for j in range(i+1, len(net.gatePins)):
-                        cellBName = list(net.gatePins.keys())[j]
+                portCenters = dict(zip(net.gates.keys(), portTable.centers(connection, connection + len(net.gates))))
+                connection += len(net.gates)
+                cellNames = list(net.gatePins.keys())
+                # Get absolute coordinates of the pins
+                cellCoords = [self.getGatePinCoordinates(net, cellName, portCenters) for cellName in cellNames]
+                for i in range(len(cellNames)):
+                    cellAName = cellNames[i]
+                    cellACoord = cellCoords[i]
+
+                    for j in range(i+1, len(cellNames)):
+                        cellBName = cellNames[j]
                         # Create new net which name is <net name/gate A/gate B>
                         # print("net: {}, gatePins: {}".format(net.name, net.gatePins))
                         netname = '/'.join([net.name, cellAName, cellBName])
                         newNet = Net(netname)
 
-                        # Get absolute coordinates of the pins
-                        cellBCoord = self.getGatePinCoordinates(net,cellBName)
+                        cellBCoord = cellCoords[j]
 
                         # Manhattan
                         manLen = abs(cellACoord[0] - cellBCoord[0]) + abs(cellACoord[1] - cellBCoord[1])
@@ -1410,57 +1800,87 @@ class Design:
                         # Add to dictionary
                         self.netSegments[netname] = newNet
 
-                        # Add to str
-                        strOut += "\n{} {} {}".format(netname, 2, manLen)
+                        # Add to file
+                        f.write("\n{} {} {}".format(netname, 2, manLen))
                 bar()
 
-        with open("WLnets_segments.out", 'w') as f:
-            f.write(strOut)
-
-    def getGatePinCoordinates(self, net, cellName):
+    def getGatePinCoordinates(self, net, cellName, portCenters):
         '''
-        
+        Parameters:
+        -----------
+        net : Net
+        cellName : str
+            Name of a gate or a pin of the net.
+        portCenters : dict
+            {gate name : [[x, y] of each port the net is connected to]}, see PortTable.centers().
+
         Return:
         -------
         cellCoord : [x, y]
             Array of absolute coordinates of the port on the cell for the
             specified net.
         '''
-        # print(net.name)
-        cellCoord = list()
-        # print("gatePins in fun: {}".format(net.gatePins))
         # If the cell is actually a pin
         if net.gatePins[cellName] == "PIN":
             cellCoord = [self.pins[cellName].x, self.pins[cellName].y]
         else:
-            gate = self.gates[cellName]
-            stdCellName = gate.stdCell
-            gatePin = macros[stdCellName].pins[net.gatePins[cellName]]
             # Take the first port. It's easier to handle.
-            port = gatePin.ports[0]
-            cellCoord = gate.absoluteCoordinate(port.center)
+            cellCoord = portCenters[cellName][0]
         return cellCoord
 
 
+    def wireLengthModels(self):
+        """
+        Estimate the length of every net with all the models of wirelength.MODELS,
+        from the points gathered once, and write them side by side into
+        WLnets_models.out, along with the routed length:
+        <net name> <number of pins> <routed length> <length of each model>, after a header.
+        The routed length is nan if the nets were not parsed as routed.
+
+        The same columns go into the bundle WLnets_models.npz, see design_bundle,
+        and the time taken by the gathering of the points and by each model into
+        WLnets_models_timing.out.
+
+        Return:
+        -------
+        dict
+            {model : seconds}
+        """
+        nets = list(self.nets.values())
+        timing = dict()
+        start = time.perf_counter()
+        points = self.netPoints(nets, self.connectionPortTable())
+        timing["POINTS"] = time.perf_counter() - start
+
+        columns = {"net": [net.name for net in nets],
+                   "pins": np.array([len(net.gates) + len(net.pins) for net in nets], dtype=np.int64),
+                   "routed": np.array([net.wl if net.isRouted else np.nan for net in nets], dtype=np.float64)}
+        for model, estimator in wirelength.MODELS.items():
+            start = time.perf_counter()
+            columns[model.lower()] = np.array(estimator(*points), dtype=np.float64)
+            timing[model] = time.perf_counter() - start
+            logger.info("{} wirelength of {} nets in {:.3f}s".format(model, len(nets), timing[model]))
+
+        with open("WLnets_models.out", 'w') as f:
+            f.write(" ".join(["NET", "NUM_PINS", "ROUTED"] + list(wirelength.MODELS)) + "\n")
+            values = [map(str, columns[key].tolist()) for key in columns if key != "net"]
+            f.writelines(" ".join(row) + "\n" for row in zip(columns["net"], *values))
+        design_bundle.save(design_bundle.bundlePath("WLnets_models.out"), columns)
+        with open("WLnets_models_timing.out", 'w') as f:
+            f.write("MODEL SECONDS\n")
+            f.writelines("{} {}\n".format(model, seconds) for model, seconds in timing.items())
+        return timing
+
     def sortNets(self):
         netLengths = []
         netNames = []
-        for k in self.nets:
-            net = self.nets[k]
+        for net in self.nets.values():
             netLengths.append(net.wl)
             netNames.append(net.name)
 
-        heapSort(netLengths, netNames)
         filename = deffile.rsplit('.',1)[0].rsplit('/',1)[1] + "_net_wl.csv"
         logger.debug("Exporting net lengths to {}".format(filename))
-        s = "Net_name net_wire_length cumulated_wire_length %_of_nets\n"
-        cumulatedLength = 0
-        for i in range(0, len(netLengths)):
-            cumulatedLength += netLengths[i]
-            s += str(netNames[i]) + " " + str(netLengths[i]) + " " + str(cumulatedLength) + " " + str((i+1)*100/len(netLengths)) + "\n"
-        # print s
-        with open(filename, 'w') as file:
-            file.write(s)
+        net_ranking.writeRanking(filename, netLengths, netNames)
         # TODO generation du graphe en Python
 
 
@@ -1489,7 +1909,6 @@ class Design:
         originX = 0
         originY = 0
         count = 0
-        clusterListStr = "" # Clusters names list to dump into 'Clusters.out'
         # clusters = []
         while not full:
             if originY >= self.height:
@@ -1514,7 +1933,6 @@ class Design:
                 newCluster = Cluster(newClusterWidth, newClusterHeight, newClusterWidth*newClusterHeight, [originX, originY], count)
                 self.clusters[newCluster.id] = newCluster
                 # print newClusterWidth*newClusterHeight
-                clusterListStr += str(newCluster.id) + "\n"
 
                 originX += newClusterWidth
                 if originX >= self.width:
@@ -1523,10 +1941,7 @@ class Design:
 
         logger.info("Total cluster created: {}".format(count))
 
-        # TODO 'Clusters.out' should be a paramater/argument/global variable?
-        logger.debug("Dumping Clusters.out")
-        with open("Clusters.out", 'w') as file:
-            file.write(clusterListStr)
+        self.dumpClusters()
 
         # Check for overshoot, clusters outside of design space.
         totalClustersArea = 0
@@ -1553,47 +1968,62 @@ class Design:
         And now, find out wich gates are in each cluster.
         If the origin of a gate is in a cluster, it belongs to that cluster.
         Hence, the leftmost cluster will have more gates.
-        """
 
-        checkClusterGates = 0 # Total amount of gates across all clusters. Check value.
-        gateKeys = list(self.gates.keys()) # Dump keys from the gates dictionary
-        clusterInstancesStr = "" # String of list of cluster instances to dump into ClustersInstances.out
-        for ck in self.clusters:
-            cluster = self.clusters[ck]
-            gateKeysNotPlaced = [] # Keys of the gates that have not be placed into a cluster yet.
-            clusterGateArea = 0 # Cumulated area of the gates in the cluster
-            clusterInstancesStr += str(cluster.id)
-
-            for key in gateKeys:
-                # Check if the gate coordinates are below the top right corner of the cluster
-                # and above the bottom left corner.
-                if self.gates[key].x <= (cluster.origin[0] + cluster.width) and self.gates[key].y <= (cluster.origin[1] + cluster.height) and self.gates[key].x >= cluster.origin[0] and self.gates[key].y >= cluster.origin[1]:
-                    cluster.addGate(self.gates[key])
-                    # Also add a reference to the cluster inside the Gate object.
-                    # This will be useful for the connectivity loop and reducing its time complexity.
-                    self.gates[key].addCluster(cluster)
-                    # Add the gate area to the total of the cluster:
-                    clusterGateArea += self.gates[key].getArea()
-                    # TODO if the gate name contains a '[' or ']', put {} around its name.
-                    # TODO make sure there is no gate with a space in its name.
-                    clusterInstancesStr += " " + str(self.gates[key].name)
-                else:
-                    gateKeysNotPlaced.append(key)
+        The clusters are expected to tile the design along shared edges, as
+        built by clusterize() and splitDesign(). Their edges are used as the
+        lines of a grid in which each gate is located with a binary search.
+        A gate lying on the edge of several clusters goes to the first of
+        them in self.clusters, that is the leftmost and bottommost one.
+        """
 
-            gateKeys = list(gateKeysNotPlaced) # Replace the key list with only the keys to the gates that have not been placed.
+        clusters = list(self.clusters.values())
+        xs = np.unique([c.origin[0] for c in clusters] + [c.origin[0] + c.width for c in clusters])
+        ys = np.unique([c.origin[1] for c in clusters] + [c.origin[1] + c.height for c in clusters])
+
+        # Cell (2i, 2j) of the grid is the crossing of the lines xs[i] and ys[j],
+        # cell (2i+1, 2j) is the segment strictly between xs[i] and xs[i+1] on the line ys[j], etc.
+        # Each cell holds the index of the first cluster covering it, len(clusters) for none.
+        owner = np.full((2*len(xs) - 1, 2*len(ys) - 1), len(clusters), dtype=np.int64)
+        for i in reversed(range(len(clusters))):
+            cluster = clusters[i]
+            x0, x1 = 2 * np.searchsorted(xs, [cluster.origin[0], cluster.origin[0] + cluster.width])
+            y0, y1 = 2 * np.searchsorted(ys, [cluster.origin[1], cluster.origin[1] + cluster.height])
+            owner[x0:x1+1, y0:y1+1] = i
+
+        gates = list(self.gates.values())
+        gateCells = []
+        for coordinates, lines in [([gate.x for gate in gates], xs), ([gate.y for gate in gates], ys)]:
+            coordinates = np.array(coordinates, dtype=np.float64)
+            k = np.searchsorted(lines, coordinates)
+            onLine = (k < len(lines)) & (lines[np.minimum(k, len(lines) - 1)] == coordinates)
+            cell = np.where(onLine, 2*k, 2*k - 1)
+            # Outside of the grid
+            cell[(cell < 0) | (cell > 2*len(lines) - 2)] = -1
+            gateCells.append(cell)
+        inside = (gateCells[0] >= 0) & (gateCells[1] >= 0)
+        gateOwners = np.full(len(gates), len(clusters), dtype=np.int64)
+        gateOwners[inside] = owner[gateCells[0][inside], gateCells[1][inside]]
+
+        clusterGateArea = [0] * len(clusters) # Cumulated area of the gates in each cluster
+        for gate, i in zip(gates, gateOwners.tolist()):
+            if i < len(clusters):
+                clusters[i].addGate(gate)
+                # Also add a reference to the cluster inside the Gate object.
+                # This will be useful for the connectivity loop and reducing its time complexity.
+                gate.addCluster(clusters[i])
+                # Add the gate area to the total of the cluster:
+                clusterGateArea[i] += gate.getArea()
 
+        checkClusterGates = 0 # Total amount of gates across all clusters. Check value.
+        for i, cluster in enumerate(clusters):
             checkClusterGates += len(cluster.gates)
-
             # Set the cluster 'gate area'
-            cluster.setGateArea(clusterGateArea)
-
-            clusterInstancesStr += "\n"
+            cluster.setGateArea(clusterGateArea[i])
 
         logger.debug("Total amount of place gates in clusters: {} out of {}".format(checkClusterGates, len(self.gates)))
 
         # Dump cluster instances
-        with open('ClustersInstances.out', 'w') as file:
-            file.write(clusterInstancesStr)
+        self.dumpClustersInstances()
 
 
 
@@ -1734,13 +2164,7 @@ class Design:
 
         self.populateGeometricClusters()
 
-        clustersOutStr = ""
-        for ck in self.clusters:
-            clustersOutStr += str(self.clusters[ck].id) + "\n"
-
-        logger.debug("Dumping Clusters.out")
-        with open("Clusters.out", 'w') as file:
-            file.write(clustersOutStr)
+        self.dumpClusters()
 
 
         # for ck in self.clusters:
@@ -1773,17 +2197,13 @@ class Design:
         """
         First create all the clusters with default values.
         """
-        clusterListStr = "" # Clusters names list to dump into 'Clusters.out'
         for x in range(int(clustersTarget)):
             # TODO What will be the impact of the fact that the cluster has no geometrical meaning, now?
             # What should I put for the coordinates?
             newCluster = Cluster(0, 0, 0, [0, 0], x)
             self.clusters[newCluster.id] = newCluster
-            clusterListStr += str(newCluster.id) + "\n"
 
-        logger.debug("Dumping Clusters.out")
-        with open("Clusters.out", 'w') as file:
-            file.write(clusterListStr)
+        self.dumpClusters()
 
 
         """
@@ -1799,15 +2219,7 @@ class Design:
         """
         Dump the cluster details indide ClustersInstances.out
         """
-        clusterInstancesStr = "" # String of list of cluster instances to dump into ClustersInstances.out
-        for ck in self.clusters:
-            cluster = self.clusters[ck]
-            clusterInstancesStr += str(cluster.id)
-            for k in cluster.gates:
-                clusterInstancesStr += " " + str(cluster.gates[k].name)
-            clusterInstancesStr += "\n"
-        with open('ClustersInstances.out', 'w') as file:
-            file.write(clusterInstancesStr)
+        self.dumpClustersInstances()
 
 
         """
@@ -1836,8 +2248,6 @@ class Design:
         Each cluster is one gate.
         """
         logger.info("Clusterizing...")
-        clusterListStr = "" # Clusters names list to dump into 'Clusters.out'
-        clusterInstancesStr = "" # String of list of cluster instances to dump into ClustersInstances.out
 
         for i, key in enumerate(list(self.gates.keys())):
             width = self.gates[key].width
@@ -1856,18 +2266,10 @@ class Design:
 
             self.gates[key].addCluster(cluster)
 
-            clusterListStr += str(cluster.id) + "\n"
-            clusterInstancesStr += str(cluster.id)
-            clusterInstancesStr += " " + str(self.gates[key].name) + "\n"
-
-        # TODO 'Clusters.out' should be a paramater/argument/global variable?
-        logger.debug("Dumping Clusters.out")
-        with open("Clusters.out", 'w') as file:
-            file.write(clusterListStr)
+        self.dumpClusters()
 
         # Dump cluster instances
-        with open('ClustersInstances.out', 'w') as file:
-            file.write(clusterInstancesStr)
+        self.dumpClustersInstances()
 
 
 
@@ -1885,201 +2287,56 @@ class Design:
         """
         Create clusters until the <objective> wirelength is converted into inracluster wires.
         <objective> is a multiple of the average-gate-width of the design (Design.agw).
+
+        The merge state is kept in Design.progressiveMerge, so that a following call with an
+        objective at least as large only hides the nets that became short enough.
         """
         logger.info("Clusterizing with objective {}*AGW ({})".format(objective, self.agw))
         objective = objective * self.agw
-        criticalRatioReached = False
-        highestClusterID = 0 # Highest cluster ID assigned, needed to know which new ID can be assigned without risking to assign the same twice.
 
-        # If it's the first time we run this
-        if len(self.clusters) == 0:
-            # First, create sorted list of net length and name.
+        if self.progressiveMerge is None or objective < self.progressiveMerge.objective:
+            # Sorted list of net length and name.
             netLengths = []
             netNames = []
             for net in self.nets.values():
                 netLengths.append(net.wl)
                 netNames.append(net.name)
-            heapSort(netLengths, netNames)
-
-
-            # Create the basic clusters containing only one gate.
-            for i, gate in enumerate(list(self.gates.values())):
-                width = gate.width
-                height = gate.height
-                area = gate.getArea()
-                origin = [gate.x, gate.y]
-                identifier = i
-
-                cluster = Cluster(width, height, area, origin, identifier)
-
-                cluster.addGate(gate)
-
-                cluster.setGateArea(area) # Same as the cluster area in this case.
-
-                self.clusters[cluster.id] = cluster
-
-                gate.addCluster(cluster)
+            netLengths, netNames = net_ranking.sortByLength(netLengths, netNames)
+            self.progressiveMerge = ProgressiveMerge(self.gates, self.nets, netLengths, netNames)
         else:
-            logger.debug("Reusing the previous step ({} clusters)".format(len(self.clusters)))
-            # We ca re-use a previous run.
-            # To do so, find all the nets remaining between the clusters.
-            # For each cluster, get the gates.
-            # For each gate, get the nets.
-            # For each net, get the gates and check if they all are in the same cluster.
-            netLengths = []
-            netNames = []
-            highestClusterID = len(self.clusters)
-            for cluster in self.clusters.values():
-                mainClusterID = cluster.id
-                for gate in cluster.gates.values():
-                    for net in gate.nets.values():
-                        for subgate in net.gates.values():
-                            if subgate.cluster.id != mainClusterID:
-                                try:
-                                    netNames.index(net.name)
-                                except ValueError:
-                                    # The net is not yet in the list
-                                    netLengths.append(net.wl)
-                                    netNames.append(net.name)
-                                break #Stop looking into this net, go on with the next one.
-            heapSort(netLengths, netNames)
-
-        highestClusterID = len(self.clusters)
+            logger.debug("Reusing the previous step (objective {}, {} nets hidden)".format(self.progressiveMerge.objective, self.progressiveMerge.position))
 
-
-
-        minWL = netLengths[0] # Do not use the min() function, I want to fetch the first one. This expects the array to be sorted at first, however.
-
-        netsToHide = [] # List of Net names we want to hide inside clusters, sorted by length. No objects which are heavier to handle and copy.
-        for i, wl in enumerate(netLengths):
-            if wl < objective:
-                netsToHide.append(netNames[i])
-            else:
-                break
-        newNetsToHide = list(netsToHide) # Plain copy in which we will remove elements as we hide them inside clusters.
-        fixToBottom = set() # set of instance names that needs to be fixed on bottom because they are connected to a pin on bottom with a short net.
-
-        while len(newNetsToHide) > 0:
-            logger.debug("~~~~~~~~~~ New iteration: {} nets to hide ~~~~~~~~~~~".format(len(newNetsToHide)))
-            netsToHide = list(newNetsToHide)
-            mergedGates = list() # List of merged gates names. If a gate is in the list, don't merge it again in this iteration! This is to avoid very large clusters and try to split them.
-            with alive_bar(len(netsToHide)) as bar:
-                for netName in netsToHide:
-                    bar()
-                    net = self.nets[netName]
-                    skip = False
-
-                    #############################################################################################
-                    # Check if the net is not composed of only one gate, meaning it's connected to a bottom pin.
-                    # In such case, the gate (and its whole cluster actually) needs to be fixed on bottom.
-                    #############################################################################################
-                    if len(net.gates) == 1:
-                        for gateName in net.gates.keys():
-                            fixToBottom.add(gateName)
-                        del newNetsToHide[newNetsToHide.index(netName)]
-                        continue # skip the rest that is thus useless
-
-                    #########################################################################
-                    # Check that <net> is not entirely contained inside a single cluster.
-                    # This is not handled the most efficient way, but it sure is easy.
-                    # This might happen as a side effect of merging some clusters together.
-                    # singleCluster = True
-                    # netClusters = set()
-                    # for gate in net.gates.values():
-                    #     netClusters.add(gate.cluster.id)
-                    #     if len(netClusters) > 1:
-                    #         singleCluster = False
-                    #         break
-                    netClusters = set([gate.cluster.id for gate in net.gates.values()])
-                    # Net already in a single cluster, remove it and consider the next one.
-                    if len(netClusters) == 1:
-                        del newNetsToHide[newNetsToHide.index(netName)]
-                        continue
-                    #########################################################################
-
-                    # ######################################################################################
-                    # for gate in net.gates.keys():
-                    #     # Check if a gate connected to the net has already been merged in this iteration.
-                    #     # We don't add them to the list just yet, this is just a first verification.
-                    #     if gate in mergedGates:
-                    #         skip = True
-                    #         break
-                    # if skip:
-                    #     # Skip this net for this iteration.
-                    #     continue
-                    # ######################################################################################
-
-                    clustersToDelete = set() # List of clusters we need to delete post-merger
-                    newCluster = Cluster(0, 0, 0, [0,0], highestClusterID+1) # New cluster created and gathering all the gates
-                    self.clusters[newCluster.id] = newCluster
-                    # logger.debug("New cluster created: {}".format(newCluster.id))
-                    highestClusterID += 1
-                    sumArea = 0
-                    for gate in net.gates.values():
-                        # Those <Gate> objects should be the same reference as self.gates
-                        # logger.debug("Primary gate in net: {} with cluster ID: {}".format(gate.name, gate.cluster.id))
-                        clustToDel = gate.cluster.id
-
-                        if clustToDel == newCluster.id:
-                            # The gate in this cluster has already been updated in the same net. Don't cover it twice.
-                            continue
-
-                        # logger.debug("Name: {}, cluster:{}, obj: {}".format(gate.name, gate.cluster.id, gate))
-                        for poorGate in self.clusters[clustToDel].gates.values():
-                            # logger.debug("Changed {} cluster ID from {} to {} (expected)".format(poorGate.name, poorGate.cluster.id, newCluster.id))
-                            poorGate.addCluster(newCluster)
-                            newCluster.addGate(poorGate)
-                            sumArea += poorGate.getArea()
-                            mergedGates.append(poorGate.name)
-                        clustersToDelete.add(clustToDel)
-                    newCluster.setGateArea(sumArea)
-                    newCluster.area = sumArea
-                    # self.clusters[newCluster.id] = newCluster
-                    # logger.debug(clustersToDelete)
-                    for i in clustersToDelete:
-                        del self.clusters[i]
-
-                    del newNetsToHide[newNetsToHide.index(netName)]
-
-        clusterListStr = ""
-        clusterInstancesStr = ""
+        with alive_bar(self.progressiveMerge.pending(objective)) as bar:
+            self.progressiveMerge.hide(objective, bar)
+        self.clusters = self.progressiveMerge.clusters()
+        fixToBottom = self.progressiveMerge.fixToBottom
 
         # Change the cluster IDs so that there is no gap.
         logger.debug("Update clusters ID to remove gaps.")
         clustersTotal = len(self.clusters)
         clusterKeys = list(self.clusters.keys())
-        for i, k in enumerate(clusterKeys):
-            cluster = self.clusters[k]
-            cluster.id = i
-            self.clusters[i] = cluster
-            clusterListStr += str(cluster.id) + "\n"
-            clusterInstancesStr += str(cluster.id)
-            for gate in cluster.gates.values():
-                clusterInstancesStr += " " + str(gate.name)
-            clusterInstancesStr += "\n"
-            # I only want to keep keys [0, clustersTotal - 1]
-            if k >= clustersTotal:
-                del self.clusters[k]
+        logger.debug("Dumping {} clusters in Clusters.out".format(clustersTotal))
+        with open("Clusters.out", 'w') as clusterListFile, open('ClustersInstances.out', 'w') as clusterInstancesFile:
+            for i, k in enumerate(clusterKeys):
+                cluster = self.clusters[k]
+                cluster.id = i
+                self.clusters[i] = cluster
+                clusterListFile.write(str(cluster.id) + "\n")
+                clusterInstancesFile.write(str(cluster.id) + "".join(" " + str(gate.name) for gate in cluster.gates.values()) + "\n")
+                # I only want to keep keys [0, clustersTotal - 1]
+                if k >= clustersTotal:
+                    del self.clusters[k]
 
         clustOnBottom = set()
         for gateName in fixToBottom:
             clustOnBottom.add(self.gates[gateName].cluster.id)
-        fixfileStr = ""
-        for i in range(len(self.clusters)):
-            if i in clustOnBottom:
-                fixfileStr += "0\n"
-            else:
-                fixfileStr += "-1\n"
         with open("fixfile.hgr", 'w') as f:
-            f.write(fixfileStr)
-
-
-        logger.debug("Dumping {} clusters in Clusters.out".format(clustersTotal))
-        with open("Clusters.out", 'w') as file:
-            file.write(clusterListStr)
+            for i in range(len(self.clusters)):
+                if i in clustOnBottom:
+                    f.write("0\n")
+                else:
+                    f.write("-1\n")
 
-        with open('ClustersInstances.out', 'w') as file:
-            file.write(clusterInstancesStr)
 
 
     def progressiveWireLength(self, objective):
@@ -2110,7 +2367,7 @@ class Design:
                 net = self.nets[k]
                 netLengths.append(net.wl)
                 netNames.append(net.name)
-            heapSort(netLengths, netNames)
+            netLengths, netNames = net_ranking.sortByLength(netLengths, netNames)
 
 
             # Create the basic clusters containing only one gate.
@@ -2152,7 +2409,7 @@ class Design:
                                     netLengths.append(net.wl)
                                     netNames.append(net.name)
                                 break #Stop looking into this net, go on with the next one.
-            heapSort(netLengths, netNames)
+            netLengths, netNames = net_ranking.sortByLength(netLengths, netNames)
 
 
 
@@ -2227,34 +2484,21 @@ class Design:
                 netLengths.append(netLengths[0])
                 del netLengths[0]
 
-        clusterListStr = ""
-        clusterInstancesStr = ""
-
         # Change the cluster IDs so that there is no gap.
         logger.debug("Update clusters ID to remove gaps.")
         clustersTotal = len(self.clusters)
         clusterKeys = list(self.clusters.keys())
-        for i, k in enumerate(clusterKeys):
-            cluster = self.clusters[k]
-            cluster.id = i
-            self.clusters[i] = cluster
-            clusterListStr += str(cluster.id) + "\n"
-            clusterInstancesStr += str(cluster.id)
-            for gk in cluster.gates:
-                gate = cluster.gates[gk]
-                clusterInstancesStr += " " + str(gate.name)
-            clusterInstancesStr += "\n"
-            # I only want to keep keys [0, clustersTotal - 1]
-            if k >= clustersTotal:
-                del self.clusters[k]
-
-
         logger.debug("Dumping {} clusters in Clusters.out".format(clustersTotal))
-        with open("Clusters.out", 'w') as file:
-            file.write(clusterListStr)
-
-        with open('ClustersInstances.out', 'w') as file:
-            file.write(clusterInstancesStr)
+        with open("Clusters.out", 'w') as clusterListFile, open('ClustersInstances.out', 'w') as clusterInstancesFile:
+            for i, k in enumerate(clusterKeys):
+                cluster = self.clusters[k]
+                cluster.id = i
+                self.clusters[i] = cluster
+                clusterListFile.write(str(cluster.id) + "\n")
+                clusterInstancesFile.write(str(cluster.id) + "".join(" " + str(gate.name) for gate in cluster.gates.values()) + "\n")
+                # I only want to keep keys [0, clustersTotal - 1]
+                if k >= clustersTotal:
+                    del self.clusters[k]
 
 
 
@@ -2291,7 +2535,7 @@ class Design:
 ##   ##    ##       ##  ##         ##     ##  ##     ###  ##     ##  
 ##    ##   ##       ##  #########  ##     ##  ##      ##   #######   
 
-    def kmeans(self, clustersTarget, clusteringMethod):
+    def kmeans(self, clustersTarget, clusteringMethod, warmStart=False):
         """Kmeans clustering.
         The idea is to place regular points in the design that will act as centers of gravity.
         For each of those, we will clusterize the pairs of gates which closest gravity center is that one. This first step actually results in the naive geometric clustering.
@@ -2326,15 +2570,37 @@ class Design:
         clusteringMethod : str
             Sets the precise method to generate the first centers of gravity,
             "kmeans-geometric" or "kmeans-random".
+            "kmeans-hamerly-geometric" and "kmeans-hamerly-random" give the same clusters
+            while skipping most gates at each run: each gate keeps an upper bound of the
+            distance to its center and a lower bound of the distance to any other center,
+            moved by how much the centers moved (Hamerly's algorithm). A gate is only
+            looked up in the KD-tree again when its bounds overlap.
+            "kmeans-minibatch-geometric" and "kmeans-minibatch-random" only place a random
+            sample of the gates at each run (1/MINIBATCH_FRACTION of them, at least
+            10 per cluster), each center becoming the mean of all the gates it received
+            so far. The clusters are approximate, all gates are placed in the closest
+            cluster once the centers have converged.
+        warmStart : bool
+            Start from the centers of the previous kmeans() clustering if it had
+            at least clustersTarget clusters, merging their closest pairs down to
+            clustersTarget (see mergeClosestCenters()), instead of placing new ones.
         """
 
         logger.info("Creating {} clusters using kmeans.".format(clustersTarget))
 
         # Number or time we update the center of gravity from the center of mass.
         NRUNS = 300
+        # Share of the gates sampled at each run by kmeans-minibatch.
+        MINIBATCH_FRACTION = 10
+
 
+        hamerly = clusteringMethod.startswith("kmeans-hamerly-")
+        minibatch = clusteringMethod.startswith("kmeans-minibatch-")
 
-        if clusteringMethod == "kmeans-geometric":
+        if warmStart and self.kmeansCenters is not None and len(self.kmeansCenters) >= clustersTarget:
+            logger.info("Starting from the {} centers of the previous kmeans.".format(len(self.kmeansCenters)))
+            centers = mergeClosestCenters(self.kmeansCenters, self.kmeansSizes, clustersTarget)
+        elif clusteringMethod.endswith("-geometric"):
             # Place the centers of gravity geometricaly.
             centers = list()
             base = sqrt(clustersTarget)
@@ -2362,13 +2628,25 @@ class Design:
                     # Create extra row of clusters
                     for i in range( clustersTarget - base**2 ):
                         centers.append(( (0.5+i)*(self.width/(clustersTarget - base**2)), (0.5+base)*(self.height/(base+1)) ))
-        elif clusteringMethod == "kmeans-random":
+        elif clusteringMethod.endswith("-random"):
             centers = list()
             for i in range(clustersTarget):
                 centers.append(( random.uniform(0,self.width), random.uniform(0, self.height) ))
 
         # print(centers)
 
+        # Only the standard cells are clustered, the memory macros get their own cluster afterwards.
+        kmeansGates = [gate for gate in self.gates.values() if not gate.isMemory]
+        gatesX = np.array([gate.x for gate in kmeansGates], dtype=np.float64)
+        gatesY = np.array([gate.y for gate in kmeansGates], dtype=np.float64)
+        gatesXY = np.column_stack((gatesX, gatesY))
+        centers = np.array(centers, dtype=np.float64).reshape(-1, 2)
+
+        if minibatch:
+            rng = np.random.default_rng(random.getrandbits(32))
+            batchSize = min(len(kmeansGates), max(len(kmeansGates) // MINIBATCH_FRACTION, 10 * len(centers)))
+            centerWeight = np.zeros(len(centers)) # Amount of gates that went into each center so far.
+
         # Run the kmeans algo
         run = 0
         convergence = False
@@ -2376,81 +2654,72 @@ class Design:
         centerSkew = list()
         while run < NRUNS and not convergence:
             run += 1
-            centerSkewTmp = list()
-            # Reset clusters
-            self.clusters = dict()
-
-            for i in enumerate(centers):
-                cluster =  Cluster(0, 0, 0, [0, 0], i[0])
-                self.clusters[cluster.id] = cluster
-            
-            #######
-            # BST #
-            #######
-            # # Build the BST with all the centers.
-            # tree = bst.BST()
-            # bst.buildBalancedBST(centers, tree)
-            # # Not balanced.
-            # # for center in centers:
-            # #     bst.insert(center)
-            # # sys.exit()
-
-            # # Nearest neighbour
-            # for gk in self.gates:
-            #     center = tree.nnsearch((self.gates[gk].x, self.gates[gk].y) )
-            #     centerIndex = centers.index(center)
-            #     self.clusters[centerIndex].addGate(self.gates[gk])
-            #     self.gates[gk].addCluster(self.clusters[centerIndex])
-            # # sys.exit()
-
-            ##############
-            # EXHAUSTIVE #
-            ##############
-
             # Place gates in closest cluster
-            logger.info("Place gates in the closest cluster...")
-            with alive_bar(len(self.gates)) as bar:
-                for gate in self.gates.values():
-                    # If the cell is a memory macro, skip it. We will process it later.
-                    if gate.isMemory:
-                        continue
-                    disClosest = float('inf')
-                    clustClosest = 0
-                    for center in enumerate(centers):
-                        disCenter = EuclideanDistance( (gate.x, gate.y), center[1])
-                        if disCenter < disClosest:
-                            disClosest = disCenter
-                            # The id of the center is the id of the cluster
-                            clustClosest = center[0]
-                    self.clusters[clustClosest].addGate(gate)
-                    gate.addCluster(self.clusters[clustClosest])
-                    bar()
+            if minibatch:
+                batch = rng.choice(len(kmeansGates), batchSize, replace=False)
+                closest = closestCenters(gatesXY[batch], centers)
+            elif not hamerly:
+                closest = closestCenters(gatesXY, centers)
+            elif run == 1:
+                closest, upper, lower = closestCenters(gatesXY, centers, bounds=True)
+            else:
+                # Bounds following the moves of the centers during the last run.
+                upper += centerShift[closest]
+                # The lower bound moves by the largest shift of the other centers.
+                fastest = np.argmax(centerShift)
+                otherShift = np.delete(centerShift, fastest).max(initial=0)
+                lower -= np.where(closest == fastest, otherShift, centerShift[fastest])
+                stale = upper >= lower
+                upper[stale] = np.sqrt((gatesX[stale] - centers[closest[stale], 0])**2 + (gatesY[stale] - centers[closest[stale], 1])**2)
+                stale[stale] = upper[stale] >= lower[stale]
+                closest[stale], upper[stale], lower[stale] = closestCenters(gatesXY[stale], centers, bounds=True)
+                logger.debug("Run {}, {} gates out of {} looked up".format(run, np.count_nonzero(stale), len(kmeansGates)))
 
             # Compute center of mass for each cluster
-            centerOfMass = list()
-            logger.info("Updating center of mass for each cluster...")
-            with alive_bar(len(self.clusters)) as bar:
-                for cluster in self.clusters.values():
-                    sumx = 0
-                    sumy = 0
-                    if len(cluster.gates) > 0:
-                        for gate in cluster.gates.values():
-                            # This does not need to be optimized. Even if the sum is computed during the cluster formation, we do not gain time. This is fine and more readable.
-                            sumx += gate.x
-                            sumy += gate.y
-                        centerOfMass.append(( sumx/len(cluster.gates), sumy/len(cluster.gates) ))
-                        centerSkewTmp.append(EuclideanDistance(centerOfMass[-1], centers[len(centerOfMass)-1]))
-                    else:
-                        # If a cluster does not have any gate, get the old value.
-                        # This is OK since self.clusters is read in the same order as <centers>.
-                        centerOfMass.append( centers[len(centerOfMass)-1] )
-                    bar()
+            count = np.bincount(closest, minlength=len(centers))
+            centerOfMass = centers.copy()
+            filled = count > 0
+            if not minibatch:
+                # If a cluster does not have any gate, get the old value of the previous center,
+                # the last one for the first center.
+                empty = np.flatnonzero(~filled)
+                centerOfMass[empty] = centers[empty - 1]
+            if minibatch:
+                sumX = np.bincount(closest, weights=gatesX[batch], minlength=len(centers))
+                sumY = np.bincount(closest, weights=gatesY[batch], minlength=len(centers))
+                centerOfMass[filled, 0] = (centerWeight[filled] * centers[filled, 0] + sumX[filled]) / (centerWeight[filled] + count[filled])
+                centerOfMass[filled, 1] = (centerWeight[filled] * centers[filled, 1] + sumY[filled]) / (centerWeight[filled] + count[filled])
+                centerWeight += count
+            else:
+                centerOfMass[filled, 0] = np.bincount(closest, weights=gatesX, minlength=len(centers))[filled] / count[filled]
+                centerOfMass[filled, 1] = np.bincount(closest, weights=gatesY, minlength=len(centers))[filled] / count[filled]
+            centerShift = np.sqrt((centerOfMass[:, 0] - centers[:, 0])**2 + (centerOfMass[:, 1] - centers[:, 1])**2)
+            centerSkewTmp = centerShift[filled].tolist()
+
             percentile = np.percentile(centerSkewTmp, 95)
             if percentile < convCriteria:
                 convergence = True
             centerSkew.append(centerSkewTmp)
             centers = centerOfMass
             logger.debug("Run {}, 95th percentile: {} ({} AGW)".format(run, percentile, percentile/self.agw))
+
+        if minibatch:
+            closest = closestCenters(gatesXY, centers)
+
+        self.kmeansCenters = centers
+        self.kmeansSizes = np.bincount(closest, minlength=len(centers))
+        self.kmeansRuns = run
+
+        # Clusters of the last run
+        self.clusters = dict()
+        for i in range(len(centers)):
+            cluster =  Cluster(0, 0, 0, [0, 0], i)
+            self.clusters[cluster.id] = cluster
+        closest = closest.tolist()
+        for gate, clustClosest in zip(kmeansGates, closest):
+            # The id of the center is the id of the cluster
+            self.clusters[clustClosest].addGate(gate)
+            gate.addCluster(self.clusters[clustClosest])
         logger.info("Kmeans runs: {}".format(run))
         plt.figure()
         plt.boxplot(centerSkew)
@@ -2477,26 +2746,12 @@ class Design:
             cluster.area= area
 
         # Create ClustersInstances.out
-        clusterInstancesStr = ""
-        for cluster in self.clusters.values():
-            clusterInstancesStr += str(cluster.id)
-            for gate in cluster.gates.values():
-                clusterInstancesStr += " " + str(gate.name)
-            clusterInstancesStr += "\n"
-
-        with open("ClustersInstances.out", 'w') as f:
-            f.write(clusterInstancesStr)
+        self.dumpClustersInstances()
 
         # sys.exit()
 
         # Create output file
-        clustersOutStr = ""
-        for cluster in self.clusters.values():
-            clustersOutStr += str(cluster.id) + "\n"
-
-        logger.debug("Dumping Clusters.out")
-        with open("Clusters.out", 'w') as file:
-            file.write(clustersOutStr)
+        self.dumpClusters()
 
 
 
@@ -2616,24 +2871,10 @@ class Design:
 
 
         # Create ClustersInstances.out
-        clusterInstancesStr = ""
-        for cluster in self.clusters.values():
-            clusterInstancesStr += str(cluster.id)
-            for gate in cluster.gates.values():
-                clusterInstancesStr += " " + str(gate.name)
-            clusterInstancesStr += "\n"
-
-        with open("ClustersInstances.out", 'w') as f:
-            f.write(clusterInstancesStr)
+        self.dumpClustersInstances()
 
         # Create output file
-        clustersOutStr = ""
-        for cluster in self.clusters.values():
-            clustersOutStr += str(cluster.id) + "\n"
-
-        logger.debug("Dumping Clusters.out")
-        with open("Clusters.out", 'w') as file:
-            file.write(clustersOutStr)
+        self.dumpClusters()
 
 
 
@@ -2649,69 +2890,73 @@ class Design:
     def clusterConnectivity(self):
         """
         Find out what is the inter-cluster connectivity.
-        """
-
-        RAW_INTERCONNECTIONS = False  # If True, we don't care to which clusters a cluster is connected.
-                                    # All we care about is that it's establishing an inter-cluster connection.
-                                    # In that case, all clusters are connected to a cluster "0" which corresponds to none cluster ID (they begin at 1).
-                                    # If this is true, we go from an O(n^2) algo (loop twice on all clusters) to a O(n).
 
+        Each net is processed once: the cluster IDs of its gates are gathered in arrays,
+        then counted per (net, cluster) pair with np.unique.
+        For each cluster, the connectivity is the amount of (gate in the cluster, gate outside
+        of it) pairs sharing a net, and the unique-net connectivity the amount of nets it shares
+        with other clusters.
+        """
         logger.info("Establish connectivity")
-        connectivity = dict() # Key: source cluster, values: destination clusters
-        connectivityUniqueNet = dict() # Connectivity, but counting only once every net between clusters
-
-        # In this matrix, a 0 means no connection.
-        # conMatrix = [[0 for x in range(clustersTotal)] for y in range(clustersTotal)]
-        # conMatrixUniqueNet = [[0 for x in range(clustersTotal)] for y in range(clustersTotal)]
-        
-        clusterNetSet = dict() # Dictionary of sets.
-
-        spaningNetsUnique = dict() # This dicitonary contains all the nets that span over more than one cluster. The difference with the other dictionaries is that this one contains each net only once. This will be used to compute the total inter-cluster wirelength.
-
         clustersTotal = len(self.clusters)
-
+        clusterIDs = list(dict.fromkeys(cluster.id for cluster in self.clusters.values()))
+
+        # Cluster of each gate, as seen from the nets. A gate whose cluster does not contain it is ignored.
+        gates = list(self.gates.values())
+        gateIDs = {gate.name: i for i, gate in enumerate(gates)}
+        gateClusterIDs = np.array([gate.cluster.id for gate in gates], dtype=np.int64)
+        gateInCluster = np.array([gate.cluster.gates.get(gate.name) is not None for gate in gates], dtype=bool)
+
+        # Gates of each net, net i owning pinGates[netPtr[i]:netPtr[i+1]].
+        nets = list(self.nets.values())
+        netIDs = {net.name: i for i, net in enumerate(nets)}
+        netSizes = np.array([len(net.gates) for net in nets], dtype=np.int64)
+        netPtr = np.concatenate(([0], np.cumsum(netSizes)))
+        pinGates = np.fromiter((gateIDs[gateName] for net in nets for gateName in net.gates.keys()), dtype=np.int64, count=netPtr[-1])
+        pinNets = np.repeat(np.arange(len(nets), dtype=np.int64), netSizes)
+        pinClusterIDs = gateClusterIDs[pinGates]
+
+        # Amount of gates of each net in each cluster, as (net, cluster) keys.
+        clusterIDsSpan = max(int(gateClusterIDs.max(initial=0)), max(clusterIDs, default=0)) + 1
+        pinKeys = (pinNets * clusterIDsSpan + pinClusterIDs)[gateInCluster[pinGates]]
+        netClusterKeys, netClusterGates = np.unique(pinKeys, return_counts=True)
+        netGates = np.bincount(pinKeys // clusterIDsSpan, minlength=len(nets)) # Gates of each net in their cluster
+        netClusters = np.bincount(netClusterKeys // clusterIDsSpan, minlength=len(nets)) # Clusters of each net
+        # Cluster of the nets spanning a single cluster.
+        netSingleCluster = np.full(len(nets), -1, dtype=np.int64)
+        netSingleCluster[netClusterKeys // clusterIDsSpan] = netClusterKeys % clusterIDsSpan
+        netClustersList = netClusters.tolist()
+        netSingleClusterList = netSingleCluster.tolist()
+
+        # Walk the gates of each cluster to pair them with their nets. The nets spanning
+        # several clusters are registered in the order they are found from the clusters.
         interNets = dict() # Net spanning several clusters {Net.name : Net}
         intraNets = dict() # Net fully contained in a single cluster {Net.name : Net}
-
+        sourceNets = [] # Net of each (gate, net) pair
+        sourceClusterIDs = [] # Cluster of each (gate, net) pair
         with alive_bar(len(self.clusters)) as bar:
-            for ck in self.clusters:
+            for cluster in self.clusters.values():
                 bar()
-                cluster = self.clusters[ck]
-                connectivity[cluster.id] = []
-                connectivityUniqueNet[cluster.id] = []
-                clusterNetSet[cluster.id] = set()
-                # print "Source cluster: " + str(cluster.id)
-                for key in cluster.gates:
-                    for netKey in cluster.gates[key].nets:
-                        net = cluster.gates[key].nets[netKey]
-                        for subkey in net.gates:
-                            subgateName = net.gates[subkey].name
-                            if RAW_INTERCONNECTIONS:
-                                # Simply check that the gate selected is not in the same cluster.
-                                if cluster.gates.get(subgateName) == None:
-                                    connectivity[cluster.id].append(0)
-                                    if netKey not in clusterNetSet[cluster.id]:
-                                        # If the net is not yet registered in the cluster, add it.
-                                        clusterNetSet[cluster.id].add(netKey)
-                                        connectivityUniqueNet[cluster.id].append(0)
-                                        if spaningNetsUnique.get(netKey) == None:
-                                            # If the net is not registered as spaning over several clusters, add it.
-                                            spaningNetsUnique[netKey] = net
-                                            interNets[net.name] = net
+                for gate in cluster.gates.values():
+                    for net in gate.nets.values():
+                        netID = netIDs[net.name]
+                        sourceNets.append(netID)
+                        sourceClusterIDs.append(cluster.id)
+                        if net.name not in interNets and (netClustersList[netID] > 1 or (netClustersList[netID] == 1 and netSingleClusterList[netID] != cluster.id)):
+                            interNets[net.name] = net
+        sourceNets = np.array(sourceNets, dtype=np.int64)
+        sourceClusterIDs = np.array(sourceClusterIDs, dtype=np.int64)
 
-                            else:
-                                if net.gates[subkey].cluster.id != cluster.id:
-                                    if net.gates[subkey].cluster.gates.get(subgateName) != None:
-                                            connectivity[cluster.id].append(net.gates[subkey].cluster.id)
-                                            # conMatrix[cluster.id-1][net.gates[subkey].cluster.id-1] += 1
-                                            if netKey not in clusterNetSet[cluster.id]:
-                                                clusterNetSet[cluster.id].add(netKey)
-                                                connectivityUniqueNet[cluster.id].append(net.gates[subkey].cluster.id)
-                                                # conMatrixUniqueNet[cluster.id-1][net.gates[subkey].cluster.id-1] += 1
-                                                if spaningNetsUnique.get(netKey) == None:
-                                                    # If the net is not registered as spaning over several clusters, add it.
-                                                    spaningNetsUnique[netKey] = net
-                                                    interNets[net.name] = net
+        # Gates outside of the source cluster on the net of each pair.
+        sourceKeys = sourceNets * clusterIDsSpan + sourceClusterIDs
+        position = np.minimum(np.searchsorted(netClusterKeys, sourceKeys), max(len(netClusterKeys) - 1, 0))
+        sameCluster = np.where(netClusterKeys[position] == sourceKeys, netClusterGates[position], 0) if len(netClusterKeys) > 0 else np.zeros(len(sourceKeys), dtype=np.int64)
+        outside = netGates[sourceNets] - sameCluster
+
+        connections = np.bincount(sourceClusterIDs, weights=outside, minlength=clusterIDsSpan).astype(np.int64)
+        uniqueNetConnections = np.bincount(np.unique(sourceKeys[outside > 0]) % clusterIDsSpan, minlength=clusterIDsSpan)
+
+        self.connectivityMatrix(nets, netClusterKeys, clusterIDsSpan, clustersTotal)
 
         """
         This a very primitive connectivity metric.
@@ -2719,78 +2964,19 @@ class Design:
         This means that a same net could be counted multiples times as long as it connects different gates.
         """
         logger.info("Estimating inter-cluster connectivity and exporting it to file inter_cluster_connectivity_{}.csv".format(clustersTotal))
-        s = ""
-        for key in connectivity:
-            s += str(key) + "," + str(len(connectivity[key]))
-            s += "\n"
-        # print s
         with open("inter_cluster_connectivity_" + str(clustersTotal) + ".csv", 'w') as file:
-            file.write(s)
-
-
-
-        # if not RAW_INTERCONNECTIONS:
-            # logger.info("Processing inter-cluster connectivity matrix and exporting it to inter_cluster_connectivity_matrix_{}.csv".format(clustersTotal))
-            # """
-            # I want a matrix looking like
-
-            #   1 2 3 4
-            # 1 0 8 9 0
-            # 2 4 0 4 2
-            # 3 5 1 0 3
-            # 4 1 4 2 0
-
-            # with the first row and first column being the cluster index, and the inside of the matrix the amount of connections
-            # going from the cluster on the column to the cluster on the row (e.g. 8 connections go from 1 to 2 and 4 go from 4 to 1).
-            # """
-            # s = ""
-
-            # # First row
-            # for i in range(clustersTotal):
-            #     s += "," + str(i)
-            # s += "\n"
-
-            # for i in range(clustersTotal):
-            #     s += str(i) # First column
-            #     for j in range(clustersTotal):
-            #         s+= "," + str(conMatrix[i][j] + 1) # '+1' because we store the matrix index with '-1' to balance the fact that the clusters begin to 1, but the connectivity matric begin to 0.
-            #     s += "\n"
-            # # print s
-            # with open("inter_cluster_connectivity_matrix_" + str(clustersTotal) + ".csv", 'w') as file:
-            #     file.write(s)
-
-
-            # s = ""
-
-            # # First row
-            # for i in range(clustersTotal):
-            #     s += "," + str(i)
-            # s += "\n"
-
-            # for i in range(clustersTotal):
-            #     s += str(i) # First column
-            #     for j in range(clustersTotal):
-            #         s+= "," + str(conMatrixUniqueNet[i][j] + 1) # '+1' because we store the matrix index with '-1' to balance the fact that the clusters begin to 1, but the connectivity matric begin to 0.
-            #     s += "\n"
-            # # print s
-            # with open("inter_cluster_connectivity_matrix_unique_net_" + str(clustersTotal) + ".csv", 'w') as file:
-            #     file.write(s)
-
-
+            for clusterID in clusterIDs:
+                file.write(str(clusterID) + "," + str(connections[clusterID]) + "\n")
 
         logger.info("Processing inter-cluster connectivity without duplicate nets, exporting to inter_cluster_connectivity_unique_nets_{}.csv.".format(clustersTotal))
-        s = ""
-        for key in connectivityUniqueNet:
-            s += str(key) + "," + str(len(connectivityUniqueNet[key]))
-            s += "\n"
-        # print s
         with open("inter_cluster_connectivity_unique_nets_" + str(clustersTotal) + ".csv", 'w') as file:
-            file.write(s)
+            for clusterID in clusterIDs:
+                file.write(str(clusterID) + "," + str(uniqueNetConnections[clusterID]) + "\n")
 
 
         # Compute Rent's terminals, a.k.a. clusters external connectivity
-        for clusterID in connectivityUniqueNet:
-            terminals = len(connectivityUniqueNet[clusterID])
+        for clusterID in clusterIDs:
+            terminals = int(uniqueNetConnections[clusterID])
             gateNum = len(self.clusters[clusterID].gates)
             # TODO some clusters appear to have 0 gate. Investigate this, it should not happen.
             # This may actually be because of the geometrical clustering getting too fine.
@@ -2806,70 +2992,46 @@ class Design:
         Intra-cluster connectivity
         """
         logger.info("Computing intra-cluster connectivity")
-        connectivityIntra = dict()
-        # Dictionary init
-        for ck in self.clusters:
-            cluster = self.clusters[ck]
-            connectivityIntra[cluster.id] = []
-
-
-        for k in self.nets:
-            net = self.nets[k]
-            clusterID = -1 # Begin with '-1' to mark the fact that we are looking at the first gate of the net.
-            discardNet = False
-            for key in net.gates:
-                if net.gates[key].cluster.id != clusterID and clusterID != -1:
-                    # this gate is not in the same cluster as the previous one. Discard the net.
-                    discardNet = True
-                    # print "(" + str(net.name) + ") We found a gate in a different cluster: from " + str(clusterID) + " to " + str(net.gates[key].cluster.id) + "(and net.gates[key] is " + str(net.gates[key]) + ")"
-                    # print "This concerns the net '" + str(net.name) + "'"
-                    # TODO break the loop net.gates here
-                    break
-                else:
-                    clusterID = net.gates[key].cluster.id
-                    # print "(" + str(net.name) + ") Changing the clusterID to " + str(clusterID)
-            if not discardNet and clusterID != -1:
-                # Need the != -1 condition because if we reach this branch with clusterID = -1, it means that the net does not have any gate,
-                # it means that net.gates is empty, and that *can* happen, it's fine.
-                # It's more efficient to check here for clusterID rather than len(net.gates) for every net.
-                # print "(" + str(net.name) + ") inside 'if not discardNet:', clusterID = " + str(clusterID)
-                connectivityIntra[clusterID].append(net.name)
-                intraNets[net.name] = net
-
-
+        # Nets with at least one gate, all of them in the same cluster.
+        nonEmpty = netSizes > 0
+        netMin = np.full(len(nets), -1, dtype=np.int64)
+        netMax = np.full(len(nets), -1, dtype=np.int64)
+        if nonEmpty.any():
+            netMin[nonEmpty] = np.minimum.reduceat(pinClusterIDs, netPtr[:-1][nonEmpty])
+            netMax[nonEmpty] = np.maximum.reduceat(pinClusterIDs, netPtr[:-1][nonEmpty])
+        intraIDs = np.flatnonzero(nonEmpty & (netMin == netMax))
+        for netID in intraIDs.tolist():
+            intraNets[nets[netID].name] = nets[netID]
+        intraConnections = np.bincount(netMin[intraIDs], minlength=clusterIDsSpan)
 
         logger.info("Processing intra-cluster connectivity, exporting to intra_cluster_connectivity_{}.csv.".format(clustersTotal))
-        s = ""
-        for key in connectivityIntra:
-            s += str(key) + "," + str(len(connectivityIntra[key]))
-            s += "\n"
-        # print s
         with open("intra_cluster_connectivity_" + str(clustersTotal) + ".csv", 'w') as file:
-            file.write(s)
+            for clusterID in clusterIDs:
+                file.write(str(clusterID) + "," + str(intraConnections[clusterID]) + "\n")
 
 
 
         self.totalInterClusterWL = 0
-        for key in spaningNetsUnique:
-            self.totalInterClusterWL += spaningNetsUnique[key].wl
+        for net in interNets.values():
+            self.totalInterClusterWL += net.wl
         logger.info("Total inter-cluster wirelength: {}, which is {}% of the total wirelength.".format(locale.format_string("%d", self.totalInterClusterWL, grouping=True), self.totalInterClusterWL*100/self.totalWireLength))
-        logger.info("Inter-cluster nets: {}, which is {}% of the total amount of nets.".format(len(spaningNetsUnique), len(spaningNetsUnique) * 100 / len(self.nets)))
+        logger.info("Inter-cluster nets: {}, which is {}% of the total amount of nets.".format(len(interNets), len(interNets) * 100 / len(self.nets)))
 
         logger.info("Analyzing clustering effect on net distribution...")
         points = list()
         interNetLength = list()
         intraNetLength = list()
         totalNetLength = list() # Length of all the nets, before clustering
-        interNetStr = ""
-        intraNetStr = ""
-        for net in interNets.values():
-            interNetLength.append(net.wl)
-            totalNetLength.append(net.wl)
-            interNetStr += "{}, {}\n".format(net.name, net.wl)
-        for net in intraNets.values():
-            intraNetLength.append(net.wl)
-            totalNetLength.append(net.wl)
-            intraNetStr += "{}, {}\n".format(net.name, net.wl)
+        with open("inter-cluster_nets_wl.out", 'w') as f:
+            for net in interNets.values():
+                interNetLength.append(net.wl)
+                totalNetLength.append(net.wl)
+                f.write("{}, {}\n".format(net.name, net.wl))
+        with open("intra-cluster_nets_wl.out", 'w') as f:
+            for net in intraNets.values():
+                intraNetLength.append(net.wl)
+                totalNetLength.append(net.wl)
+                f.write("{}, {}\n".format(net.name, net.wl))
         points.append(totalNetLength)
         points.append(interNetLength)
         points.append(intraNetLength)
@@ -2878,10 +3040,6 @@ class Design:
         logger.info("Inter-cluster nets length, average: {}, median: {}".format(statistics.mean(interNetLength), statistics.median(interNetLength)))
         logger.info("Intra-cluster nets length, average: {}, median: {}".format(statistics.mean(intraNetLength), statistics.median(intraNetLength)))
 
-        with open("inter-cluster_nets_wl.out", 'w') as f:
-            f.write(interNetStr)
-        with open("intra-cluster_nets_wl.out", 'w') as f:
-            f.write(intraNetStr)
 
 
         filenameInfo = "{}".format(datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
@@ -2902,24 +3060,111 @@ class Design:
 
 
 
-    def clusterArea(self):
-        # TODO Store the files in a seperate folder depending on the clustering.
-        clusterAreaOut = "Name Type InstCount Boundary Area\n" # Clusters info to dump into 'ClustersArea.out'
+    def connectivityMatrix(self, nets, netClusterKeys, clusterIDsSpan, clustersTotal):
+        """
+        Export the inter-cluster connectivity as sparse matrices, indexed by cluster ID:
+        the amount of nets shared by each pair of clusters into inter_cluster_connectivity_matrix_unique_net_<clustersTotal>.npz
+        and their cumulated length into inter_cluster_connectivity_matrix_wl_<clustersTotal>.npz.
+        Both are scipy.sparse CSR matrices, to load with scipy.sparse.load_npz().
 
-        clusterKeys = sorted(list(self.clusters.keys()))
-        for ck in clusterKeys:
-            cluster = self.clusters[ck]
-            # Set the line corresponding to this cluster for the information dumping into clustersArea.out
-            clusterAreaOut += str(cluster.id) + " " + "exclusive" + " " + str(len(cluster.gates)) + " " + \
-                            "(" + str(cluster.origin[0]) + "," + str(cluster.origin[1]) + ")" + " " + \
-                            "(" + str(cluster.origin[0] + cluster.width) + "," + \
-                            str(cluster.origin[1] + cluster.height) + ")" + " " + \
-                            str(cluster.getGateArea()) + "\n"
+        Parameters
+        ----------
+        nets : list of Net
+        netClusterKeys : np.ndarray
+            Sorted unique (net index * clusterIDsSpan + cluster ID) of the gates of the nets, see clusterConnectivity().
+        clusterIDsSpan : int
+            Highest cluster ID + 1.
+        clustersTotal : int
+        """
+        netIDs = netClusterKeys // clusterIDsSpan
+        netClusters = np.bincount(netIDs, minlength=len(nets))
+        spanning = netClusters[netIDs] > 1
+        oversized = np.flatnonzero(netClusters > MATRIX_MAX_NET_CLUSTERS)
+        if len(oversized) > 0:
+            logger.warning("{} nets spanning more than {} clusters left out of the connectivity matrices.".format(len(oversized), MATRIX_MAX_NET_CLUSTERS))
+            spanning &= netClusters[netIDs] <= MATRIX_MAX_NET_CLUSTERS
+
+        # Incidence of the nets spanning several clusters, the adjacency being its Gram matrix.
+        incidence = scipy.sparse.csr_matrix((np.ones(np.count_nonzero(spanning)), (netIDs[spanning], netClusterKeys[spanning] % clusterIDsSpan)),
+                                            shape=(len(nets), clusterIDsSpan))
+        netLengths = scipy.sparse.diags(np.array([net.wl for net in nets], dtype=np.float64))
+        for name, matrix in [("unique_net", incidence.T @ incidence), ("wl", incidence.T @ netLengths @ incidence)]:
+            matrix = matrix.tocsr()
+            matrix.setdiag(0)
+            matrix.eliminate_zeros()
+            logger.info("Exporting inter-cluster connectivity matrix to inter_cluster_connectivity_matrix_{}_{}.npz".format(name, clustersTotal))
+            scipy.sparse.save_npz("inter_cluster_connectivity_matrix_{}_{}.npz".format(name, clustersTotal), matrix)
+
+
+    def writeHypergraph(self, wlWeights=False):
+        """
+        Write the clustered netlist into 'Clusters.hgr', in the hMetis hypergraph format:
+        the vertices are the clusters, in the order of Clusters.out, and each net spanning
+        several clusters is a hyperedge over them.
+        hMetis only takes integer weights: the vertices are weighted by the gates area of
+        their cluster in 1/HGR_AREA_SCALE µm² and the hyperedges by the length of their net
+        in 1/HGR_LENGTH_SCALE µm, both rounded and at least 1.
 
+        Parameters
+        ----------
+        wlWeights : bool
+            Weight the hyperedges, otherwise only the vertices are.
+        """
+        logger.info("Dumping Clusters.hgr")
+        vertexIDs = {cluster.id: i + 1 for i, cluster in enumerate(self.clusters.values())}
+        hyperedges = 0
+        with open("Clusters.hgr", 'w') as f:
+            # The amount of hyperedges is only known at the end, leave room for the header.
+            f.write(" " * HGR_HEADER_WIDTH + "\n")
+            for net in self.nets.values():
+                vertices = sorted(set(vertexIDs.get(gate.cluster.id) for gate in net.gates.values()) - {None})
+                if len(vertices) < 2:
+                    continue
+                hyperedges += 1
+                if wlWeights:
+                    f.write(str(max(1, int(round(net.wl * HGR_LENGTH_SCALE)))) + " ")
+                f.write(" ".join(map(str, vertices)) + "\n")
+            for cluster in self.clusters.values():
+                f.write(str(max(1, int(round(cluster.gateArea * HGR_AREA_SCALE)))) + "\n")
+            f.seek(0)
+            f.write("{} {} {}".format(hyperedges, len(self.clusters), 11 if wlWeights else 10))
+        logger.info("{} hyperedges over {} vertices".format(hyperedges, len(self.clusters)))
 
+
+    def dumpClusters(self):
+        """
+        Write the ID of each cluster into 'Clusters.out'.
+        """
+        logger.debug("Dumping Clusters.out")
+        with open("Clusters.out", 'w') as file:
+            for cluster in self.clusters.values():
+                file.write(str(cluster.id) + "\n")
+
+
+    def dumpClustersInstances(self):
+        """
+        Write each cluster into 'ClustersInstances.out', as its ID followed by the names of its gates.
+        """
+        logger.debug("Dumping ClustersInstances.out")
+        with open("ClustersInstances.out", 'w') as file:
+            for cluster in self.clusters.values():
+                file.write(str(cluster.id) + "".join(" " + str(gate.name) for gate in cluster.gates.values()) + "\n")
+
+
+    def clusterArea(self):
+        # TODO Store the files in a seperate folder depending on the clustering.
         logger.info("Dumping ClustersArea.out")
         with open("ClustersArea.out", 'w') as file:
-            file.write(clusterAreaOut)
+            file.write("Name Type InstCount Boundary Area\n")
+            clusterKeys = sorted(list(self.clusters.keys()))
+            for ck in clusterKeys:
+                cluster = self.clusters[ck]
+                # One line per cluster
+                file.write(str(cluster.id) + " " + "exclusive" + " " + str(len(cluster.gates)) + " " + \
+                            "(" + str(cluster.origin[0]) + "," + str(cluster.origin[1]) + ")" + " " + \
+                            "(" + str(cluster.origin[0] + cluster.width) + "," + \
+                            str(cluster.origin[1] + cluster.height) + ")" + " " + \
+                            str(cluster.getGateArea()) + "\n")
 
 
 
@@ -2956,25 +3201,12 @@ class Design:
         areasGlobal = list(map(lambda x: (x - (sum(areas)/len(areas))) / sum(areas), areas))
         cellsGlobal = list(map(lambda x: (x - (sum(cells)/len(cells))) / sum(cells), cells))
 
-        data = "clusters," + str(len(self.clusters)) + ",gates per cluster," + str(len(self.gates)/len(self.clusters)) + "\n"
-        data += "areasRelative,"+str(areasRelative[0])
-        for a in areasRelative[1:]:
-            data += ","+str(a)
-        data += "\n"
-        data += "cellsRelative,"+str(cellsRelative[0])
-        for c in cellsRelative[1:]:
-            data += ","+str(c)
-        data += "\n"
-        data += "areasGlobal,"+str(areasGlobal[0])
-        for a in areasGlobal[1:]:
-            data += ","+str(a)
-        data += "\n"
-        data += "cellsGlobal,"+str(cellsGlobal[0])
-        for c in cellsGlobal[1:]:
-            data += ","+str(c)
-
         with open('clusterSanityCheck.csv', 'w') as f:
-            f.write(data)
+            f.write("clusters," + str(len(self.clusters)) + ",gates per cluster," + str(len(self.gates)/len(self.clusters)) + "\n")
+            f.write("areasRelative," + ",".join(str(a) for a in areasRelative) + "\n")
+            f.write("cellsRelative," + ",".join(str(c) for c in cellsRelative) + "\n")
+            f.write("areasGlobal," + ",".join(str(a) for a in areasGlobal) + "\n")
+            f.write("cellsGlobal," + ",".join(str(c) for c in cellsGlobal))
 
 
     def RentStats(self, outFile):
@@ -2982,20 +3214,13 @@ class Design:
         Export all Rent stats to outFile.
         Not ordered at the moment
         '''
-        outStr = "gate count, terminals\n"
-
         logger.info("Gathering Rent's stats...")
-
-        for key in self.RentTerminals:
-            if key != len(self.gates):
-                outStr += str(key)
-                for count in self.RentTerminals[key]:
-                    outStr += ", " + str(count)
-                outStr += "\n"
-
         logger.debug("Dumping {}".format(outFile))
         with open(outFile, 'w') as file:
-            file.write(outStr)        
+            file.write("gate count, terminals\n")
+            for key in self.RentTerminals:
+                if key != len(self.gates):
+                    file.write(str(key) + "".join(", " + str(count) for count in self.RentTerminals[key]) + "\n")
 
 
 
@@ -3169,10 +3394,8 @@ def extractStdCells(tech, memory=False, outDir=""):
                     line = f.readline()
     if memory:
         with open(os.path.join(outDir,"MemoryMacros.out"), 'w') as f:
-            str = ""
             for macro in memoryMacros.keys():
-                str += "{}\n".format(macro)
-            f.write(str)
+                f.write("{}\n".format(macro))
 
     # Custom macro
     macro = StdCell("FRONT_BUMP")
@@ -3257,8 +3480,18 @@ if __name__ == "__main__":
     manhattanWireLength = False
     mmstWireLength = False
     cnWireLength = False
+    rmstWireLength = False
+    rsmtWireLength = False
     bbMethod = "pin"
     bold = False
+    useIndex = False
+    jobs = 1
+    useCache = False
+    compact = False
+    binary = False
+    warmStart = False
+    hgr = False
+    hgrWL = False
 
     args = docopt(__doc__)
 
@@ -3524,6 +3757,10 @@ if __name__ == "__main__":
         mmstWireLength = True
     if args["--cnwl"]:
         cnWireLength = True
+    if args["--rmstwl"]:
+        rmstWireLength = True
+    if args["--rsmtwl"]:
+        rsmtWireLength = True
 
     if args["--bb"]:
         bbMethod = args["--bb"]
@@ -3534,6 +3771,28 @@ if __name__ == "__main__":
     if args["--bold"]:
         bold = True
 
+    if args["--index"]:
+        useIndex = True
+
+    if args["--jobs"]:
+        jobs = int(args["--jobs"])
+
+    if args["--cache"]:
+        useCache = True
+
+    if args["--compact"]:
+        compact = True
+
+    if args["--binary"]:
+        binary = True
+
+    if args["--warm-start"]:
+        warmStart = True
+
+    if args["--hgr"]:
+        hgr = True
+        hgrWL = args["--hgr-wl"]
+
 
     # Create the directory for the output.
     rootDir = os.getcwd()
@@ -3579,26 +3838,39 @@ if __name__ == "__main__":
 
     design = Design()
     design.name = args["--design"]
-    design.ReadArea()
-    design.ExtractCells()
-    # design.Digest()
-    design.extractPins()
+    if useCache:
+        design.parseDefCached(stdCellsTech, manhattanWireLength, mmstWireLength, cnWireLength, useIndex, jobs, rmstWireLength, rsmtWireLength)
+    else:
+        design.parseDef(manhattanWireLength, mmstWireLength, cnWireLength, useIndex, jobs, rmstWireLength, rsmtWireLength)
+    if compact:
+        design.compact()
+    if binary:
+        for fname in ["CellSizes.out", "WLnets.out", "CellCoord.out"]:
+            design_bundle.convert(fname)
     # design.Digest()
-
-    design.extractNets(manhattanWireLength, mmstWireLength, cnWireLength)
     if args["--segments"]:
         design.segmentLen()
+    if args["--wl-models"]:
+        design.wireLengthModels()
     design.sortNets()
     design.Digest()
     logger.info("Evaluate bounding boxes for every net...")
     design.ComputeBoundingBox(bbMethod)
+    if binary:
+        design_bundle.convert("hpl.out")
     if DIGESTONLY:
         sys.exit()
 
     # for clustersTarget in [500]:
     # for clustersTarget in [4, 9, 25, 49, 100, 200, 300, 500, 1000, 2000, 3000]:
     # for clustersTarget in [9000, 8000, 7000, 6000, 5000, 4000, 3000, 2000]:
-    # TODO sort clustersTargets (reversed for progressive-wl)
+    if clusteringMethod == "progressive-wl":
+        # Increasing objectives, each step only hides the nets the previous one left.
+        clustersTargets.sort()
+    elif warmStart and clusteringMethod.startswith("kmeans"):
+        # Each kmeans starts from the centers of the previous, larger, clustering.
+        clustersTargets.sort(reverse=True)
+    kmeansRuns = dict() # {clusters target : kmeans runs}
     for clustersTarget in clustersTargets:
         logger.info("Clustering method: {}".format(clusteringMethod))
         clustering_dir = os.path.join(output_dir, deffile.split('/')[-1].split('.')[0] + "_" + clusteringMethod + "_" + str(clustersTarget))
@@ -3642,12 +3914,17 @@ if __name__ == "__main__":
                 if not SIG_SKIP:
                     design.clusterConnectivity()
             elif "kmeans" in clusteringMethod:
-                design.kmeans(int(clustersTarget), clusteringMethod)
+                design.kmeans(int(clustersTarget), clusteringMethod, warmStart)
+                kmeansRuns[clustersTarget] = design.kmeansRuns
                 if not SIG_SKIP:
                     design.clusterConnectivity()
             elif clusteringMethod == "metal":
                 design.metalClustering(clustersTarget)
                 design.clusterConnectivity()
+        if hgr:
+            design.writeHypergraph(hgrWL)
+        if binary and os.path.isfile("ClustersInstances.out"):
+            design_bundle.convert("ClustersInstances.out")
         design.clusterArea()
         if not bold:
             design.clusterSanityCheck()
@@ -3655,6 +3932,10 @@ if __name__ == "__main__":
     os.chdir(output_dir)
     design.RentStats("RentStats.csv")
 
+    if kmeansRuns:
+        logger.info("Kmeans runs per clusters target{}: {}, {} in total".format(" (warm start)" if warmStart else "",
+                    ", ".join("{}: {}".format(int(target), runs) for target, runs in kmeansRuns.items()), sum(kmeansRuns.values())))
+
     logger.info("End of all.")
 
 
@@ -25,8 +25,7 @@ if __name__ == "__main__":
 
 
     def_parser.design = def_parser.Design()
-    def_parser.design.ReadArea()
-    def_parser.design.ExtractCells()
+    def_parser.design.parseDef(stopAfter="COMPONENTS") # Only the die area and the gates are needed.
 
     imgW = int(def_parser.design.width*100) # Width of the design in 100^-1 um
     imgH = int(def_parser.design.height*100)
@@ -0,0 +1,289 @@
+"""
+Typed binary bundles of the text outputs of def_parser.py.
+
+Each bundled output '<name>.out' gets a NumPy '<name>.npz' next to it, holding
+the same data column-wise (see COLUMNS), so that the analysis scripts load it
+without splitting the text line by line. Names are stored as a blob of
+'\n'-terminated strings, numbers as int64 or float64.
+
+read() returns the columns of an output from its bundle when there is an up to
+date one, and falls back to parsing the text otherwise, so the scripts work on
+the outputs of older runs as well.
+
+Usage:
+    design_bundle.py    <dir> ...
+    design_bundle.py    --help
+
+Options:
+    <dir>           Folder holding the outputs to bundle, its sub-folders are bundled as well.
+    -h --help       Print this help
+"""
+
+import logging
+import os
+import numpy as np
+from docopt import docopt
+
+logger = logging.getLogger('default')
+
+BUNDLE_SUFFIX = ".npz"
+
+# Columns of each bundled output. Columns prefixed by 'names_' in the bundle are names.
+# ClustersInstances: the cells of the i-th cluster are cell[ptr[i]:ptr[i+1]].
+COLUMNS = {"CellCoord.out": ["net", "cell", "x", "y"],
+           "WLnets.out": ["net", "pins", "length"],
+           "CellSizes.out": ["cell", "width", "height"],
+           "hpl.out": ["net", "hpl", "bb"],
+           "ClustersInstances.out": ["cluster", "ptr", "cell"],
+           "WLnets_models.out": ["net", "pins", "routed", "hpl", "manhattan", "mstst", "mmst", "cn", "rmst", "rsmt"]}
+
+
+def bundlePath(path):
+    """
+    Parameters
+    ----------
+    path : str
+        Path to a text output, e.g. 'CellCoord.out'.
+    """
+    return os.path.splitext(path)[0] + BUNDLE_SUFFIX
+
+
+def packNames(names):
+    """
+    Store a list of str as a blob of '\n'-terminated names.
+    """
+    return np.frombuffer(''.join(name + '\n' for name in names).encode(), dtype=np.uint8)
+
+
+def unpackNames(blob):
+    return blob.tobytes().decode().split('\n')[:-1]
+
+
+def _lines(path, header=False):
+    with open(path, 'r') as f:
+        lines = f.read().splitlines()
+    return lines[1:] if header else lines
+
+
+def _parseCellCoord(path):
+    """
+    <net name>,<gate name>,<gate x>, <gate y>
+    """
+    rows = [line.split(',') for line in _lines(path)]
+    return {"net": [row[0] for row in rows],
+            "cell": [row[1] for row in rows],
+            "x": np.array([float(row[2]) for row in rows], dtype=np.float64),
+            "y": np.array([float(row[3]) for row in rows], dtype=np.float64)}
+
+
+def _parseWLnets(path):
+    """
+    <net name> <number of gates and pins> <length>, after a header.
+    """
+    rows = [line.split(' ') for line in _lines(path, header=True)]
+    return {"net": [row[0] for row in rows],
+            "pins": np.array([int(row[1]) for row in rows], dtype=np.int64),
+            "length": np.array([float(row[2]) for row in rows], dtype=np.float64)}
+
+
+def _parseCellSizes(path):
+    """
+    <gate name> <width> <height>, after a header.
+    """
+    rows = [line.split(' ') for line in _lines(path, header=True)]
+    return {"cell": [row[0] for row in rows],
+            "width": np.array([float(row[1]) for row in rows], dtype=np.float64),
+            "height": np.array([float(row[2]) for row in rows], dtype=np.float64)}
+
+
+def _parseHpl(path):
+    """
+    <net name> <HPL> <bounding box x1> <y1> <x2> <y2>
+    """
+    rows = [line.split() for line in _lines(path)]
+    return {"net": [row[0] for row in rows],
+            "hpl": np.array([float(row[1]) for row in rows], dtype=np.float64),
+            "bb": np.array([[float(v) for v in row[2:6]] for row in rows], dtype=np.float64).reshape(-1, 4)}
+
+
+def _parseClustersInstances(path):
+    """
+    <cluster ID> <gate name> <gate name> ...
+    """
+    clusters = []
+    ptr = [0]
+    cells = []
+    for line in _lines(path):
+        split = line.split(' ')
+        clusters.append(int(split[0]))
+        cells.extend(split[1:])
+        ptr.append(len(cells))
+    return {"cluster": np.array(clusters, dtype=np.int64),
+            "ptr": np.array(ptr, dtype=np.int64),
+            "cell": cells}
+
+
+def _parseWLnetsModels(path):
+    """
+    <net name> <number of gates and pins> <routed length> <length of each model>, after a header naming the columns.
+    """
+    lines = _lines(path)
+    models = [name.lower() for name in lines[0].split(' ')[2:]]
+    rows = [line.split(' ') for line in lines[1:]]
+    columns = {"net": [row[0] for row in rows],
+               "pins": np.array([int(row[1]) for row in rows], dtype=np.int64)}
+    for i, model in enumerate(models, 2):
+        columns[model] = np.array([float(row[i]) for row in rows], dtype=np.float64)
+    return columns
+
+
+PARSERS = {"CellCoord.out": _parseCellCoord,
+           "WLnets.out": _parseWLnets,
+           "CellSizes.out": _parseCellSizes,
+           "hpl.out": _parseHpl,
+           "ClustersInstances.out": _parseClustersInstances,
+           "WLnets_models.out": _parseWLnetsModels}
+
+
+def save(path, columns):
+    """
+    Parameters
+    ----------
+    path : str
+        Bundle path, see bundlePath().
+    columns : dict
+        {column : list of str or np.ndarray}
+    """
+    arrays = dict()
+    for key, values in columns.items():
+        if isinstance(values, list):
+            arrays["names_" + key] = packNames(values)
+        else:
+            arrays[key] = values
+    np.savez(path, **arrays)
+
+
+def load(path):
+    """
+    Columns stored in a bundle, see save().
+    """
+    columns = dict()
+    with np.load(path) as data:
+        for key in data.files:
+            if key.startswith("names_"):
+                columns[key[len("names_"):]] = unpackNames(data[key])
+            else:
+                columns[key] = data[key]
+    return columns
+
+
+def outputKind(path, kind=None):
+    """
+    Output of COLUMNS a text output is: kind if given, otherwise its file name,
+    or the longest output name it ends with, e.g. 'WLnets.out' for 'ldpc_WLnets.out'.
+
+    Parameters
+    ----------
+    path : str
+        Path to a text output.
+    kind : str
+        One of COLUMNS, e.g. 'WLnets.out'.
+
+    Returns
+    -------
+    str
+        One of COLUMNS.
+
+    Raises
+    ------
+    ValueError
+        If kind is not one of COLUMNS, or if it is not given and the file name matches none of them.
+    """
+    if kind is None:
+        fname = os.path.basename(path)
+        matches = [name for name in COLUMNS if fname.endswith(name)]
+        if not matches:
+            raise ValueError("Unknown output '{}': its name should end with one of {}, or give its kind".format(path, ", ".join(COLUMNS)))
+        kind = max(matches, key=len)
+    elif kind not in COLUMNS:
+        raise ValueError("Unknown output kind '{}', should be one of {}".format(kind, ", ".join(COLUMNS)))
+    return kind
+
+
+def parse(path, kind=None):
+    """
+    Columns of a text output, parsed from the text.
+
+    Parameters
+    ----------
+    path : str
+        Path to a text output.
+    kind : str
+        One of COLUMNS, guessed from the file name if not given, see outputKind().
+    """
+    return PARSERS[outputKind(path, kind)](path)
+
+
+def convert(path, kind=None):
+    """
+    Bundle a text output.
+
+    Parameters
+    ----------
+    path : str
+        Path to a text output.
+    kind : str
+        See parse().
+
+    Returns
+    -------
+    dict
+        Columns of the output.
+    """
+    columns = parse(path, kind)
+    save(bundlePath(path), columns)
+    logger.debug("Bundled {} into {}".format(path, bundlePath(path)))
+    return columns
+
+
+def read(path, kind=None):
+    """
+    Columns of a text output, loaded from its bundle if it is at least as
+    recent as the text, parsed from the text otherwise.
+
+    Parameters
+    ----------
+    path : str
+        Path to a text output.
+        The text may be missing if the bundle is there.
+    kind : str
+        See parse(). Checked even when the bundle is loaded.
+
+    Returns
+    -------
+    dict
+        {column : list of str or np.ndarray}, see COLUMNS.
+    """
+    kind = outputKind(path, kind)
+    bundle = bundlePath(path)
+    if os.path.isfile(bundle) and (not os.path.isfile(path) or os.path.getmtime(bundle) >= os.path.getmtime(path)):
+        return load(bundle)
+    return parse(path, kind)
+
+
+def bundleOutputs(dirName="."):
+    """
+    Bundle all the outputs of COLUMNS found in dirName.
+    """
+    for fname in COLUMNS:
+        path = os.path.join(dirName, fname)
+        if os.path.isfile(path):
+            convert(path)
+
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+    for rootDir in args["<dir>"]:
+        for dirName, subDirs, files in os.walk(rootDir):
+            bundleOutputs(dirName)
+            print("Bundled the outputs of {}".format(dirName))
@@ -0,0 +1,293 @@
+"""
+On-disk cache of a parsed design.
+
+Parsing a large DEF takes minutes, while most runs only change the clustering
+method or target. Once parsed, the gates, pins and nets of a Design are stored
+column-wise in a NumPy '.npz' file, next to the DEF:
+    <DEF>.<wirelength model>.design.npz
+The connections of the nets are stored in CSR form: the connections of the
+i-th net are connName[connPtr[i]:connPtr[i+1]], the same goes for their metal
+layers with layerPtr.
+
+The cache is keyed on the path, size, modification time and SHA-1 of the DEF,
+on UNITS_DISTANCE_MICRONS, on the LEF tech (for the cells dimensions) and on
+the wirelength model. It is discarded and rebuilt as soon as one of them
+changes.
+
+The files written while parsing (see PARSE_OUTPUTS) are stored as well, so
+that a run loaded from the cache has the same outputs as a full run.
+"""
+
+import hashlib
+import logging
+import os
+import numpy as np
+from design_bundle import packNames, unpackNames
+from Classes.Gate import *
+from Classes.Net import *
+from Classes.Pin import *
+
+logger = logging.getLogger('default')
+
+CACHE_VERSION = 3
+CACHE_SUFFIX = ".design.npz"
+
+# Files written by def_parser.Design.parseDef() in the working directory.
+PARSE_OUTPUTS = ["CellSizes.out", "InstancesPerNet.out", "Nets.out", "WLnets.out",
+                 "CellCoord.out", "pinCoord.out", "pinCells.out", "uBumps.out"]
+
+
+def cachePath(deffile, wlModel):
+    """
+    Parameters
+    ----------
+    deffile : str
+    wlModel : str
+        Wirelength model, e.g. 'routed' or 'manhattan'.
+    """
+    return "{}.{}{}".format(deffile, wlModel, CACHE_SUFFIX)
+
+
+def cacheKey(deffile, mm, udm, tech, wlModel):
+    """
+    Build the key identifying a parsed design.
+
+    Parameters
+    ----------
+    deffile : str
+    mm : mmap.mmap
+        Memory map of deffile, see def_index.openDef().
+    udm : int
+        UNITS_DISTANCE_MICRONS
+    tech : str
+        LEF tech.
+    wlModel : str
+
+    Returns
+    -------
+    dict
+    """
+    stat = os.stat(deffile)
+    return {"version": CACHE_VERSION,
+            "deffile": os.path.abspath(deffile),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": hashlib.sha1(mm).hexdigest(),
+            "udm": udm,
+            "tech": tech,
+            "wlModel": wlModel}
+
+
+def _packNumbers(values):
+    """
+    Store a list of int and float as float64, along with a mask of the ints,
+    so that they are printed the same way once loaded back.
+    """
+    return np.array(values, dtype=np.float64), np.array([isinstance(v, (int, np.integer)) for v in values], dtype=bool)
+
+
+def _unpackNumbers(values, isInt):
+    return [int(v) if i else v for v, i in zip(values.tolist(), isInt.tolist())]
+
+
+def _table(values):
+    """
+    Intern a list of str.
+
+    Returns
+    -------
+    tuple
+        (list of the distinct values, np.int32 array of the position of each value in that list)
+    """
+    ids = dict()
+    codes = np.array([ids.setdefault(v, len(ids)) for v in values], dtype=np.int32)
+    return list(ids), codes
+
+
+def save(design, key, path):
+    """
+    Store the gates, pins and nets of design, as well as the PARSE_OUTPUTS
+    files found in the working directory.
+
+    Parameters
+    ----------
+    design : def_parser.Design
+        Freshly parsed with Design.parseDef().
+    key : dict
+        See cacheKey().
+    path : str
+    """
+    arrays = {"key_" + k: v for k, v in key.items()}
+
+    arrays["width"], arrays["height"] = design.width, design.height
+    arrays["area"], arrays["gatesArea"] = design.area, design.gatesArea
+    arrays["totalWireLength"] = design.totalWireLength
+    arrays["metalLayers"] = packNames(design.metalLayers)
+
+    gates = list(design.gates.values())
+    arrays["gateNames"] = packNames([g.name for g in gates])
+    for attr in ["x", "y", "width", "height"]:
+        arrays["gate_" + attr], arrays["gate_" + attr + "_int"] = _packNumbers([getattr(g, attr) for g in gates])
+    stdCells, arrays["gateStdCell"] = _table([g.stdCell for g in gates])
+    arrays["stdCellNames"] = packNames(stdCells)
+    orientations, arrays["gateOrientation"] = _table([g.orientation for g in gates])
+    arrays["orientationNames"] = packNames(orientations)
+    arrays["gateIsMemory"] = np.array([g.isMemory for g in gates], dtype=bool)
+
+    pins = list(design.pins.values())
+    arrays["pinNames"] = packNames([p.name for p in pins])
+    for attr in ["x", "y", "approximatedAdditionalLength"]:
+        arrays["pin_" + attr], arrays["pin_" + attr + "_int"] = _packNumbers([getattr(p, attr) for p in pins])
+    arrays["pinPlaced"] = np.array([p.placed for p in pins], dtype=bool)
+    # The net of a pin may not be part of the design, see detachedNets in load().
+    arrays["pinNet"] = packNames([p.net.name if p.net else "" for p in pins])
+
+    nets = list(design.nets.values())
+    gateIDs = {g.name: i for i, g in enumerate(gates)}
+    pinIDs = {p.name: i for i, p in enumerate(pins)}
+    arrays["netNames"] = packNames([n.name for n in nets])
+    arrays["netWl"], arrays["netWl_int"] = _packNumbers([n.wl for n in nets])
+    arrays["netIsRouted"] = np.array([n.isRouted for n in nets], dtype=np.int8)
+    connPtr = [0]
+    connName = []
+    connIsPin = []
+    gatePinNames = []
+    layerPtr = [0]
+    layerNames = []
+    for net in nets:
+        for name, gatePin in net.gatePins.items():
+            isPin = gatePin == "PIN"
+            connIsPin.append(isPin)
+            connName.append(pinIDs[name] if isPin else gateIDs[name])
+            gatePinNames.append(gatePin)
+        connPtr.append(len(connName))
+        layerNames.extend(net.metalLayers)
+        layerPtr.append(len(layerNames))
+    arrays["connPtr"] = np.array(connPtr, dtype=np.int64)
+    arrays["connName"] = np.array(connName, dtype=np.int32)
+    arrays["connIsPin"] = np.array(connIsPin, dtype=bool)
+    gatePinTable, arrays["connGatePin"] = _table(gatePinNames)
+    arrays["gatePinNames"] = packNames(gatePinTable)
+    arrays["layerPtr"] = np.array(layerPtr, dtype=np.int64)
+    layerTable, arrays["netLayer"] = _table(layerNames)
+    arrays["layerNames"] = packNames(layerTable)
+
+    for i, fname in enumerate(PARSE_OUTPUTS):
+        if os.path.isfile(fname):
+            with open(fname, 'rb') as f:
+                arrays["output_{}".format(i)] = np.frombuffer(f.read(), dtype=np.uint8)
+
+    np.savez(path, **arrays)
+    logger.info("Design cached in {}".format(path))
+
+
+def load(design, key, path):
+    """
+    Fill design from the cache, and write back the PARSE_OUTPUTS files
+    in the working directory.
+
+    Parameters
+    ----------
+    design : def_parser.Design
+        Empty design.
+    key : dict
+        See cacheKey().
+    path : str
+
+    Returns
+    -------
+    bool
+        False if there is no cache or if its key differs, design is then left untouched.
+    """
+    if not os.path.isfile(path):
+        return False
+    with np.load(path) as data:
+        for k, v in key.items():
+            if "key_" + k not in data or data["key_" + k].item() != v:
+                logger.info("Design cache {} is outdated ({} changed)".format(path, k))
+                return False
+
+        design.width, design.height = data["width"].item(), data["height"].item()
+        design.area, design.gatesArea = data["area"].item(), data["gatesArea"].item()
+        design.totalWireLength = data["totalWireLength"].item()
+        design.metalLayers = set(unpackNames(data["metalLayers"]))
+
+        gateNames = unpackNames(data["gateNames"])
+        gateAttrs = {attr: _unpackNumbers(data["gate_" + attr], data["gate_" + attr + "_int"]) for attr in ["x", "y", "width", "height"]}
+        stdCells = unpackNames(data["stdCellNames"])
+        orientations = unpackNames(data["orientationNames"])
+        gateStdCell = data["gateStdCell"].tolist()
+        gateOrientation = data["gateOrientation"].tolist()
+        gateIsMemory = data["gateIsMemory"].tolist()
+        gates = []
+        for i, name in enumerate(gateNames):
+            gate = Gate(name)
+            gate.setX(gateAttrs["x"][i])
+            gate.setY(gateAttrs["y"][i])
+            gate.setWidth(gateAttrs["width"][i])
+            gate.setHeight(gateAttrs["height"][i])
+            gate.setStdCell(stdCells[gateStdCell[i]])
+            gate.orientation = orientations[gateOrientation[i]]
+            gate.isMemory = gateIsMemory[i]
+            design.addGate(gate)
+            gates.append(gate)
+
+        pinNames = unpackNames(data["pinNames"])
+        pinAttrs = {attr: _unpackNumbers(data["pin_" + attr], data["pin_" + attr + "_int"]) for attr in ["x", "y", "approximatedAdditionalLength"]}
+        pinPlaced = data["pinPlaced"].tolist()
+        pins = []
+        for i, name in enumerate(pinNames):
+            pin = Pin(name)
+            pin.setX(pinAttrs["x"][i])
+            pin.setY(pinAttrs["y"][i])
+            pin.approximatedAdditionalLength = pinAttrs["approximatedAdditionalLength"][i]
+            pin.placed = pinPlaced[i]
+            design.addPin(pin)
+            pins.append(pin)
+
+        netNames = unpackNames(data["netNames"])
+        netWl = _unpackNumbers(data["netWl"], data["netWl_int"])
+        netIsRouted = data["netIsRouted"].tolist()
+        connPtr = data["connPtr"].tolist()
+        connName = data["connName"].tolist()
+        connIsPin = data["connIsPin"].tolist()
+        gatePinTable = unpackNames(data["gatePinNames"])
+        connGatePin = data["connGatePin"].tolist()
+        layerPtr = data["layerPtr"].tolist()
+        layerTable = unpackNames(data["layerNames"])
+        netLayer = data["netLayer"].tolist()
+        for i, name in enumerate(netNames):
+            net = Net(name)
+            for c in range(connPtr[i], connPtr[i+1]):
+                if connIsPin[c]:
+                    pin = pins[connName[c]]
+                    net.addPin(pin)
+                    pin.net = net
+                    net.gatePins[pin.name] = "PIN"
+                else:
+                    gate = gates[connName[c]]
+                    net.addGate(gate)
+                    gate.addNet(net)
+                    net.gatePins[gate.name] = gatePinTable[connGatePin[c]]
+            net.metalLayers = set(layerTable[l] for l in netLayer[layerPtr[i]:layerPtr[i+1]])
+            net.isRouted = netIsRouted[i]
+            net.setLength(netWl[i])
+            design.addNet(net)
+
+        # Nets left out of the design because all their pins were not placed,
+        # still referenced by their pins.
+        detachedNets = dict()
+        for pin, netName in zip(pins, unpackNames(data["pinNet"])):
+            if netName and pin.net is None:
+                net = detachedNets.setdefault(netName, Net(netName))
+                net.addPin(pin)
+                pin.net = net
+                net.gatePins[pin.name] = "PIN"
+
+        for i, fname in enumerate(PARSE_OUTPUTS):
+            if "output_{}".format(i) in data:
+                with open(fname, 'wb') as f:
+                    f.write(data["output_{}".format(i)].tobytes())
+
+    logger.info("Design loaded from {}: {} gates, {} pins, {} nets".format(path, len(design.gates), len(design.pins), len(design.nets)))
+    return True
@@ -18,6 +18,7 @@ import os
 import matplotlib.pyplot as plt
 import datetime
 from alive_progress import alive_bar
+import design_bundle
 
 WLNETS_F = "WLnets.out"
 WLNETSSEGMENTS_F = "WLnets_segments.out"
@@ -36,16 +37,13 @@ if __name__ == "__main__":
     netSegLen = dict() # {net name : [segment len]}
     dispersions = list()
 
-    with open(os.path.join(dirName, WLNETS_F), 'r') as f:
-        lines = f.readlines()
+    columns = design_bundle.read(os.path.join(dirName, WLNETS_F))
 
     print("Reading {}".format(WLNETS_F))
-    with alive_bar(len(lines)-1) as bar:
-        for line in lines[1:]:
-            net = line.split()[0]
-            fanout = int(line.split()[1])
+    with alive_bar(len(columns["net"])) as bar:
+        for net, fanout, length in zip(columns["net"], columns["pins"].tolist(), columns["length"].tolist()):
             if fanout > 1:
-                netWL[line.split()[0]] = float(line.split()[2])
+                netWL[net] = length
             bar()
 
     with open(os.path.join(dirName, WLNETSSEGMENTS_F), 'r') as f:
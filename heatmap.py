@@ -29,6 +29,7 @@ import matplotlib.colors as mcolors
 import statistics
 import math
 from alive_progress import alive_bar
+import design_bundle
 try:
     locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
 except locale.Error:
@@ -59,21 +60,17 @@ def loadDesign(display3DPins):
     cells = {} # {cell name: [x,y,width, height]}
     maxX = 0
     maxY = 0
-    with open("CellCoord.out", 'r') as f:
-        lines = f.readlines()
-
-        for line in lines:
-            cells[line.split(',')[1]] = [float(line.split(',')[2]), float(line.split(',')[3])]
-    with open("CellSizes.out", 'r') as f:
-        lines = f.readlines()
-        for line in lines[1:]:
-            cellName = line.split(' ')[0]
-            if cellName in cells:
-                # Continue only if the cellName has a coordinate in the cells dictionary.
-                # It might happen that is does not, such as 3D bump in 3D ICs.
-                cells[cellName].extend([cells[cellName][0] + float(line.split(' ')[1]), cells[cellName][1] + float(line.split(' ')[2])])
-                maxX = max(maxX, cells[cellName][2])
-                maxY = max(maxY, cells[cellName][3])
+    columns = design_bundle.read("CellCoord.out")
+    for cellName, x, y in zip(columns["cell"], columns["x"].tolist(), columns["y"].tolist()):
+        cells[cellName] = [x, y]
+    columns = design_bundle.read("CellSizes.out")
+    for cellName, width, height in zip(columns["cell"], columns["width"].tolist(), columns["height"].tolist()):
+        if cellName in cells:
+            # Continue only if the cellName has a coordinate in the cells dictionary.
+            # It might happen that is does not, such as 3D bump in 3D ICs.
+            cells[cellName].extend([cells[cellName][0] + width, cells[cellName][1] + height])
+            maxX = max(maxX, cells[cellName][2])
+            maxY = max(maxY, cells[cellName][3])
 
     pins = []
     if display3DPins:
@@ -166,20 +163,19 @@ def colorizeClusters(clustDir, cells, dimension=1000):
 
     data = np.zeros(shape=(imgW+2,imgH+2))
 
-    with open(os.path.join(clustDir,"ClustersInstances.out"), 'r') as f:
-        lines = f.readlines()
-        for clusterID, line in enumerate(lines):
-            line = line.strip()
-            for cellName in line.split(' ')[1:]:
-                coordinates = cells[cellName]
-                xl = math.floor(coordinates[0] * imgW / maxX)
-                xu = math.ceil(coordinates[2] * imgW / maxX)
-                yl = math.floor(coordinates[1] * imgH / maxY)
-                yu = math.ceil(coordinates[3] * imgH / maxY)
-
-                for i in range(xl, xu+1):
-                    for j in range(yl, yu+1):
-                        data[i,j] = clusterID + 1 # +1 because I want the value 0 to still mean "there is nothing there"
+    columns = design_bundle.read(os.path.join(clustDir,"ClustersInstances.out"))
+    ptr = columns["ptr"].tolist()
+    for clusterID in range(len(ptr) - 1):
+        for cellName in columns["cell"][ptr[clusterID]:ptr[clusterID+1]]:
+            coordinates = cells[cellName]
+            xl = math.floor(coordinates[0] * imgW / maxX)
+            xu = math.ceil(coordinates[2] * imgW / maxX)
+            yl = math.floor(coordinates[1] * imgH / maxY)
+            yu = math.ceil(coordinates[3] * imgH / maxY)
+
+            for i in range(xl, xu+1):
+                for j in range(yl, yu+1):
+                    data[i,j] = clusterID + 1 # +1 because I want the value 0 to still mean "there is nothing there"
 
     x, y = np.mgrid[0:imgW+2:1, 0:imgH+2:1]
 
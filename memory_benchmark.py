@@ -0,0 +1,130 @@
+"""
+Memory footprint of a synthetic design, held as Gate/Net/Pin objects with
+and without __slots__, and as a DesignStore (see def_parser.py --compact).
+
+The design is built in memory, without DEF: gates placed at random,
+nets connecting a driver to a few random gates, a few of them to a pin as well.
+
+Usage:
+    memory_benchmark.py     [--gates=<N>] [--fanout=<F>] [--seed=<seed>]
+    memory_benchmark.py     --help
+
+Options:
+    --gates=<N>     Number of gates [default: 1000000]
+    --fanout=<F>    Maximum number of gates driven by each net [default: 4]
+    --seed=<seed>   RNG seed [default: 0]
+    -h --help       Print this help
+"""
+from docopt import docopt
+import gc
+import random
+import time
+import tracemalloc
+from Classes.DesignStore import *
+from Classes.Gate import *
+from Classes.Net import *
+from Classes.Pin import *
+
+STDCELLS = ["INV", "NAND2", "NOR2", "AOI21", "DFF", "BUF"]
+GATE_PINS = ["A", "B", "C", "D", "Z"]
+ORIENTATIONS = ["N", "S", "FN", "FS"]
+
+
+def unslotted(cls):
+    """
+    Copy of a slotted class without __slots__, each instance keeping its
+    attributes in a __dict__ as before. The SideTable fields are kept.
+
+    A mere subclass would not do: the slots of its parent would still hold
+    the attributes, leaving the __dict__ empty.
+    """
+    namespace = {k: v for k, v in vars(cls).items() if k != "__slots__" and k not in cls.__slots__}
+    return type("Unslotted" + cls.__name__, (), namespace)
+
+
+def buildDesign(gateCount, maxFanout, gateClass=Gate, netClass=Net, pinClass=Pin):
+    """
+    Parameters
+    ----------
+    gateCount : int
+    maxFanout : int
+    gateClass, netClass, pinClass : type
+        Classes of the objects built, see unslotted().
+
+    Returns
+    -------
+    tuple
+        ({name : Gate}, {name : Pin}, {name : Net})
+    """
+    gates = dict()
+    for i in range(gateCount):
+        gate = gateClass("g{}".format(i))
+        gate.setX(random.random() * 1000)
+        gate.setY(random.random() * 1000)
+        gate.setWidth(0.4)
+        gate.setHeight(0.6)
+        gate.setStdCell(random.choice(STDCELLS))
+        gate.orientation = random.choice(ORIENTATIONS)
+        gates[gate.name] = gate
+
+    pins = dict()
+    nets = dict()
+    gateList = list(gates.values())
+    for i, driver in enumerate(gateList):
+        net = netClass("n{}".format(i))
+        for gate in [driver] + random.sample(gateList, random.randint(1, maxFanout)):
+            net.addGate(gate)
+            gate.addNet(net)
+            net.gatePins[gate.name] = random.choice(GATE_PINS)
+        if i % 1000 == 0:
+            pin = pinClass("p{}".format(i // 1000))
+            pin.setX(0)
+            pin.setY(random.random() * 1000)
+            pin.net = net
+            pins[pin.name] = pin
+            net.addPin(pin)
+            net.gatePins[pin.name] = "PIN"
+        net.metalLayers = set(random.sample(["M1", "M2", "M3", "M4"], 2))
+        net.isRouted = 1
+        net.setLength(random.random() * 100)
+        nets[net.name] = net
+    return gates, pins, nets
+
+
+def traced():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+    gateCount = int(args["--gates"])
+    maxFanout = int(args["--fanout"])
+    seed = int(args["--seed"])
+
+    tracemalloc.start()
+    base = traced()
+
+    # The same design is built each time.
+    random.seed(seed)
+    start = time.time()
+    gates, pins, nets = buildDesign(gateCount, maxFanout, unslotted(Gate), unslotted(Net), unslotted(Pin))
+    unslottedMemory = traced() - base
+    print("Unslotted:   {:>8.1f} MiB, {:>6.0f} B/gate (built in {:.1f}s)".format(unslottedMemory / 2**20, unslottedMemory / gateCount, time.time() - start))
+    del gates, pins, nets
+
+    random.seed(seed)
+    start = time.time()
+    gates, pins, nets = buildDesign(gateCount, maxFanout)
+    objectsMemory = traced() - base
+    print("Objects:     {:>8.1f} MiB, {:>6.0f} B/gate (built in {:.1f}s)".format(objectsMemory / 2**20, objectsMemory / gateCount, time.time() - start))
+
+    start = time.time()
+    store = DesignStore(gates, pins, nets)
+    del gates, pins, nets
+    gates, pins, nets = store.views()
+    compactMemory = traced() - base
+    print("DesignStore: {:>8.1f} MiB, {:>6.0f} B/gate (built in {:.1f}s)".format(compactMemory / 2**20, compactMemory / gateCount, time.time() - start))
+
+    print("Saved by __slots__:   {:>6.0f} B/gate ({:.0%})".format((unslottedMemory - objectsMemory) / gateCount, 1 - objectsMemory / unslottedMemory))
+    print("Saved by DesignStore: {:>6.0f} B/gate ({:.0%})".format((unslottedMemory - compactMemory) / gateCount, 1 - compactMemory / unslottedMemory))
@@ -0,0 +1,72 @@
+"""
+Ranking of the nets by length, shared by def_parser.py and the analysis scripts.
+
+The nets are ranked with a stable NumPy argsort: nets of the same length keep
+the order in which they were given.
+"""
+
+import numpy as np
+
+
+def rank(lengths):
+    """
+    Parameters
+    ----------
+    lengths : list of float
+        Length of each net.
+
+    Returns
+    -------
+    tuple
+        (order, cumulated), np.ndarray: indices of the nets sorted by
+        increasing length, and the cumulated length along that order.
+    """
+    lengths = np.asarray(lengths, dtype=np.float64)
+    order = np.argsort(lengths, kind='stable')
+    return order, np.cumsum(lengths[order])
+
+
+def sortByLength(lengths, names):
+    """
+    Parameters
+    ----------
+    lengths : list of float
+    names : list of str
+        Name of each net, same order as lengths.
+
+    Returns
+    -------
+    tuple
+        (lengths, names), lists sorted by increasing length.
+    """
+    order = rank(lengths)[0].tolist()
+    return [lengths[i] for i in order], [names[i] for i in order]
+
+
+def writeRanking(path, lengths, names):
+    """
+    Write the nets sorted by increasing length, along with the cumulated
+    length and the percentage of nets so far:
+    <net name> <length> <cumulated length> <% of nets>, after a header.
+
+    The numbers are written as str() would, the cumulated length being an
+    int as long as all the lengths so far are.
+
+    Parameters
+    ----------
+    path : str
+    lengths : list of float
+    names : list of str
+        Name of each net, same order as lengths.
+    """
+    order, cumulated = rank(lengths)
+    order = order.tolist()
+    sortedLengths = [lengths[i] for i in order]
+    # Length of the prefix of int lengths, cumulated as an int.
+    intPrefix = next((i for i, wl in enumerate(sortedLengths) if not isinstance(wl, int)), len(sortedLengths))
+    cumulatedStr = list(map(str, cumulated[:intPrefix].astype(np.int64).tolist())) + list(map(str, cumulated[intPrefix:].tolist()))
+    percentStr = map(str, (np.arange(1, len(order) + 1) * 100 / max(len(order), 1)).tolist())
+    with open(path, 'w') as f:
+        f.write("Net_name net_wire_length cumulated_wire_length %_of_nets\n")
+        if order:
+            f.write("\n".join(map(" ".join, zip([names[i] for i in order], map(str, sortedLengths), cumulatedStr, percentStr))) + "\n")
@@ -21,6 +21,7 @@ from docopt import docopt
 import glob
 from natsort import natsorted
 import numpy as np
+import design_bundle
 
 # CLUSTER_FILE = "/home/para/dev/def_parser/2021-11-23_09-10-28_boomcore-2020-pp-bl_kmeans-geometric/BoomCore_PlacedNoBuff_kmeans-geometric_10000/ClustersInstances.out"
 # CLUSTER_FILE = "/home/para/dev/def_parser/2021-11-23_09-10-28_boomcore-2020-pp-bl_kmeans-geometric/BoomCore_PlacedNoBuff_kmeans-geometric_2/ClustersInstances.out"
@@ -31,30 +32,27 @@ MAX_PROCESSES = 6
 
 
 def initialise(clusterFile, cells, clustersCentroids, cellCluster, clusterCells, clusters):
-    with open(CELL_FILE, 'r') as f:
-        lines = f.readlines()
+    columns = design_bundle.read(CELL_FILE)
 
-    with alive_bar(len(lines)) as bar:
+    with alive_bar(len(columns["cell"])) as bar:
         print("Extracting cells")
-        for line in lines:
+        for cell, x, y in zip(columns["cell"], columns["x"].tolist(), columns["y"].tolist()):
             bar()
-            cells[line.split(',')[1]] = [float(line.split(',')[2]),float(line.split(',')[3])]
+            cells[cell] = [x, y]
     print("Total cells: {}".format(len(cells)))
 
-    with open(clusterFile+"/ClustersInstances.out", 'r') as f:
-        lines = f.readlines()
+    columns = design_bundle.read(clusterFile+"/ClustersInstances.out")
+    ptr = columns["ptr"].tolist()
 
-    with alive_bar(len(lines)) as bar:
+    with alive_bar(len(columns["cluster"])) as bar:
         print("Extracting clusters")
-        for line in lines:
+        for i, clusterID in enumerate(columns["cluster"].tolist()):
             bar()
-            line = line.strip()
-            if len(line.split(' ')) > 1:
+            if ptr[i+1] > ptr[i]:
                 # Ignore empty clusters
-                clusterID = int(line.split(' ')[0])
                 clusters[clusterID] = list()
                 clusterCells[clusterID] = list()
-                for cell in line.split(' ')[1:]:
+                for cell in columns["cell"][ptr[i]:ptr[i+1]]:
                     clusters[clusterID].append(cells[cell])
                     cellCluster[cell] = clusterID
                     clusterCells[clusterID].append(cell)
@@ -0,0 +1,25 @@
+import pytest
+
+import design_bundle
+
+
+WLNETS = "NET NUM_PINS LENGTH\nn0 2 1.5\nn1 3 4.25\n"
+
+
+def test_readRenamed(tmp_path):
+    # The output is found from the end of its name, or given explicitly.
+    for fname, kind in [("WLnets.out", None), ("ldpc_WLnets.out", None), ("lengths.txt", "WLnets.out")]:
+        path = tmp_path / fname
+        path.write_text(WLNETS)
+        columns = design_bundle.read(str(path), kind=kind)
+        assert columns["net"] == ["n0", "n1"]
+        assert columns["length"].tolist() == [1.5, 4.25]
+
+
+def test_readUnknown(tmp_path):
+    path = tmp_path / "lengths.txt"
+    path.write_text(WLNETS)
+    with pytest.raises(ValueError, match="lengths.txt"):
+        design_bundle.read(str(path))
+    with pytest.raises(ValueError, match="WLnets"):
+        design_bundle.read(str(path), kind="WLnets")
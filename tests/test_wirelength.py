@@ -0,0 +1,262 @@
+"""
+Estimators of wirelength.py against the code they replaced.
+
+The Manhattan estimator is checked against a copy of the triple loop extractNets
+used for --manhattanwl, run on random gates with multi-port pins and all the
+regular orientations.
+"""
+
+import locale
+import math
+import random
+
+import pytest
+
+import wirelength
+from Classes.Gate import Gate
+from Classes.GatePin import GatePin
+from Classes.Net import Net
+from Classes.Pin import Pin
+from Classes.Port import Port
+from Classes.StdCell import StdCell
+
+try:
+    import def_parser
+except locale.Error:
+    def_parser = None
+
+requiresDefParser = pytest.mark.skipif(def_parser is None, reason="def_parser needs the en_US.UTF-8 or en_GB.UTF-8 locale")
+
+
+def legacyManhattan(gates, pins, macros, net, overwrite=False):
+    """
+    Length of the net as extractNets computed it with --manhattanwl before wirelength.py,
+    with two fixes: the y distance to a port is taken on y instead of x, and the gate
+    being connected is no longer replaced by the last gate compared to it. With
+    overwrite=True, the second fix is reverted: the ports of the gate after its first
+    one are then placed on the last gate of the net.
+    """
+    netLength = 0
+    cellsToConnect = list(net.gatePins.keys())
+    # Typically want to avoid an unconnected wire or pin on a cell
+    if len(cellsToConnect) > 1:
+
+        cellsInNet = list(net.gatePins.keys())
+        while len(cellsToConnect) > 0:
+            minDist = float('inf')
+            closestCell = ""
+            # Name of the gate (or pin) we want to connect
+            gateNameToConnect = cellsToConnect[-1]
+
+            # If it's actually a Pin, there is no port or whatnot
+            if net.gatePins[gateNameToConnect] == "PIN":
+                gateToConnectX = pins[gateNameToConnect].x
+                gateToConnectY = pins[gateNameToConnect].y
+
+                # Compare the pin to all other cells in the net
+                for gateName in cellsInNet:
+                    # Do not compare the pin to itself
+                    if gateName != gateNameToConnect:
+                        if net.gatePins[gateName] == "PIN":
+                            dist = abs(gateToConnectX - pins[gateName].x) + abs(gateToConnectY - pins[gateName].y)
+                        else:
+                            # Intermediate vars to get the coordinates of the port
+                            gate = gates[gateName]
+                            stdCellName = gate.stdCell
+                            gatePin = macros[stdCellName].pins[net.gatePins[gateName]]
+                            for port in gatePin.ports:
+                                portCoordinates = gate.absoluteCoordinate(port.center)
+                                dist = abs(gateToConnectX - portCoordinates[0]) + abs(gateToConnectY - portCoordinates[1])
+                                if dist < minDist:
+                                    minDist = dist
+                                    closestCell = gateName
+                        if dist < minDist:
+                            minDist = dist
+                            closestCell = gateName
+            else:
+                # Intermediate vars to get the coordinates of the port
+                gate = gates[gateNameToConnect]
+                stdCellName = gate.stdCell
+                gatePin = macros[stdCellName].pins[net.gatePins[gateNameToConnect]]
+                for port in gatePin.ports:
+                    portCoordinates = gate.absoluteCoordinate(port.center)
+                    gateToConnectX = portCoordinates[0]
+                    gateToConnectY = portCoordinates[1]
+
+                    # Compare the pin to all other cells in the net
+                    for gateName in cellsInNet:
+                        # Do not compare the pin to itself
+                        if gateName != gateNameToConnect:
+                            if net.gatePins[gateName] == "PIN":
+                                dist = abs(gateToConnectX - pins[gateName].x) + abs(gateToConnectY - pins[gateName].y)
+                            else:
+                                # Intermediate vars to get the coordinates of the port
+                                otherGate = gates[gateName]
+                                stdCellName = otherGate.stdCell
+                                otherGatePin = macros[stdCellName].pins[net.gatePins[gateName]]
+                                if overwrite:
+                                    gate = otherGate
+                                for otherPort in otherGatePin.ports:
+                                    portCoordinates = otherGate.absoluteCoordinate(otherPort.center)
+                                    dist = abs(gateToConnectX - portCoordinates[0]) + abs(gateToConnectY - portCoordinates[1])
+                                    if dist < minDist:
+                                        minDist = dist
+                                        closestCell = gateName
+                            if dist < minDist:
+                                minDist = dist
+                                closestCell = gateName
+
+            netLength += minDist
+            cellsToConnect.pop()
+            if closestCell in cellsToConnect:
+                cellsToConnect.remove(closestCell)
+    return netLength
+
+
+def randomDesign(seed, count=400, maxCells=10, grid=12):
+    """
+    Random macros, gates, pins and nets. The gates and pins are on a small integer grid
+    so that distances tie, and a few nets are large enough for the NumPy paths.
+
+    Returns
+    -------
+    tuple
+        (macros, gates, pins, nets), the first three being dictionaries by name.
+    """
+    rng = random.Random(seed)
+    macros = dict()
+    for name, portCounts in [("INV", [1, 2]), ("ND2", [1, 2, 3]), ("DFF", [2, 1, 3])]:
+        macro = StdCell(name)
+        macro.setWidth(1.0)
+        macro.setHeight(0.5)
+        for k, portCount in enumerate(portCounts):
+            gatePin = GatePin("P{}".format(k))
+            for p in range(portCount):
+                gatePin.addPort(Port(x=0.05 * (k + 3 * p), y=0.1 * p, width=0.1, height=0.2))
+            macro.addPin(gatePin)
+        macros[name] = macro
+    gates = dict()
+    for i in range(300):
+        gate = Gate("g{}".format(i))
+        gate.setX(float(rng.randrange(grid)))
+        gate.setY(float(rng.randrange(grid)))
+        gate.setStdCell(rng.choice(list(macros)))
+        gate.setWidth(macros[gate.stdCell].width)
+        gate.setHeight(macros[gate.stdCell].height)
+        gate.orientation = rng.choice(["N", "S", "FN", "FS"])
+        gates[gate.name] = gate
+    pins = dict()
+    for i in range(100):
+        pin = Pin("p{}".format(i))
+        pin.setX(float(rng.randrange(grid)))
+        pin.setY(float(rng.randrange(grid)))
+        pins[pin.name] = pin
+    nets = list()
+    for i in range(count):
+        net = Net("n{}".format(i))
+        cells = rng.randint(1, maxCells) if i % 50 else rng.randint(maxCells, 20 * maxCells)
+        for name in rng.sample(list(gates) + list(pins), cells):
+            if name in pins:
+                net.addPin(pins[name])
+                net.gatePins[name] = "PIN"
+            else:
+                net.addGate(gates[name])
+                net.gatePins[name] = rng.choice(list(macros[gates[name].stdCell].pins))
+        nets.append(net)
+    return macros, gates, pins, nets
+
+
+def cellPoints(gates, pins, macros, net):
+    """
+    Points of each cell of the net, in the order of Net.gatePins: the pin position,
+    or the center of each port of the gate.
+    """
+    return [[[pins[name].x, pins[name].y]] if pinName == "PIN"
+            else [gates[name].absoluteCoordinate(port.center) for port in macros[gates[name].stdCell].pins[pinName].ports]
+            for name, pinName in net.gatePins.items()]
+
+
+@pytest.mark.parametrize("small, large", [(wirelength.SMALL_NET_POINTS, wirelength.LARGE_NET_POINTS),
+                                          (0, float('inf')),
+                                          (0, 0)],
+                         ids=["default", "matrix", "k-d tree"])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_manhattanNN(monkeypatch, seed, small, large):
+    monkeypatch.setattr(wirelength, "SMALL_NET_POINTS", small)
+    monkeypatch.setattr(wirelength, "LARGE_NET_POINTS", large)
+    macros, gates, pins, nets = randomDesign(seed)
+    lengths = wirelength.manhattanNN(*wirelength.flatten([cellPoints(gates, pins, macros, net) for net in nets]))
+    expected = [legacyManhattan(gates, pins, macros, net) for net in nets]
+    assert list(lengths) == expected
+
+
+def test_manhattanNNMultiPort():
+    # The only change from the loop of extractNets, besides the y distance:
+    # ports after the first one of a gate used to be placed on another gate.
+    macros, gates, pins, nets = randomDesign(0)
+    multiPort = [net for net in nets if any(pinName != "PIN" and len(macros[gates[name].stdCell].pins[pinName].ports) > 1
+                                            for name, pinName in net.gatePins.items())]
+    lengths = wirelength.manhattanNN(*wirelength.flatten([cellPoints(gates, pins, macros, net) for net in multiPort]))
+    assert list(lengths) == [legacyManhattan(gates, pins, macros, net) for net in multiPort]
+    assert list(lengths) != [legacyManhattan(gates, pins, macros, net, overwrite=True) for net in multiPort]
+
+
+@requiresDefParser
+def test_netPoints(monkeypatch):
+    macros, gates, pins, nets = randomDesign(2)
+    for name, macro in macros.items():
+        monkeypatch.setitem(def_parser.macros, name, macro)
+    design = def_parser.Design()
+    design.gates = gates
+    design.pins = pins
+    x, y, cellPtr, netPtr = design.netPoints(nets, design.buildPortTable(nets))
+    expectedX, expectedY, expectedCellPtr, expectedNetPtr = wirelength.flatten([cellPoints(gates, pins, macros, net) for net in nets])
+    assert x.tolist() == expectedX.tolist()
+    assert y.tolist() == expectedY.tolist()
+    assert cellPtr.tolist() == expectedCellPtr.tolist()
+    assert netPtr.tolist() == expectedNetPtr.tolist()
+    assert list(wirelength.manhattanNN(x, y, cellPtr, netPtr)) == [legacyManhattan(gates, pins, macros, net) for net in nets]
+
+
+@pytest.fixture(scope="module")
+def syntheticNets():
+    random.seed(0)
+    nets = wirelength.syntheticNets(600, 12, 3, 50)
+    return nets, wirelength.flatten(nets)
+
+
+@pytest.mark.parametrize("small, sweep", [(wirelength.RMST_SMALL_POINTS, wirelength.RMST_SWEEP_POINTS),
+                                          (0, float('inf')),
+                                          (0, 0)],
+                         ids=["default", "NumPy Prim", "sweep"])
+def test_rmst(monkeypatch, syntheticNets, small, sweep):
+    monkeypatch.setattr(wirelength, "RMST_SMALL_POINTS", small)
+    monkeypatch.setattr(wirelength, "RMST_SWEEP_POINTS", sweep)
+    nets, points = syntheticNets
+    lengths = wirelength.rmst(*points)
+    for length, cells in zip(lengths, nets):
+        expected = wirelength._primSmall([cell[0][0] for cell in cells], [cell[0][1] for cell in cells]) if cells else 0.0
+        assert math.isclose(length, expected, rel_tol=1e-9, abs_tol=1e-9)
+
+
+@pytest.mark.parametrize("estimator, reference", [(wirelength.mstst, wirelength.MSTSTwl),
+                                                  (wirelength.mmst, lambda points: min(wirelength.MSTSTwl(points), wirelength.MMSTwl(points))),
+                                                  (wirelength.closestNeighbour, wirelength.netlengthClosestNeighbourg)],
+                         ids=["MSTST", "MMST", "CN"])
+def test_estimators(syntheticNets, estimator, reference):
+    nets, points = syntheticNets
+    assert list(estimator(*points)) == [reference([cell[0] for cell in cells]) if cells else 0 for cells in nets]
+
+
+def test_rsmt(syntheticNets):
+    nets, points = syntheticNets
+    lengths = wirelength.rsmt(*points)
+    rmstLengths = wirelength.rmst(*points)
+    # The reference is slow above 6 points: only the first nets of each degree are checked there.
+    checked = [i for i, cells in enumerate(nets) if len(cells) <= 6]
+    for degree in range(7, wirelength.RSMT_EXACT_DEGREE + 1):
+        checked += [i for i, cells in enumerate(nets) if len(cells) == degree][:3]
+    for i in checked:
+        assert math.isclose(lengths[i], wirelength.rsmtReference([cell[0] for cell in nets[i]]), rel_tol=1e-9, abs_tol=1e-9)
+    for length, rmstLength in zip(lengths, rmstLengths):
+        assert 2 * rmstLength / 3 - 1e-9 <= length <= rmstLength + 1e-9
@@ -0,0 +1,934 @@
+"""
+Wirelength estimators of the unrouted nets, see def_parser.py --manhattanwl, --mmstwl, --cnwl, --rmstwl and --rsmtwl.
+
+The estimators run in a batch over all the nets, given as flat arrays:
+the points of all the cells (gates and pins) of all the nets, one after the
+other, the points of cell c being [cellPtr[c], cellPtr[c+1]) and the cells
+of net n [netPtr[n], netPtr[n+1]). A gate has a point per port of the pin
+the net is connected to, a pin has a single point. The other estimators only take the first
+point of each cell, and most of them go through the nets grouped by
+their amount of points, see degreeBuckets().
+
+Running this module checks the estimators other than manhattanNN against their
+reference implementation on random synthetic nets, and times them. It exits with
+status 1 on any mismatch. The tests of tests/test_wirelength.py also check
+manhattanNN against the loop of extractNets it replaced.
+
+Usage:
+    wirelength.py   [--nets=<N>] [--max-cells=<K>] [--max-ports=<P>] [--grid=<G>] [--seed=<seed>]
+    wirelength.py   --help
+
+Options:
+    --nets=<N>          Number of synthetic nets [default: 20000]
+    --max-cells=<K>     Maximum number of cells in a net [default: 12]
+    --max-ports=<P>     Maximum number of ports of a gate [default: 3]
+    --grid=<G>          Coordinates are integers in [0, G), so that distances tie [default: 50]
+    --seed=<seed>       RNG seed [default: 0]
+    -h --help           Print this help
+"""
+
+import logging
+import random
+import statistics
+import sys
+import time
+import math
+import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import minimum_spanning_tree
+from scipy.spatial import cKDTree
+from docopt import docopt
+
+logger = logging.getLogger('default')
+
+# Nets with at most this many points are handled in pure Python, which is faster than NumPy on a few points.
+SMALL_NET_POINTS = 16
+# Rows of the distance matrix computed at once on large nets, bounds the memory to BLOCK_ROWS * points.
+BLOCK_ROWS = 256
+# Nets with more points go through a k-d tree instead of the whole distance matrix.
+LARGE_NET_POINTS = 2048
+# RMST: Prim's algorithm in pure Python up to RMST_SMALL_POINTS points, with NumPy up to RMST_SWEEP_POINTS,
+# then the octant sweep.
+RMST_SMALL_POINTS = 12
+RMST_SWEEP_POINTS = 1024
+# RSMT: exact up to this degree, and nets of the same degree computed together, as many as fit
+# RSMT_CHUNK_COSTS partial tree lengths (2048 nets of degree 6).
+RSMT_EXACT_DEGREE = 9
+RSMT_CHUNK_COSTS = 2048 * 32 * 36
+
+
+def _nearestCellsSmall(xs, ys, starts):
+    """
+    Nearest other cell of each cell of a net, see _nearestCells().
+    """
+    nCells = len(starts) - 1
+    distances = []
+    nearest = []
+    for a in range(nCells):
+        best = float('inf')
+        bestCell = -1
+        for q in range(starts[a], starts[a+1]):
+            X = xs[q]
+            Y = ys[q]
+            for b in range(nCells):
+                if b != a:
+                    for p in range(starts[b], starts[b+1]):
+                        dist = abs(X - xs[p]) + abs(Y - ys[p])
+                        if dist < best:
+                            best = dist
+                            bestCell = b
+        distances.append(best)
+        nearest.append(bestCell)
+    return distances, nearest
+
+
+def _rowNearestBlocks(x, y, starts, owner):
+    """
+    Nearest point of another cell of each point, from the distance matrix
+    computed BLOCK_ROWS rows at a time.
+    """
+    nCells = len(starts) - 1
+    counts = np.diff(starts)
+    nonEmpty = starts[:-1][counts > 0]
+    cells = np.flatnonzero(counts > 0)
+    rowMin = np.empty(len(x))
+    rowCell = np.empty(len(x), dtype=np.int64)
+    for first in range(0, len(x), BLOCK_ROWS):
+        rows = slice(first, min(first + BLOCK_ROWS, len(x)))
+        distances = np.abs(x[rows, None] - x[None, :]) + np.abs(y[rows, None] - y[None, :])
+        perCell = np.full((distances.shape[0], nCells), np.inf)
+        perCell[:, cells] = np.minimum.reduceat(distances, nonEmpty, axis=1)
+        perCell[np.arange(distances.shape[0]), owner[rows]] = np.inf
+        rowCell[rows] = np.argmin(perCell, axis=1)
+        rowMin[rows] = perCell[np.arange(distances.shape[0]), rowCell[rows]]
+    return rowMin, rowCell
+
+
+def _rowNearestTree(x, y, starts, owner):
+    """
+    Nearest point of another cell of each point, with a k-d tree in L1.
+
+    The k nearest points of a point, k being one more than the largest amount
+    of points of a cell, contain a point of another cell, giving the distance.
+    All the points at that distance are then gathered to keep, among ties,
+    the first cell.
+    """
+    points = np.column_stack((x, y))
+    tree = cKDTree(points)
+    k = min(int(np.diff(starts).max()) + 1, len(x))
+    neighbours = tree.query(points, k=list(range(1, k + 1)), p=1)[1]
+    foreign = owner[neighbours] != owner[:, None]
+    closest = neighbours[np.arange(len(x)), np.argmax(foreign, axis=1)]
+    # No other cell with any point: nothing to connect to.
+    rowMin = np.where(foreign.any(axis=1), np.abs(x - x[closest]) + np.abs(y - y[closest]), np.inf)
+    rowCell = owner[closest]
+
+    balls = tree.query_ball_point(points, np.where(np.isfinite(rowMin), rowMin, 0), p=1)
+    sizes = np.fromiter((len(ball) for ball in balls), dtype=np.int64, count=len(x))
+    candidates = np.fromiter((i for ball in balls for i in ball), dtype=np.int64, count=int(sizes.sum()))
+    rows = np.repeat(np.arange(len(x)), sizes)
+    tied = (owner[candidates] != owner[rows]) & (np.abs(x[rows] - x[candidates]) + np.abs(y[rows] - y[candidates]) == rowMin[rows])
+    firstCell = np.full(len(x), len(starts))
+    np.minimum.at(firstCell, rows[tied], owner[candidates[tied]])
+    return rowMin, np.where(firstCell < len(starts), firstCell, rowCell)
+
+
+def _nearestCells(x, y, starts):
+    """
+    Nearest other cell of each cell of a net, in Manhattan distance between their points.
+
+    Ties are broken as the reference does: first point of the cell, then first
+    other cell, in their order in the net.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        Coordinates of the points of the net.
+    starts : np.ndarray
+        The points of cell c are [starts[c], starts[c+1]).
+
+    Returns
+    -------
+    tuple
+        (distances, nearest), lists: distance to the nearest other cell, and its index (-1 if none).
+    """
+    if len(x) <= SMALL_NET_POINTS:
+        return _nearestCellsSmall(x.tolist(), y.tolist(), starts.tolist())
+    nCells = len(starts) - 1
+    counts = np.diff(starts)
+    owner = np.repeat(np.arange(nCells), counts)
+    if len(x) <= LARGE_NET_POINTS:
+        rowMin, rowCell = _rowNearestBlocks(x, y, starts, owner)
+    else:
+        rowMin, rowCell = _rowNearestTree(x, y, starts, owner)
+    # For each cell, the first of its points reaching its minimal distance.
+    nonEmpty = starts[:-1][counts > 0]
+    cells = np.flatnonzero(counts > 0)
+    distances = np.full(nCells, np.inf)
+    distances[cells] = np.minimum.reduceat(rowMin, nonEmpty)
+    candidates = np.where(rowMin == distances[owner], np.arange(len(x)), len(x))
+    firstRow = np.full(nCells, len(x))
+    firstRow[cells] = np.minimum.reduceat(candidates, nonEmpty)
+    nearest = np.where(np.isfinite(distances) & (firstRow < len(x)), rowCell[np.minimum(firstRow, len(x) - 1)], -1)
+    return distances.tolist(), nearest.tolist()
+
+
+def _chainLength(distances, nearest):
+    """
+    Connect the cells from the last one: each cell not connected yet is
+    connected to its nearest cell, which is then considered connected too.
+    """
+    connected = [False] * len(distances)
+    length = 0
+    for a in range(len(distances) - 1, -1, -1):
+        if connected[a]:
+            continue
+        length += distances[a]
+        connected[a] = True
+        if nearest[a] >= 0:
+            connected[nearest[a]] = True
+    return length
+
+
+def manhattanNN(x, y, cellPtr, netPtr):
+    """
+    Greedy nearest-neighbour Manhattan wirelength of each net.
+
+    Going through the cells of the net from the last one, each cell not yet
+    connected is connected to its nearest other cell of the net, in Manhattan
+    distance between their points, and both are considered connected.
+    The length of the net is the sum of those distances, 0 if it has less
+    than two cells.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        Coordinates of the points of all the cells.
+    cellPtr : np.ndarray
+        Points of each cell, see the module documentation.
+    netPtr : np.ndarray
+        Cells of each net, see the module documentation.
+
+    Returns
+    -------
+    list
+        Length of each net, float (or int 0).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    cellPtr = np.asarray(cellPtr, dtype=np.int64)
+    netPtr = np.asarray(netPtr, dtype=np.int64)
+    cellCounts = np.diff(netPtr)
+    lengths = [0] * len(cellCounts)
+
+    # Two cells of a single point each, the majority: the distance between them.
+    pairs = np.flatnonzero(cellCounts == 2)
+    pointCounts = np.diff(cellPtr)
+    pairs = pairs[(pointCounts[netPtr[pairs]] == 1) & (pointCounts[netPtr[pairs] + 1] == 1)]
+    a = cellPtr[netPtr[pairs] + 1]
+    b = cellPtr[netPtr[pairs]]
+    for net, length in zip(pairs.tolist(), (np.abs(x[a] - x[b]) + np.abs(y[a] - y[b])).tolist()):
+        lengths[net] = length
+
+    isPair = np.zeros(len(cellCounts), dtype=bool)
+    isPair[pairs] = True
+    for net in np.flatnonzero(~isPair & (cellCounts > 1)).tolist():
+        starts = cellPtr[netPtr[net]:netPtr[net+1] + 1]
+        points = slice(starts[0], starts[-1])
+        distances, nearest = _nearestCells(x[points], y[points], starts - starts[0])
+        lengths[net] = _chainLength(distances, nearest)
+    return lengths
+
+
+def firstPoints(x, y, cellPtr, netPtr):
+    """
+    First point of each cell, e.g. the first port of a gate, the cells without any point being left out.
+
+    Parameters
+    ----------
+    x, y, cellPtr, netPtr :
+        See the module documentation.
+
+    Returns
+    -------
+    tuple
+        (x, y, ptr), np.ndarray: the points of net n are [ptr[n], ptr[n+1]).
+    """
+    cellPtr = np.asarray(cellPtr, dtype=np.int64)
+    netPtr = np.asarray(netPtr, dtype=np.int64)
+    kept = np.diff(cellPtr) > 0
+    ptr = np.concatenate(([0], np.cumsum(kept, dtype=np.int64)))[netPtr]
+    first = cellPtr[:-1][kept]
+    return np.asarray(x, dtype=np.float64)[first], np.asarray(y, dtype=np.float64)[first], ptr
+
+
+def _primSmall(xs, ys):
+    """
+    Length of the rectilinear MST of a few points, Prim's algorithm on lists.
+    """
+    n = len(xs)
+    inTree = [False] * n
+    best = [float('inf')] * n
+    best[0] = 0.0
+    length = 0.0
+    for _ in range(n):
+        u = min((i for i in range(n) if not inTree[i]), key=best.__getitem__)
+        inTree[u] = True
+        length += best[u]
+        for v in range(n):
+            if not inTree[v]:
+                dist = abs(xs[u] - xs[v]) + abs(ys[u] - ys[v])
+                if dist < best[v]:
+                    best[v] = dist
+    return length
+
+
+def _primDense(x, y):
+    """
+    Length of the rectilinear MST of the points, Prim's algorithm with NumPy, O(n²).
+    """
+    best = np.abs(x - x[0]) + np.abs(y - y[0])
+    inTree = np.zeros(len(x), dtype=bool)
+    inTree[0] = True
+    best[0] = np.inf
+    length = 0.0
+    for _ in range(len(x) - 1):
+        u = int(np.argmin(best))
+        length += best[u]
+        inTree[u] = True
+        best[u] = np.inf
+        dist = np.abs(x - x[u]) + np.abs(y - y[u])
+        dist[inTree] = np.inf
+        np.minimum(best, dist, out=best)
+    return float(length)
+
+
+def _octantEdges(x, y):
+    """
+    Candidate edges of the rectilinear MST of distinct points: each point
+    with its nearest neighbour in each octant.
+
+    The octant {x' >= x, y' - x' >= y - x} of a point is swept by decreasing
+    x, a Fenwick tree over y - x giving the point of smallest x + y among the
+    ones already swept. The coordinates are transformed to go through four
+    octants, the four others being the same edges the other way around.
+    """
+    n = len(x)
+    sources = []
+    targets = []
+    xs = x.tolist()
+    ys = y.tolist()
+    for direction in range(4):
+        if direction % 2 == 1:
+            xs, ys = ys, xs
+        elif direction == 2:
+            xs = [-v for v in xs]
+        keys = [ys[i] - xs[i] for i in range(n)]
+        # Rank of the keys in decreasing order, 1-based: the octant is a prefix of the tree.
+        ranks = {key: rank for rank, key in enumerate(sorted(set(keys), reverse=True), 1)}
+        size = len(ranks)
+        treeValue = [float('inf')] * (size + 1)
+        treeIndex = [-1] * (size + 1)
+        for i in sorted(range(n), key=lambda i: (xs[i], ys[i]), reverse=True):
+            rank = ranks[keys[i]]
+            best = float('inf')
+            closest = -1
+            k = rank
+            while k > 0:
+                if treeValue[k] < best:
+                    best = treeValue[k]
+                    closest = treeIndex[k]
+                k -= k & -k
+            if closest >= 0:
+                sources.append(i)
+                targets.append(closest)
+            value = xs[i] + ys[i]
+            k = rank
+            while k <= size:
+                if value < treeValue[k]:
+                    treeValue[k] = value
+                    treeIndex[k] = i
+                k += k & -k
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+
+def _rmstSweep(x, y):
+    """
+    Length of the rectilinear MST of the points, O(n log n): MST of the octant edges.
+    """
+    # Distinct points only, a null edge would not be stored in the sparse graph.
+    points = np.unique(np.column_stack((x, y)), axis=0)
+    if len(points) < 2:
+        return 0.0
+    sources, targets = _octantEdges(points[:, 0], points[:, 1])
+    edges = np.unique(np.column_stack((np.minimum(sources, targets), np.maximum(sources, targets))), axis=0)
+    weights = np.abs(points[edges[:, 0], 0] - points[edges[:, 1], 0]) + np.abs(points[edges[:, 0], 1] - points[edges[:, 1], 1])
+    graph = scipy.sparse.csr_matrix((weights, (edges[:, 0], edges[:, 1])), shape=(len(points), len(points)))
+    return float(minimum_spanning_tree(graph).sum())
+
+
+def rmst(x, y, cellPtr, netPtr):
+    """
+    Length of the rectilinear minimum spanning tree of each net, over the
+    first point of each of its cells.
+
+    Nets of two and three points are computed at once, the MST of three points
+    being the sum of their distances minus the longest one. The other nets go
+    through Prim's algorithm, or, above RMST_SWEEP_POINTS points, through the
+    octant sweep.
+
+    Parameters
+    ----------
+    x, y, cellPtr, netPtr :
+        See the module documentation.
+
+    Returns
+    -------
+    list
+        Length of each net, float.
+    """
+    x, y, ptr = firstPoints(x, y, cellPtr, netPtr)
+    counts = np.diff(ptr)
+    lengths = [0.0] * len(counts)
+
+    def distance(a, b):
+        return np.abs(x[a] - x[b]) + np.abs(y[a] - y[b])
+
+    pairs = np.flatnonzero(counts == 2)
+    for net, length in zip(pairs.tolist(), distance(ptr[pairs], ptr[pairs] + 1).tolist()):
+        lengths[net] = length
+    triples = np.flatnonzero(counts == 3)
+    a = ptr[triples]
+    sides = np.column_stack((distance(a, a + 1), distance(a, a + 2), distance(a + 1, a + 2)))
+    for net, length in zip(triples.tolist(), (sides.sum(axis=1) - sides.max(axis=1)).tolist()):
+        lengths[net] = length
+
+    for net in np.flatnonzero(counts > 3).tolist():
+        points = slice(ptr[net], ptr[net+1])
+        if counts[net] <= RMST_SMALL_POINTS:
+            lengths[net] = _primSmall(x[points].tolist(), y[points].tolist())
+        elif counts[net] <= RMST_SWEEP_POINTS:
+            lengths[net] = _primDense(x[points], y[points])
+        else:
+            lengths[net] = _rmstSweep(x[points], y[points])
+    return lengths
+
+
+def degreeBuckets(ptr):
+    """
+    Group the nets by their amount of points, to run an estimator on all the
+    nets of a bucket at once, as arrays of (nets, degree) points.
+
+    Parameters
+    ----------
+    ptr : np.ndarray
+        The points of net n are [ptr[n], ptr[n+1]), see firstPoints().
+
+    Yields
+    ------
+    tuple
+        (degree, nets, points), by increasing degree: the indices of the nets,
+        and the (nets, degree) indices of their points.
+    """
+    counts = np.diff(ptr)
+    order = np.argsort(counts, kind='stable')
+    for nets in np.split(order, np.flatnonzero(np.diff(counts[order])) + 1):
+        if len(nets):
+            degree = int(counts[nets[0]])
+            yield degree, nets, ptr[nets][:, None] + np.arange(degree)
+
+
+def _rowSum(values):
+    """
+    Sum of the columns, one after the other as sum() would add them, so that
+    the kernels give the same floats as the estimators net by net.
+    """
+    total = np.zeros(values.shape[0])
+    for column in range(values.shape[1]):
+        total = total + values[:, column]
+    return total
+
+
+def _mstst(X, Y):
+    """
+    MSTSTwl() of each row of the (nets, degree) points.
+    """
+    degree = X.shape[1]
+    lengths = []
+    for along, across in ((X, Y), (Y, X)):
+        ordered = np.sort(across, axis=1)
+        if degree % 2 == 1:
+            trunk = ordered[:, degree // 2]
+        else:
+            trunk = (ordered[:, degree // 2 - 1] + ordered[:, degree // 2]) / 2
+        lengths.append(_rowSum(np.abs(trunk[:, None] - across)) + (along.max(axis=1) - along.min(axis=1)))
+    return np.minimum(lengths[0], lengths[1])
+
+
+def _mmst(X, Y):
+    """
+    min(MSTSTwl(), MMSTwl()) of each row of the (nets, degree) points.
+    """
+    rows = np.arange(X.shape[0])[:, None]
+    lengths = _mstst(X, Y)
+    # Stable sorts one after the other, as MMSTwl() sorts the same list.
+    for key in (lambda X, Y: Y, lambda X, Y: X, lambda X, Y: X + Y):
+        order = np.argsort(key(X, Y), axis=1, kind='stable')
+        X = X[rows, order]
+        Y = Y[rows, order]
+        # Single trunk tree of each pair of consecutive points.
+        trunkY = (Y[:, :-1] + Y[:, 1:]) / 2
+        trunkX = (X[:, :-1] + X[:, 1:]) / 2
+        pairs = np.minimum(np.abs(trunkY - Y[:, :-1]) + np.abs(trunkY - Y[:, 1:]) + np.abs(X[:, :-1] - X[:, 1:]),
+                           np.abs(trunkX - X[:, :-1]) + np.abs(trunkX - X[:, 1:]) + np.abs(Y[:, :-1] - Y[:, 1:]))
+        lengths = np.minimum(lengths, _rowSum(pairs))
+    return lengths
+
+
+def _closestNeighbour(X, Y):
+    """
+    netlengthClosestNeighbourg() of each row of the (nets, degree) points.
+    """
+    rows = np.arange(X.shape[0])
+    order = np.argsort(X + Y, axis=1, kind='stable')
+    X = X[rows[:, None], order]
+    Y = Y[rows[:, None], order]
+    visited = np.zeros(X.shape, dtype=bool)
+    visited[:, 0] = True
+    originX = X[:, 0]
+    originY = Y[:, 0]
+    lengths = np.zeros(X.shape[0])
+    for _ in range(X.shape[1] - 1):
+        distances = np.abs(originX[:, None] - X) + np.abs(originY[:, None] - Y)
+        distances[visited] = np.inf
+        closest = np.argmin(distances, axis=1)
+        lengths = lengths + distances[rows, closest]
+        visited[rows, closest] = True
+        originX = X[rows, closest]
+        originY = Y[rows, closest]
+    return lengths
+
+
+def hpwl(x, y, cellPtr, netPtr):
+    """
+    Half-perimeter of the bounding box of each net, over the first point of each of its cells.
+
+    Parameters
+    ----------
+    x, y, cellPtr, netPtr :
+        See the module documentation.
+
+    Returns
+    -------
+    list
+        Length of each net, float.
+    """
+    x, y, ptr = firstPoints(x, y, cellPtr, netPtr)
+    counts = np.diff(ptr)
+    lengths = np.zeros(len(counts))
+    starts = ptr[:-1][counts > 0]
+    if len(starts):
+        lengths[counts > 0] = (np.maximum.reduceat(x, starts) - np.minimum.reduceat(x, starts)
+                               + np.maximum.reduceat(y, starts) - np.minimum.reduceat(y, starts))
+    return lengths.tolist()
+
+
+def mstst(x, y, cellPtr, netPtr):
+    """
+    Minimum Single-Trunk Steiner Tree length of each net, over the first point
+    of each of its cells, see MSTSTwl().
+
+    Parameters
+    ----------
+    x, y, cellPtr, netPtr :
+        See the module documentation.
+
+    Returns
+    -------
+    list
+        Length of each net, float.
+    """
+    x, y, ptr = firstPoints(x, y, cellPtr, netPtr)
+    lengths = np.zeros(len(ptr) - 1)
+    for degree, nets, points in degreeBuckets(ptr):
+        if degree > 0:
+            lengths[nets] = _mstst(x[points], y[points])
+    return lengths.tolist()
+
+
+def mmst(x, y, cellPtr, netPtr):
+    """
+    Mixed Minimal Steiner Tree length of each net, over the first point of
+    each of its cells: the shortest of its single trunk tree (MSTSTwl()) and
+    of its multiple trunks trees (MMSTwl()).
+
+    Parameters
+    ----------
+    x, y, cellPtr, netPtr :
+        See the module documentation.
+
+    Returns
+    -------
+    list
+        Length of each net, float.
+    """
+    x, y, ptr = firstPoints(x, y, cellPtr, netPtr)
+    lengths = np.zeros(len(ptr) - 1)
+    for degree, nets, points in degreeBuckets(ptr):
+        if degree > 0:
+            lengths[nets] = _mmst(x[points], y[points])
+    return lengths.tolist()
+
+
+def closestNeighbour(x, y, cellPtr, netPtr):
+    """
+    Closest neighbour length of each net, over the first point of each of its
+    cells, see netlengthClosestNeighbourg().
+
+    Parameters
+    ----------
+    x, y, cellPtr, netPtr :
+        See the module documentation.
+
+    Returns
+    -------
+    list
+        Length of each net, float, or int 0 for the nets of less than two points.
+    """
+    x, y, ptr = firstPoints(x, y, cellPtr, netPtr)
+    lengths = [0] * (len(ptr) - 1)
+    for degree, nets, points in degreeBuckets(ptr):
+        if degree > 1:
+            for net, length in zip(nets.tolist(), _closestNeighbour(x[points], y[points]).tolist()):
+                lengths[net] = length
+    return lengths
+
+
+def _rsmtExact(X, Y):
+    """
+    Length of the rectilinear Steiner minimal tree of nets of the same degree,
+    Dreyfus-Wagner over their Hanan grid, all the nets at once.
+
+    cost[S][net, node] is the length of the smallest tree connecting the
+    terminals of the subset S and the node, the last terminal being left out
+    of the subsets as the root of the tree. Merging two subtrees at a node,
+    then growing the tree to the other nodes, is a min over the splits of S
+    followed by a distance transform along the rows and the columns of the grid.
+
+    Parameters
+    ----------
+    X, Y : np.ndarray
+        (nets, degree) coordinates of the terminals.
+
+    Returns
+    -------
+    np.ndarray
+        Length of each net.
+    """
+    nets, degree = X.shape
+    xs = np.sort(X, axis=1)
+    ys = np.sort(Y, axis=1)
+    gapX = np.diff(xs, axis=1)
+    gapY = np.diff(ys, axis=1)
+    # Node (column, row) of the grid of each terminal.
+    columns = np.argsort(np.argsort(X, axis=1, kind='stable'), axis=1, kind='stable')
+    lines = np.argsort(np.argsort(Y, axis=1, kind='stable'), axis=1, kind='stable')
+
+    full = (1 << (degree - 1)) - 1
+    cost = [None] * (full + 1)
+    for t in range(degree - 1):
+        cost[1 << t] = (np.abs(xs[:, :, None] - X[:, t, None, None]) + np.abs(ys[:, None, :] - Y[:, t, None, None]))
+    candidate = np.empty((nets, degree, degree))
+    for subset in range(1, full + 1):
+        if subset & (subset - 1) == 0:
+            continue
+        lowest = subset & -subset
+        merged = np.full((nets, degree, degree), np.inf)
+        # Splits of the subset, the first part holding its lowest terminal.
+        part = (subset - 1) & subset
+        while part:
+            if part & lowest:
+                np.add(cost[part], cost[subset ^ part], out=candidate)
+                np.minimum(merged, candidate, out=merged)
+            part = (part - 1) & subset
+        for c in range(1, degree):
+            np.minimum(merged[:, c], merged[:, c-1] + gapX[:, c-1, None], out=merged[:, c])
+        for c in range(degree - 2, -1, -1):
+            np.minimum(merged[:, c], merged[:, c+1] + gapX[:, c, None], out=merged[:, c])
+        for r in range(1, degree):
+            np.minimum(merged[:, :, r], merged[:, :, r-1] + gapY[:, r-1, None], out=merged[:, :, r])
+        for r in range(degree - 2, -1, -1):
+            np.minimum(merged[:, :, r], merged[:, :, r+1] + gapY[:, r, None], out=merged[:, :, r])
+        cost[subset] = merged
+    return cost[full][np.arange(nets), columns[:, -1], lines[:, -1]]
+
+
+def rsmt(x, y, cellPtr, netPtr):
+    """
+    Length of the rectilinear Steiner minimal tree of each net, over the first
+    point of each of its cells.
+
+    The tree is exact up to RSMT_EXACT_DEGREE points: two points are their
+    distance, three their half-perimeter, more go through _rsmtExact(), the
+    nets of the same degree together. Above, the length is the shortest of the
+    RMST and the single trunk tree (MSTSTwl()).
+
+    Parameters
+    ----------
+    x, y, cellPtr, netPtr :
+        See the module documentation.
+
+    Returns
+    -------
+    list
+        Length of each net, float.
+    """
+    lengths = np.array(rmst(x, y, cellPtr, netPtr), dtype=np.float64)
+    x, y, ptr = firstPoints(x, y, cellPtr, netPtr)
+    for degree, nets, points in degreeBuckets(ptr):
+        if degree == 3:
+            lengths[nets] = np.ptp(x[points], axis=1) + np.ptp(y[points], axis=1)
+        elif 3 < degree <= RSMT_EXACT_DEGREE:
+            # _rsmtExact() keeps 2**(degree-1) costs per node of the grid of each net.
+            chunkSize = max(1, RSMT_CHUNK_COSTS // ((1 << (degree - 1)) * degree * degree))
+            for first in range(0, len(nets), chunkSize):
+                chunk = slice(first, first + chunkSize)
+                lengths[nets[chunk]] = _rsmtExact(x[points[chunk]], y[points[chunk]])
+        elif degree > RSMT_EXACT_DEGREE:
+            lengths[nets] = np.minimum(lengths[nets], _mstst(x[points], y[points]))
+    return lengths.tolist()
+
+
+# All the estimators, by the name of their column in def_parser.py WLnets_models.out.
+MODELS = {"HPL": hpwl,
+          "MANHATTAN": manhattanNN,
+          "MSTST": mstst,
+          "MMST": mmst,
+          "CN": closestNeighbour,
+          "RMST": rmst,
+          "RSMT": rsmt}
+
+
+def rsmtReference(points):
+    """
+    Length of the rectilinear Steiner minimal tree of the points, Dreyfus-Wagner
+    over their Hanan grid, node after node.
+
+    Parameters
+    ----------
+    points : list
+        [x, y] of each terminal.
+
+    Returns
+    -------
+    float
+    """
+    nodes = [(gx, gy) for gx in sorted(set(p[0] for p in points)) for gy in sorted(set(p[1] for p in points))]
+    full = (1 << len(points)) - 1
+    cost = dict()
+    for t, (tx, ty) in enumerate(points):
+        cost[1 << t] = [abs(gx - tx) + abs(gy - ty) for gx, gy in nodes]
+    for subset in range(1, full + 1):
+        if subset in cost:
+            continue
+        merged = [float('inf')] * len(nodes)
+        part = (subset - 1) & subset
+        while part:
+            for v in range(len(nodes)):
+                merged[v] = min(merged[v], cost[part][v] + cost[subset ^ part][v])
+            part = (part - 1) & subset
+        cost[subset] = [min(merged[u] + abs(nodes[u][0] - gx) + abs(nodes[u][1] - gy) for u in range(len(nodes))) for gx, gy in nodes]
+    return min(cost[full]) if points else 0.0
+
+
+def MSTSTwl(points):
+    """
+    Minimum Single-Trunk Steiner Tree (MSTST) algorithm to compute the approximate
+    wire-length given some points.
+
+    Parameters:
+    -----------
+    points : List
+        List of lists like so:
+        [[x1,y1],...,[xn,yn]]
+
+    Return:
+    float
+        Size of the tree
+    """
+    wirelengths = [0,0] # horizontal single trunk, then vertical.
+    if len(points) > 0:
+        # 1. Find the median y coordinate
+        trunk = statistics.median([i[1] for i in points])
+        wirelengths[0] = sum([abs(trunk - i[1]) for i in points])
+        wirelengths[0] += max([i[0] for i in points]) - min([i[0] for i in points])
+
+        # 2. Find the median x coordinate
+        trunk = statistics.median([i[0] for i in points])
+        wirelengths[1] = sum([abs(trunk - i[0]) for i in points])
+        wirelengths[1] += max([i[1] for i in points]) - min([i[1] for i in points])
+    return min(wirelengths)
+
+def MMSTwl(points):
+    """
+    Compute a Minimal Multiple Trunks Steiner Tree.
+    First sort all the coordinates according to their ordinate.
+    Then for each pair of points, build a small MSTST with a single trunk.
+    This method should be closer to an actual Minimal rectilinear Steiner tree obtained during routing,
+    especially for high-fanout nets.
+
+    Parameters:
+    -----------
+    points : List
+        List of lists like so:
+        [[x1,y1],...,[xn,yn]]
+
+    Return:
+    float
+        Size of the tree
+    """
+    wirelengths = [0,0,0] # 0: sorted on y, 1: sorted on x, 2: sorted on (x+y)
+    points.sort(key=lambda x:x[1]) # sort based on ordinate, this post explains it so well: https://stackoverflow.com/a/42966511/3973030
+    if len(points) > 0:
+        for i in range(len(points)-1):
+            wirelengths[0] += MSTSTwl([points[i],points[i+1]])
+    points.sort(key=lambda x:x[0]) # sort based on abscissa
+    if len(points) > 0:
+        for i in range(len(points)-1):
+            wirelengths[1] += MSTSTwl([points[i],points[i+1]])
+    points.sort(key=lambda x:x[0]+x[1]) # sort based on abscissa + ordinate. No ideal as we have a symetry of axis y=x for the sum values. Yet, it should group some close points together.
+    if len(points) > 0:
+        for i in range(len(points)-1):
+            wirelengths[2] += MSTSTwl([points[i],points[i+1]])
+    return min(wirelengths)
+
+def netlengthClosestNeighbourg(points):
+    """
+    Closest neighbour wirelength: starting from the point of smallest x + y,
+    go to the closest point not visited yet, until all of them are.
+
+    Parameters:
+    -----------
+    points : List
+        List of lists like so:
+        [[x1,y1],...,[xn,yn]]
+        Sorted in place, and emptied.
+
+    Return:
+    float
+        Length of the path
+    """
+    wirelength = 0
+    points.sort(key = lambda x: x[0]+x[1])
+    origin = points[0]
+    points.remove(origin)
+
+    while len(points) > 0:
+        # find closest neighbourg to origin
+        distance = float('inf')
+        candidate = None
+        for neighbour in points:
+            newDist = abs(origin[0] - neighbour[0]) + abs(origin[1] - neighbour[1])
+            if newDist < distance:
+                distance = newDist
+                candidate = neighbour[:]
+        wirelength += distance
+        points.remove(candidate)
+        origin = candidate[:]
+    return wirelength
+
+
+def flatten(nets):
+    """
+    Parameters
+    ----------
+    nets : list
+        Cells of each net, as lists of points [x, y].
+
+    Returns
+    -------
+    tuple
+        (x, y, cellPtr, netPtr), see the module documentation.
+    """
+    points = [point for cells in nets for cell in cells for point in cell]
+    cellPtr = np.concatenate(([0], np.cumsum([len(cell) for cells in nets for cell in cells], dtype=np.int64)))
+    netPtr = np.concatenate(([0], np.cumsum([len(cells) for cells in nets], dtype=np.int64)))
+    x = np.array([point[0] for point in points], dtype=np.float64)
+    y = np.array([point[1] for point in points], dtype=np.float64)
+    return x, y, cellPtr, netPtr
+
+
+def syntheticNets(count, maxCells, maxPorts, grid):
+    """
+    Random nets: each cell is a pin (single point) or a gate with up to maxPorts ports.
+    A few nets are larger than maxCells, to go through the NumPy path.
+    """
+    nets = []
+    for i in range(count):
+        cells = random.randint(1, maxCells) if i % 100 else random.randint(maxCells, 20 * maxCells)
+        nets.append([[[float(random.randrange(grid)), float(random.randrange(grid))] for p in range(1 if random.random() < 0.2 else random.randint(1, maxPorts))]
+                     for c in range(cells)])
+    return nets
+
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+    random.seed(int(args["--seed"]))
+    nets = syntheticNets(int(args["--nets"]), int(args["--max-cells"]), int(args["--max-ports"]), int(args["--grid"]))
+
+    x, y, cellPtr, netPtr = flatten(nets)
+    failed = 0 # Amount of mismatches
+
+    start = time.time()
+    expected = [_primSmall([cell[0][0] for cell in cells], [cell[0][1] for cell in cells]) if cells else 0.0 for cells in nets]
+    referenceTime = time.time() - start
+    # Prim's algorithm in the reference, the sweep checked on all the nets.
+    defaults = RMST_SMALL_POINTS, RMST_SWEEP_POINTS
+    for path, small, sweep in [("default",) + defaults, ("NumPy Prim", 0, float('inf')), ("sweep", 0, 0)]:
+        RMST_SMALL_POINTS, RMST_SWEEP_POINTS = small, sweep
+        start = time.time()
+        lengths = rmst(x, y, cellPtr, netPtr)
+        batchTime = time.time() - start
+        mismatches = [i for i in range(len(nets)) if not math.isclose(lengths[i], expected[i], rel_tol=1e-9, abs_tol=1e-9)]
+        print("RMST ({}): {} nets, reference {:.2f}s, batch {:.2f}s, {} mismatches".format(path, len(nets), referenceTime, batchTime, len(mismatches)))
+        failed += len(mismatches)
+        for i in mismatches[:10]:
+            print("    net {} ({} cells): {} instead of {}".format(i, len(nets[i]), lengths[i], expected[i]))
+    RMST_SMALL_POINTS, RMST_SWEEP_POINTS = defaults
+    rmstLengths = expected
+
+    for name, estimator, reference in [("MSTST", mstst, MSTSTwl),
+                                       ("MMST", mmst, lambda points: min(MSTSTwl(points), MMSTwl(points))),
+                                       ("Closest neighbour", closestNeighbour, netlengthClosestNeighbourg)]:
+        start = time.time()
+        expected = [reference([cell[0] for cell in cells]) if cells else 0 for cells in nets]
+        referenceTime = time.time() - start
+        start = time.time()
+        lengths = estimator(x, y, cellPtr, netPtr)
+        batchTime = time.time() - start
+        mismatches = [i for i in range(len(nets)) if lengths[i] != expected[i]]
+        print("{}: {} nets, reference {:.2f}s, batch {:.2f}s, {} mismatches".format(name, len(nets), referenceTime, batchTime, len(mismatches)))
+        failed += len(mismatches)
+        for i in mismatches[:10]:
+            print("    net {} ({} cells): {} instead of {}".format(i, len(nets[i]), lengths[i], expected[i]))
+
+    # The reference only on the nets exact in the batch, the others must be between 2/3 of their RMST and their RMST.
+    # The reference taking about a second on 9 points, only the first 20 nets of each degree above 6 are checked.
+    start = time.time()
+    exact = [i for i in range(len(nets)) if len(nets[i]) <= 6]
+    for degree in range(7, RSMT_EXACT_DEGREE + 1):
+        exact += [i for i in range(len(nets)) if len(nets[i]) == degree][:20]
+    expected = {i: rsmtReference([cell[0] for cell in nets[i]]) for i in exact}
+    referenceTime = time.time() - start
+    start = time.time()
+    lengths = rsmt(x, y, cellPtr, netPtr)
+    batchTime = time.time() - start
+    mismatches = [i for i in exact if not math.isclose(lengths[i], expected[i], rel_tol=1e-9, abs_tol=1e-9)]
+    mismatches += [i for i in range(len(nets)) if i not in expected and not 2 * rmstLengths[i] / 3 - 1e-9 <= lengths[i] <= rmstLengths[i] + 1e-9]
+    print("RSMT: {} nets ({} exact), reference {:.2f}s, batch {:.2f}s, {} mismatches".format(len(nets), len(exact), referenceTime, batchTime, len(mismatches)))
+    failed += len(mismatches)
+    for i in mismatches[:10]:
+        print("    net {} ({} cells): {} instead of {}".format(i, len(nets[i]), lengths[i], expected.get(i, rmstLengths[i])))
+
+    if failed:
+        sys.exit(1)